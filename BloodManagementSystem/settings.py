@@ -53,6 +53,8 @@ INTERNAL_IPS = [
 NPM_BIN_PATH = r"C:\Program Files\nodejs\npm.cmd"
 
 MIDDLEWARE = [
+    # first, so latency and query counts cover the whole middleware stack
+    'dentalcare.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,6 +68,39 @@ MIDDLEWARE = [
      "django_browser_reload.middleware.BrowserReloadMiddleware",
 ]
 
+# Availability bitmaps, dashboard counters and throttle buckets live in the cache and
+# are invalidated on commit, so every worker has to see the same cache: production
+# runs with several workers must set REDIS_URL. The local-memory fallback is per process.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# MetricsMiddleware logs a warning when a request issues more queries than this
+QUERY_BUDGET = 30
+
+# token buckets per client: scope -> (burst, seconds to refill it); see dentalcare.throttle
+THROTTLE_RATES = {
+    'contact': (5, 60 * 10),
+    'booking': (30, 60),
+}
+
+# buffer contact submissions and insert them in batches; see dentalcare.contacts
+CONTACT_WRITE_BEHIND = False
+
+# archive_old_records moves finished appointments and contact submissions older than these
+ARCHIVE_APPOINTMENTS_AFTER_DAYS = 365
+ARCHIVE_CONTACTS_AFTER_DAYS = 180
+
 ROOT_URLCONF = 'BloodManagementSystem.urls'
 
 TEMPLATES = [
@@ -93,6 +128,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # take the write lock when a transaction starts so concurrent
+            # bookings queue up instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -1,8 +1,51 @@
 # filepath: dentalcare/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import (
+    ArchivedAppointment, ArchivedContactSubmission, CustomUser, DoctorSchedule, ScheduleBreak, ScheduleException,
+)
 
 admin.site.register(CustomUser, UserAdmin)
 
 
+class ScheduleBreakInline(admin.TabularInline):
+    model = ScheduleBreak
+    extra = 0
+
+
+class ScheduleExceptionInline(admin.TabularInline):
+    model = ScheduleException
+    extra = 0
+
+
+@admin.register(DoctorSchedule)
+class DoctorScheduleAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'working_days', 'start_time', 'end_time', 'slot_minutes')
+    inlines = [ScheduleBreakInline, ScheduleExceptionInline]
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """Archived rows are history: readable and searchable, never edited."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(ArchiveAdmin):
+    list_display = ('date', 'time_slot', 'doctor', 'user', 'status', 'archived_at')
+    list_filter = ('status',)
+    date_hierarchy = 'date'
+    list_select_related = ('doctor', 'user')
+    raw_id_fields = ('doctor', 'user')
+
+
+@admin.register(ArchivedContactSubmission)
+class ArchivedContactSubmissionAdmin(ArchiveAdmin):
+    list_display = ('submitted_at', 'first_name', 'last_name', 'email', 'mobile', 'archived_at')
+    search_fields = ('first_name', 'last_name', 'email', 'mobile', 'message')
+    date_hierarchy = 'submitted_at'
+    raw_id_fields = ('user',)
@@ -0,0 +1,372 @@
+"""Versioned JSON API (``/api/v1/``) for the mobile client.
+
+Same session login and permission rules as the HTML views. Lists are
+cursor paginated and accept ``fields=`` to load only the named columns;
+reads answer ``If-None-Match`` with a 304 after a single aggregate query.
+"""
+import datetime
+import functools
+import hashlib
+import json
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+
+from . import booking, directory
+from .models import Appointment, ContactSubmission, CustomUser
+from .pagination import PAGE_SIZE, decode_cursor, encode_cursor, keyset_page
+from .throttle import throttle
+
+MAX_PAGE_SIZE = 200
+MAX_BATCH_IDS = 100
+
+# output name: values() lookup; joins only happen when a joined field is asked for
+APPOINTMENT_FIELDS = {
+    'id': 'id',
+    'date': 'date',
+    'time_slot': 'time_slot',
+    'status': 'status',
+    'reason': 'reason',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'doctor_id': 'doctor_id',
+    'doctor_username': 'doctor__username',
+    'patient_id': 'user_id',
+    'patient_username': 'user__username',
+    'patient_first_name': 'user__first_name',
+    'patient_last_name': 'user__last_name',
+}
+APPOINTMENT_ORDERINGS = {
+    'date': ('date', 'time_slot', 'id'),
+    # for sync: everything changed after the last seen cursor
+    'updated': ('updated_at', 'id'),
+}
+
+CONTACT_FIELDS = {
+    'id': 'id',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'mobile': 'mobile',
+    'email': 'email',
+    'message': 'message',
+    'submitted_at': 'submitted_at',
+    'user_id': 'user_id',
+}
+CONTACT_KEYS = ('submitted_at', 'id')
+
+DOCTOR_FIELDS = ('id', 'name', 'specialization', 'label')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(view):
+    """Session login required; ``ApiError`` becomes a JSON error response."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error("Authentication required.", 401)
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return _error(str(e), e.status)
+    return wrapper
+
+
+def _require_doctor(user):
+    if getattr(user, 'role', None) != 'doctor':
+        raise ApiError("Doctors only.", 403)
+
+
+def _selected_fields(request, available):
+    if not request.GET.get('fields'):
+        return list(available)
+    names = [name.strip() for name in request.GET['fields'].split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}.")
+    return names
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError("limit must be a number.")
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return size
+
+
+def _batch_ids(request):
+    try:
+        ids = {int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()}
+    except ValueError:
+        raise ApiError("ids must be a comma separated list of numbers.")
+    if not 0 < len(ids) <= MAX_BATCH_IDS:
+        raise ApiError(f"Give 1 to {MAX_BATCH_IDS} ids.")
+    return ids
+
+
+def _date_param(request, name):
+    try:
+        return datetime.date.fromisoformat(request.GET[name]) if request.GET.get(name) else None
+    except ValueError:
+        raise ApiError(f"{name} must be a date (YYYY-MM-DD).")
+
+
+def _project(rows, columns, names):
+    return [{name: row[columns[name]] for name in names} for row in rows]
+
+
+def _conditional(request, state, build):
+    """Answer with a 304 when the client's ETag still matches ``state``.
+
+    ``state`` is cheap to compute (an aggregate, a row version); the tag also
+    covers the full path so each page and field selection has its own.
+    """
+    etag = '"%s"' % hashlib.md5(f"{request.get_full_path()}|{state}".encode()).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+        response['ETag'] = etag
+    return response
+
+
+# -- appointments ------------------------------------------------------------
+
+def _own_appointments(user):
+    if getattr(user, 'role', None) == 'doctor':
+        return Appointment.objects.filter(doctor=user)
+    return Appointment.objects.filter(user=user)
+
+
+def _joined(names):
+    """The relations (``user``, ``doctor``) the selected appointment fields read from."""
+    return sorted({
+        APPOINTMENT_FIELDS[name].split('__')[0] for name in names if '__' in APPOINTMENT_FIELDS[name]
+    })
+
+
+def _stamp(value):
+    return value.timestamp() if value else 0
+
+
+def _version(queryset, names=()):
+    # a renamed patient changes the output without touching the appointment
+    joined = {f'{relation}_latest': Max(f'{relation}__updated_at') for relation in _joined(names)}
+    state = queryset.aggregate(total=Count('id'), latest=Max('updated_at'), **joined)
+    return ':'.join([str(state.pop('total'))] + [str(_stamp(state[key])) for key in sorted(state)])
+
+
+@require_http_methods(['GET', 'HEAD', 'POST'])
+@api_view
+@throttle('booking')
+def appointments(request):
+    if request.method == 'POST':
+        return _create_appointment(request)
+
+    names = _selected_fields(request, APPOINTMENT_FIELDS)
+    ordering = request.GET.get('ordering', 'date')
+    if ordering not in APPOINTMENT_ORDERINGS:
+        raise ApiError(f"ordering must be one of {', '.join(APPOINTMENT_ORDERINGS)}.")
+    keys = APPOINTMENT_ORDERINGS[ordering]
+    page_size = _page_size(request)
+
+    queryset = _own_appointments(request.user)
+    date = _date_param(request, 'date')
+    if date:
+        queryset = queryset.filter(date=date)
+    if request.GET.get('status'):
+        queryset = queryset.filter(status=request.GET['status'])
+
+    def build():
+        lookups = {APPOINTMENT_FIELDS[name] for name in names} | set(keys)
+        rows, next_cursor = keyset_page(
+            queryset.values(*lookups), request.GET.get('cursor'), keys=keys, page_size=page_size
+        )
+        return JsonResponse({'results': _project(rows, APPOINTMENT_FIELDS, names), 'next_cursor': next_cursor})
+
+    return _conditional(request, _version(queryset, names), build)
+
+
+@require_GET
+@api_view
+def appointment_detail(request, appointment_id):
+    names = _selected_fields(request, APPOINTMENT_FIELDS)
+    stamps = ['updated_at'] + [f'{relation}__updated_at' for relation in _joined(names)]
+    rows = list(
+        _own_appointments(request.user).filter(id=appointment_id)
+        .values(*{APPOINTMENT_FIELDS[name] for name in names} | set(stamps))
+    )
+    if not rows:
+        raise ApiError("Appointment not found.", 404)
+    return _conditional(
+        request, ':'.join(str(_stamp(rows[0][stamp])) for stamp in stamps),
+        lambda: JsonResponse(_project(rows, APPOINTMENT_FIELDS, names)[0])
+    )
+
+
+@require_GET
+@api_view
+def appointments_batch(request):
+    """Several appointments by id in one round trip; unknown or foreign ids are listed as missing."""
+    ids = _batch_ids(request)
+    names = _selected_fields(request, APPOINTMENT_FIELDS)
+    queryset = _own_appointments(request.user).filter(id__in=ids)
+
+    def build():
+        rows = list(queryset.order_by('id').values(*{APPOINTMENT_FIELDS[name] for name in names} | {'id'}))
+        found = {row['id'] for row in rows}
+        return JsonResponse({
+            'results': _project(rows, APPOINTMENT_FIELDS, names),
+            'missing': sorted(ids - found),
+        })
+
+    return _conditional(request, _version(queryset, names), build)
+
+
+@require_POST
+@api_view
+def appointments_status(request):
+    """Bulk confirm or cancel: ``{"action": "confirm" | "cancel", "ids": [...]}``."""
+    _require_doctor(request.user)
+    body = _json_body(request)
+    action, ids = body.get('action'), body.get('ids')
+    if action not in booking.STATUS_ACTIONS:
+        raise ApiError("action must be confirm or cancel.")
+    if not isinstance(ids, list) or not 0 < len(ids) <= MAX_BATCH_IDS or not all(isinstance(pk, int) for pk in ids):
+        raise ApiError(f"ids must be a list of 1 to {MAX_BATCH_IDS} numbers.")
+    outcomes = booking.change_status(request.user, ids, action)
+    return JsonResponse({
+        'action': action,
+        'updated': sum(outcome == 'updated' for outcome in outcomes.values()),
+        'results': {str(pk): outcome for pk, outcome in sorted(outcomes.items())},
+    })
+
+
+def _json_body(request):
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError("Request body must be JSON.")
+    if not isinstance(body, dict):
+        raise ApiError("Request body must be a JSON object.")
+    return body
+
+
+def _create_appointment(request):
+    body = _json_body(request)
+    try:
+        doctor = CustomUser.objects.get(pk=int(body['doctor']), role='doctor')
+        date = datetime.date.fromisoformat(body['date'])
+        time_slot = datetime.time.fromisoformat(body['time_slot'])
+    except (KeyError, TypeError, ValueError):
+        raise ApiError("doctor, date and time_slot are required.")
+    except CustomUser.DoesNotExist:
+        raise ApiError("Invalid doctor selected.")
+    if date < datetime.date.today():
+        raise ApiError("Cannot book appointments for past dates.")
+    try:
+        appointment = booking.book_slot(request.user, doctor, date, time_slot, str(body.get('reason', '')))
+    except booking.BookingError as e:
+        raise ApiError(str(e), 409)
+    row = Appointment.objects.filter(pk=appointment.pk).values(*APPOINTMENT_FIELDS.values()).get()
+    return JsonResponse(_project([row], APPOINTMENT_FIELDS, APPOINTMENT_FIELDS)[0], status=201)
+
+
+# -- doctors -----------------------------------------------------------------
+
+@require_GET
+@api_view
+def doctors(request):
+    """The doctor directory, served from its cache; ``q`` filters by name or specialization."""
+    names = _selected_fields(request, DOCTOR_FIELDS)
+    page_size = _page_size(request)
+    entries = directory.search(request.GET['q'], limit=None) if request.GET.get('q') else directory.doctors()
+
+    start = 0
+    if request.GET.get('cursor'):
+        after = decode_cursor(CustomUser, ('id',), request.GET['cursor'])
+        ids = [entry['id'] for entry in entries]
+        if after is not None and after[0] in ids:
+            start = ids.index(after[0]) + 1
+    page = entries[start:start + page_size]
+    has_more = start + page_size < len(entries)
+
+    def build():
+        return JsonResponse({
+            'results': [{name: entry[name] for name in names} for entry in page],
+            'next_cursor': encode_cursor([page[-1]['id']]) if has_more else None,
+        })
+
+    return _conditional(request, json.dumps(page, sort_keys=True), build)
+
+
+# -- contacts ----------------------------------------------------------------
+
+def _contact_version(queryset):
+    # submissions are never edited, only added or deleted
+    state = queryset.aggregate(latest=Max('id'), total=Count('id'))
+    return f"{state['total']}:{state['latest']}"
+
+
+@require_GET
+@api_view
+def contacts(request):
+    _require_doctor(request.user)
+    names = _selected_fields(request, CONTACT_FIELDS)
+    page_size = _page_size(request)
+    queryset = ContactSubmission.objects.all()
+    day = _date_param(request, 'date')
+    if day:
+        queryset = queryset.submitted_on(day)
+
+    def build():
+        lookups = {CONTACT_FIELDS[name] for name in names} | set(CONTACT_KEYS)
+        rows, next_cursor = keyset_page(
+            queryset.values(*lookups), request.GET.get('cursor'),
+            keys=CONTACT_KEYS, descending=True, page_size=page_size
+        )
+        return JsonResponse({'results': _project(rows, CONTACT_FIELDS, names), 'next_cursor': next_cursor})
+
+    return _conditional(request, _contact_version(queryset), build)
+
+
+@require_GET
+@api_view
+def contact_detail(request, contact_id):
+    _require_doctor(request.user)
+    names = _selected_fields(request, CONTACT_FIELDS)
+    rows = list(ContactSubmission.objects.filter(id=contact_id).values(*{CONTACT_FIELDS[name] for name in names}))
+    if not rows:
+        raise ApiError("Contact not found.", 404)
+    return _conditional(request, contact_id, lambda: JsonResponse(_project(rows, CONTACT_FIELDS, names)[0]))
+
+
+@require_GET
+@api_view
+def contacts_batch(request):
+    _require_doctor(request.user)
+    ids = _batch_ids(request)
+    names = _selected_fields(request, CONTACT_FIELDS)
+    queryset = ContactSubmission.objects.filter(id__in=ids)
+
+    def build():
+        rows = list(queryset.order_by('id').values(*{CONTACT_FIELDS[name] for name in names} | {'id'}))
+        found = {row['id'] for row in rows}
+        return JsonResponse({
+            'results': _project(rows, CONTACT_FIELDS, names),
+            'missing': sorted(ids - found),
+        })
+
+    return _conditional(request, _contact_version(queryset), build)
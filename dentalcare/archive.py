@@ -0,0 +1,97 @@
+"""Moving old rows out of the live tables.
+
+Finished appointments and contact submissions older than a horizon are
+copied into the archive tables and deleted from the live ones in short
+batches. The delete is plain SQL on purpose: post_delete handlers would
+take archived appointments out of the daily summaries and the dashboard
+counters, but archiving is not cancelling. The contact search index is
+kept in step by its own triggers.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import dashboard, search
+from .models import Appointment, ArchivedAppointment, ArchivedContactSubmission, ContactSubmission
+
+BATCH_SIZE = 1000
+APPOINTMENTS_AFTER_DAYS = 365
+CONTACTS_AFTER_DAYS = 180
+
+APPOINTMENT_FIELDS = ('id', 'user_id', 'doctor_id', 'date', 'time_slot', 'created_at', 'updated_at', 'status', 'reason')
+CONTACT_FIELDS = (
+    'id', 'first_name', 'last_name', 'mobile', 'email', 'message', 'submitted_at', 'user_id', 'message_hash'
+)
+
+
+def appointment_cutoff(today=None):
+    days = getattr(settings, 'ARCHIVE_APPOINTMENTS_AFTER_DAYS', APPOINTMENTS_AFTER_DAYS)
+    return (today or timezone.localdate()) - datetime.timedelta(days=days)
+
+
+def contact_cutoff(now=None):
+    days = getattr(settings, 'ARCHIVE_CONTACTS_AFTER_DAYS', CONTACTS_AFTER_DAYS)
+    return (now or timezone.now()) - datetime.timedelta(days=days)
+
+
+def _delete(model, ids):
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+
+
+def _move(queryset, archive_model, fields, batch_size):
+    # each batch is its own transaction, so the write lock is only held briefly
+    with transaction.atomic():
+        # any order will do; asking for one would sort the whole backlog on every batch
+        rows = list(queryset.order_by().values(*fields)[:batch_size])
+        if rows:
+            archive_model.objects.bulk_create(archive_model(**row) for row in rows)
+            _delete(queryset.model, [row['id'] for row in rows])
+    return rows
+
+
+def archive_appointments(cutoff=None, batch_size=BATCH_SIZE):
+    """Archive appointments dated before ``cutoff`` that are no longer open; returns the count."""
+    queryset = Appointment.objects.filter(date__lt=cutoff or appointment_cutoff()).exclude(
+        status__in=Appointment.OPEN_STATUSES
+    )
+    moved, doctor_ids = 0, set()
+    while True:
+        rows = _move(queryset, ArchivedAppointment, APPOINTMENT_FIELDS, batch_size)
+        moved += len(rows)
+        doctor_ids.update(row['doctor_id'] for row in rows if row['doctor_id'] is not None)
+        if len(rows) < batch_size:
+            break
+    # moved rows still count; the recount guards against a counter cached mid-move
+    dashboard.invalidate(doctor_ids)
+    return moved
+
+
+def archive_contacts(cutoff=None, batch_size=BATCH_SIZE):
+    """Archive contact submissions received before ``cutoff``; returns the count."""
+    queryset = ContactSubmission.objects.filter(submitted_at__lt=cutoff or contact_cutoff())
+    moved = 0
+    while True:
+        rows = _move(queryset, ArchivedContactSubmission, CONTACT_FIELDS, batch_size)
+        moved += len(rows)
+        if len(rows) < batch_size:
+            return moved
+
+
+def compact():
+    """Return freed pages to the file system and refresh planner statistics.
+
+    Must run outside a transaction. VACUUM rewrites the whole SQLite file and
+    blocks writers while it runs, so schedule it for a quiet hour.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute("VACUUM")
+            cursor.execute("ANALYZE")
+        elif connection.vendor == 'postgresql':
+            for model in (Appointment, ContactSubmission, ArchivedAppointment, ArchivedContactSubmission):
+                cursor.execute(f"VACUUM ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
@@ -0,0 +1,120 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from . import schedules
+from .models import Appointment
+
+# Each slot is keyed by its minute of the day, which is also its bit in the
+# per-(doctor, date) occupancy bitmap and in the compiled schedule grids.
+
+# bounds how long a bitmap rebuilt from a read that raced a commit can linger
+CACHE_TIMEOUT = 60 * 60
+
+
+def slot_bit(time_slot):
+    """Return the bitmap position for a time slot (its minute of the day)."""
+    return time_slot.hour * 60 + time_slot.minute
+
+
+def _cache_key(doctor_id, date):
+    return f"availability:{doctor_id}:{date.isoformat()}"
+
+
+def build_mask(time_slots):
+    mask = 0
+    for time_slot in time_slots:
+        mask |= 1 << slot_bit(time_slot)
+    return mask
+
+
+def booked_mask(doctor_id, date):
+    """Return the occupied-slot bitmap for a doctor on a date.
+
+    The bitmap is served from the cache; on a miss it is rebuilt from a single
+    query over the doctor's active appointments for that day.
+    """
+    key = _cache_key(doctor_id, date)
+    mask = cache.get(key)
+    if mask is None:
+        time_slots = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            date=date
+        ).exclude(status='cancelled').values_list('time_slot', flat=True)
+        mask = build_mask(time_slots)
+        cache.set(key, mask, CACHE_TIMEOUT)
+    return mask
+
+
+def free_slots(doctor_id, date):
+    """Return ``(value, label)`` pairs for the slots still free on a date."""
+    return slots_from_mask(schedules.slot_mask(doctor_id, date) & ~booked_mask(doctor_id, date))
+
+
+def slots_from_mask(mask):
+    """Return ``(value, label)`` pairs for the set bits of a slot bitmap, earliest first."""
+    slots = []
+    while mask:
+        lowest = mask & -mask
+        hour, minute = divmod(lowest.bit_length() - 1, 60)
+        slots.append((f"{hour:02d}:{minute:02d}:00", f"{hour:02d}:{minute:02d}"))
+        mask ^= lowest
+    return slots
+
+
+def free_masks(doctor_ids, dates):
+    """Return ``{(doctor_id, date): mask}`` of the free slots of every combination."""
+    grids = schedules.grids(doctor_ids)
+    booked = booked_masks(doctor_ids, dates)
+    return {
+        (doctor_id, date): schedules.grid_mask(grids[doctor_id], date) & ~booked[(doctor_id, date)]
+        for doctor_id in doctor_ids
+        for date in dates
+    }
+
+
+def in_schedule(doctor_id, date, time_slot):
+    """Whether ``time_slot`` starts a slot of the doctor's working grid on ``date``."""
+    return time_slot.second == 0 and bool(schedules.slot_mask(doctor_id, date) >> slot_bit(time_slot) & 1)
+
+
+def booked_masks(doctor_ids, dates):
+    """Return ``{(doctor_id, date): mask}`` for every doctor/date combination.
+
+    Cached bitmaps are fetched in one round trip; whatever is missing is
+    filled in by a single grouped query over the whole doctor/date range.
+    """
+    keys = {_cache_key(doctor_id, date): (doctor_id, date) for doctor_id in doctor_ids for date in dates}
+    cached = cache.get_many(keys)
+    masks = {keys[key]: mask for key, mask in cached.items()}
+    missing = [pair for key, pair in keys.items() if key not in cached]
+    if missing:
+        rows = Appointment.objects.filter(
+            doctor_id__in={doctor_id for doctor_id, _ in missing},
+            date__range=(min(date for _, date in missing), max(date for _, date in missing))
+        ).exclude(status='cancelled').values_list('doctor_id', 'date', 'time_slot')
+        fresh = dict.fromkeys(missing, 0)
+        for doctor_id, date, time_slot in rows:
+            if (doctor_id, date) in fresh:
+                fresh[(doctor_id, date)] |= 1 << slot_bit(time_slot)
+        cache.set_many({_cache_key(*pair): mask for pair, mask in fresh.items()}, CACHE_TIMEOUT)
+        masks.update(fresh)
+    return masks
+
+
+def invalidate(doctor_id, date):
+    cache.delete(_cache_key(doctor_id, date))
+
+
+def invalidate_many(pairs):
+    cache.delete_many([_cache_key(doctor_id, date) for doctor_id, date in pairs])
+
+
+def invalidate_on_commit(pairs):
+    """Drop the bitmaps of ``(doctor_id, date)`` pairs once the transaction commits.
+
+    Bitmaps are dropped rather than patched: a read-modify-write can lose a
+    concurrent booking's bit, and a rolled-back booking must not leave one.
+    """
+    pairs = {(doctor_id, date) for doctor_id, date in pairs if doctor_id is not None}
+    if pairs:
+        transaction.on_commit(lambda: invalidate_many(pairs))
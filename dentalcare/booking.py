@@ -0,0 +1,145 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import availability
+from .models import Appointment, CustomUser
+from .signals import appointments_updated
+
+MAX_APPOINTMENTS_PER_DAY = 2
+
+# action: (new status, statuses it can be applied to)
+STATUS_ACTIONS = {
+    'confirm': ('confirmed', ('pending',)),
+    'cancel': ('cancelled', ('pending', 'confirmed')),
+}
+
+
+class BookingError(Exception):
+    pass
+
+
+class DailyLimitReached(BookingError):
+    pass
+
+
+class SlotUnavailable(BookingError):
+    pass
+
+
+def book_slot(user, doctor, date, time_slot, reason=''):
+    """Create a pending appointment, enforcing the per-day limit and slot uniqueness.
+
+    The daily count and the insert share one transaction, with the patient's
+    row locked so parallel bookings by the same patient are serialised. Slot
+    clashes between different patients are caught by the partial unique
+    constraint on active appointments rather than a separate lookup.
+    """
+    if not availability.in_schedule(doctor.pk, date, time_slot):
+        raise SlotUnavailable("The doctor does not work at this time.")
+    try:
+        with transaction.atomic():
+            list(CustomUser.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+            day_count = Appointment.objects.filter(
+                user=user,
+                date=date
+            ).exclude(status='cancelled').count()
+            if day_count >= MAX_APPOINTMENTS_PER_DAY:
+                raise DailyLimitReached("You can only book two appointments per day.")
+            return Appointment.objects.create(
+                user=user,
+                doctor=doctor,
+                date=date,
+                time_slot=time_slot,
+                reason=reason,
+                status='pending'
+            )
+    except IntegrityError:
+        # only a clash on the active-slot constraint means the slot is taken;
+        # backends name it differently, so look for the clashing row instead
+        taken = Appointment.objects.filter(
+            doctor=doctor, date=date, time_slot=time_slot
+        ).exclude(status='cancelled').exists()
+        if not taken:
+            raise
+        # the cached bitmap offered a taken slot; let the next read rebuild it
+        availability.invalidate(doctor.pk, date)
+        raise SlotUnavailable("This time slot is already booked for this doctor.")
+
+
+def change_status(doctor, appointment_ids, action):
+    """Confirm or cancel many of a doctor's appointments with one conditional UPDATE.
+
+    Ownership, the allowed source statuses and the not-yet-started rule are
+    all part of the UPDATE's WHERE clause; the locked pre-select only serves
+    to report an outcome per id: ``updated``, ``not_found`` (missing or
+    another doctor's), ``expired`` or ``invalid_status``.
+    """
+    new_status, from_statuses = STATUS_ACTIONS[action]
+    now = timezone.now()
+    ids = set(appointment_ids)
+    with transaction.atomic():
+        rows = list(
+            Appointment.objects.select_for_update().filter(id__in=ids, doctor=doctor).with_expiry(now)
+            .values_list('id', 'date', 'time_slot', 'status', 'is_expired')
+        )
+        Appointment.objects.filter(
+            id__in=ids, doctor=doctor, status__in=from_statuses
+        ).upcoming(now).update(status=new_status, updated_at=timezone.now())
+
+    outcomes = dict.fromkeys(ids, 'not_found')
+    changes = []
+    for pk, date, time_slot, status, is_expired in rows:
+        if is_expired:
+            outcomes[pk] = 'expired'
+        elif status not in from_statuses:
+            outcomes[pk] = 'invalid_status'
+        else:
+            outcomes[pk] = 'updated'
+            changes.append((
+                pk,
+                (doctor.pk, date, time_slot, status),
+                (doctor.pk, date, time_slot, new_status),
+            ))
+    if changes:
+        # update() skips post_save, so cache upkeep listens for this instead
+        appointments_updated.send(sender=Appointment, changes=changes)
+    return outcomes
+
+
+# open status: terminal status it is swept into once its time has passed
+SWEEP_TRANSITIONS = {
+    'pending': 'expired',
+    'confirmed': 'completed',
+}
+SWEEP_BATCH_SIZE = 1000
+
+
+def sweep_past_due(now=None, batch_size=SWEEP_BATCH_SIZE):
+    """Move past-due open appointments into their terminal status.
+
+    Works in batches of ``batch_size`` ids, each its own short transaction
+    with one UPDATE per source status, so a large backlog never holds the
+    write lock for long. Returns how many appointments were swept.
+    """
+    now = now or timezone.now()
+    swept = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Appointment.objects.past_due(now).order_by('status', 'date', 'time_slot')
+                .values_list('id', 'doctor_id', 'date', 'time_slot', 'status')[:batch_size]
+            )
+            for status, terminal in SWEEP_TRANSITIONS.items():
+                ids = [pk for pk, _, _, _, row_status in rows if row_status == status]
+                if ids:
+                    Appointment.objects.filter(id__in=ids, status=status).update(
+                        status=terminal, updated_at=timezone.now()
+                    )
+        if rows:
+            appointments_updated.send(sender=Appointment, changes=[
+                (pk, (doctor_id, date, time_slot, status), (doctor_id, date, time_slot, SWEEP_TRANSITIONS[status]))
+                for pk, doctor_id, date, time_slot, status in rows
+            ])
+        swept += len(rows)
+        if len(rows) < batch_size:
+            return swept
@@ -0,0 +1,117 @@
+"""Accepting contact form submissions.
+
+Resubmissions of the same message are dropped using the indexed
+``message_hash``. With ``CONTACT_WRITE_BEHIND`` on, submissions are held in
+a per-process buffer and written in ``bulk_create`` batches, so a burst
+takes the SQLite write lock a few times rather than once per message. A
+failed write is retried with the next flush. The buffer is memory only: a
+worker that dies loses what it has not flushed.
+"""
+import atexit
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from . import dashboard
+from .models import ContactSubmission
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_WINDOW = datetime.timedelta(days=1)
+BUFFER_SIZE = 50
+FLUSH_SECONDS = 5
+
+
+def is_duplicate(message_hash, now=None):
+    now = now or timezone.now()
+    if message_hash in buffer.pending_hashes():
+        return True
+    return ContactSubmission.objects.filter(
+        message_hash=message_hash, submitted_at__gte=now - DUPLICATE_WINDOW
+    ).exists()
+
+
+def submit(contact):
+    """Store ``contact`` now or via the buffer; ``False`` if it repeats a recent message."""
+    contact.message_hash = ContactSubmission.hash_message(contact.email, contact.message)
+    if is_duplicate(contact.message_hash):
+        return False
+    if getattr(settings, 'CONTACT_WRITE_BEHIND', False):
+        buffer.add(contact)
+    else:
+        contact.save()
+    return True
+
+
+class WriteBehindBuffer:
+    def __init__(self, size=BUFFER_SIZE, interval=FLUSH_SECONDS):
+        self.size = size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+
+    def pending_hashes(self):
+        with self._lock:
+            return {contact.message_hash for contact in self._pending}
+
+    def _schedule(self):
+        # called with the lock held
+        if self._timer is None:
+            self._timer = threading.Timer(self.interval, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def add(self, contact):
+        with self._lock:
+            self._pending.append(contact)
+            full = len(self._pending) >= self.size
+            if not full:
+                self._schedule()
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # the submission is kept in the buffer; the timer retries it
+                logger.exception("Could not write buffered contact submissions")
+
+    def flush(self):
+        """Write out everything buffered; returns the number of rows inserted.
+
+        If the insert fails the submissions go back to the front of the
+        buffer for the next flush, and the error is raised.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        try:
+            ContactSubmission.objects.bulk_create(pending)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = pending
+                self._schedule()
+            raise
+        # bulk_create sends no post_save, so the cached message counter is recounted instead
+        dashboard.invalidate_messages(timezone.localdate())
+        return len(pending)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write buffered contact submissions")
+        finally:
+            # the timer thread's connection would otherwise stay open
+            connection.close()
+
+
+buffer = WriteBehindBuffer()
+atexit.register(buffer.flush)
@@ -0,0 +1,133 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .models import Appointment, ContactSubmission, CustomUser
+
+# bounds how long a counter rebuilt from a read that raced a commit can linger
+CACHE_TIMEOUT = 60 * 15
+
+
+def _appointments_key(doctor_id, day):
+    return f"dashboard:{doctor_id}:appointments:{day.isoformat()}"
+
+
+def _patients_key(doctor_id):
+    return f"dashboard:{doctor_id}:patients"
+
+
+def _messages_key(day):
+    return f"dashboard:messages:{day.isoformat()}"
+
+
+def _count(queryset, field='id', distinct=False):
+    # COUNT() as a scalar subquery; Func keeps the ORM from adding a GROUP BY
+    template = '%(function)s(DISTINCT %(expressions)s)' if distinct else '%(function)s(%(expressions)s)'
+    return Subquery(
+        queryset.order_by().annotate(n=Func(F(field), function='COUNT', template=template)).values('n'),
+        output_field=IntegerField(),
+    )
+
+
+def _counter_keys(doctor_id, today):
+    return {
+        _appointments_key(doctor_id, today): 'todays_appointments',
+        _messages_key(today): 'todays_messages',
+        _patients_key(doctor_id): 'unique_patients',
+    }
+
+
+def _counters_query(doctor_id, today):
+    return CustomUser.objects.filter(pk=doctor_id).annotate(
+        todays_appointments=_count(
+            Appointment.objects.filter(doctor=OuterRef('pk'), date=today).exclude(status='cancelled')
+        ),
+        todays_messages=_count(ContactSubmission.objects.submitted_on(today)),
+        # live and archived patients together, from the roster's UNION of patient ids
+        unique_patients=RawSQL(*CustomUser.objects.patients_of(doctor_id).count_sql(), output_field=IntegerField()),
+    ).values('todays_appointments', 'todays_messages', 'unique_patients')
+
+
+def doctor_counters(doctor_id):
+    """Return today's appointment and message counts and the doctor's distinct patients.
+
+    Counters live in the cache and are dropped by signal handlers once a
+    change commits; when any is missing all three are recomputed in one query.
+    """
+    today = timezone.localdate()
+    keys = _counter_keys(doctor_id, today)
+    cached = cache.get_many(keys)
+    if len(cached) == len(keys):
+        return {name: cached[key] for key, name in keys.items()}
+    row = _counters_query(doctor_id, today).first()
+    counters = {name: (row or {}).get(name) or 0 for name in keys.values()}
+    cache.set_many({key: counters[name] for key, name in keys.items()}, CACHE_TIMEOUT)
+    return counters
+
+
+async def adoctor_counters(doctor_id):
+    """Async variant of :func:`doctor_counters` for async views."""
+    today = timezone.localdate()
+    keys = _counter_keys(doctor_id, today)
+    cached = await cache.aget_many(keys)
+    if len(cached) == len(keys):
+        return {name: cached[key] for key, name in keys.items()}
+    row = await _counters_query(doctor_id, today).afirst()
+    counters = {name: (row or {}).get(name) or 0 for name in keys.values()}
+    await cache.aset_many({key: counters[name] for key, name in keys.items()}, CACHE_TIMEOUT)
+    return counters
+
+
+def _delete_on_commit(keys):
+    # counters are dropped rather than adjusted: an incr on one worker's copy
+    # leaves the others stale, and a rolled-back change must not count
+    keys = list(keys)
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def appointment_created(appointment):
+    if appointment.doctor_id is None:
+        return
+    _delete_on_commit([
+        _appointments_key(appointment.doctor_id, appointment.date), _patients_key(appointment.doctor_id)
+    ])
+
+
+def appointment_changed(old, new):
+    """Drop the counters a saved appointment affects; states are ``slot_state()`` tuples."""
+    old_doctor, old_date, _, old_status = old
+    new_doctor, new_date, _, new_status = new
+    if (old_doctor, old_date) != (new_doctor, new_date):
+        appointment_removed(old_doctor, old_date)
+        appointment_removed(new_doctor, new_date)
+    elif new_doctor is not None and (old_status == 'cancelled') != (new_status == 'cancelled'):
+        _delete_on_commit([_appointments_key(new_doctor, new_date)])
+
+
+def appointment_removed(doctor_id, day):
+    if doctor_id is None:
+        return
+    _delete_on_commit([_appointments_key(doctor_id, day), _patients_key(doctor_id)])
+
+
+def invalidate(doctor_ids):
+    today = timezone.localdate()
+    cache.delete_many(
+        [_appointments_key(doctor_id, today) for doctor_id in doctor_ids]
+        + [_patients_key(doctor_id) for doctor_id in doctor_ids]
+    )
+
+
+def invalidate_messages(day):
+    cache.delete(_messages_key(day))
+
+
+def contact_created(contact):
+    _delete_on_commit([_messages_key(timezone.localdate(contact.submitted_at))])
+
+
+def contact_removed(contact):
+    _delete_on_commit([_messages_key(timezone.localdate(contact.submitted_at))])
@@ -0,0 +1,74 @@
+from django.core.cache import cache
+
+from .models import CustomUser
+
+CACHE_KEY = 'doctor_directory'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# Past this many doctors the booking form swaps its <select> for a typeahead.
+SELECT_LIMIT = 200
+SEARCH_LIMIT = 20
+
+# Fields an entry is built from; saves touching none of them leave it valid.
+DIRECTORY_FIELDS = frozenset({'username', 'first_name', 'last_name', 'specialization', 'role'})
+
+
+def _entry(doctor_id, username, first_name, last_name, specialization):
+    name = CustomUser(username=username, first_name=first_name, last_name=last_name).get_display_name()
+    return {
+        'id': doctor_id,
+        'name': name,
+        'specialization': specialization or '',
+        'label': f"{name} - {specialization}" if specialization else name,
+    }
+
+
+def doctors():
+    """Return every doctor as an ``{id, name, specialization, label}`` dict.
+
+    The list is cached as a whole and rebuilt from a single ``values_list``
+    query whenever a doctor's row changes.
+    """
+    entries = cache.get(CACHE_KEY)
+    if entries is None:
+        rows = CustomUser.objects.filter(role='doctor').order_by(
+            'last_name', 'first_name', 'id'
+        ).values_list('id', 'username', 'first_name', 'last_name', 'specialization')
+        entries = [_entry(*row) for row in rows]
+        cache.set(CACHE_KEY, entries, CACHE_TIMEOUT)
+    return entries
+
+
+def choices():
+    return [(entry['id'], entry['label']) for entry in doctors()]
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Return doctors whose name or specialization contains every word of ``query``."""
+    terms = query.casefold().split()
+    results = []
+    for entry in doctors():
+        haystack = f"{entry['name']} {entry['specialization']}".casefold()
+        if all(term in haystack for term in terms):
+            results.append(entry)
+            if len(results) == limit:
+                break
+    return results
+
+
+def user_changed(user, update_fields=None):
+    """Drop the cached directory if a save or delete of ``user`` affects it."""
+    if update_fields is not None and not DIRECTORY_FIELDS.intersection(update_fields):
+        return
+    if user.role == 'doctor' or _is_listed(user.pk):
+        invalidate()
+
+
+def _is_listed(user_id):
+    # catches a doctor whose role was just changed to something else
+    entries = cache.get(CACHE_KEY)
+    return entries is not None and any(entry['id'] == user_id for entry in entries)
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
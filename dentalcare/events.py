@@ -0,0 +1,106 @@
+"""In-process fan-out of appointment events to doctors' Server-Sent Events streams.
+
+Signal handlers publish from whatever thread saved the appointment; each
+open stream owns an ``asyncio.Queue`` on its event loop and is woken with
+``call_soon_threadsafe``. Events only reach streams served by the same
+process, so with several workers a doctor sees the bookings made through
+the worker their stream is connected to.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+QUEUE_SIZE = 100
+# the kinds of change a stream is told about
+EVENT_TYPES = ('created', 'confirmed', 'cancelled')
+
+
+class Subscription:
+    def __init__(self, broadcaster, doctor_id, loop, queue):
+        self.broadcaster = broadcaster
+        self.doctor_id = doctor_id
+        self.loop = loop
+        self.queue = queue
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class Broadcaster:
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, doctor_id):
+        """Register a stream for ``doctor_id``; call from the stream's event loop."""
+        subscription = Subscription(
+            self, doctor_id, asyncio.get_running_loop(), asyncio.Queue(maxsize=self.queue_size)
+        )
+        with self._lock:
+            self._subscriptions[doctor_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.doctor_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.doctor_id]
+
+    def publish(self, doctor_id, event):
+        """Hand ``event`` to every stream of ``doctor_id``; safe to call from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(doctor_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(_deliver, subscription.queue, event)
+            except RuntimeError:
+                # the stream's loop has shut down; its finally clause unsubscribes it
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+def _deliver(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # a stalled client misses events rather than growing the queue
+        pass
+
+
+broadcaster = Broadcaster()
+
+
+def appointment_event(event_type, appointment_id, state):
+    """Publish an appointment event to its doctor once the transaction commits.
+
+    ``state`` is the appointment's ``slot_state()`` after the change.
+    """
+    doctor_id, date, time_slot, status = state
+    if doctor_id is None or event_type not in EVENT_TYPES:
+        return
+    event = {
+        'type': event_type,
+        'id': appointment_id,
+        'date': date.isoformat(),
+        'time_slot': time_slot.isoformat(),
+        'status': status,
+    }
+    transaction.on_commit(lambda: broadcaster.publish(doctor_id, event))
+
+
+def status_event_type(old_status, new_status):
+    """The event a status change announces, or ``None`` for uninteresting changes."""
+    if old_status == new_status:
+        return None
+    return {'confirmed': 'confirmed', 'cancelled': 'cancelled'}.get(new_status)
@@ -1,13 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from .models import CustomUser, Appointment, ContactSubmission
+from . import directory
 import datetime
 
-TIME_CHOICES = [
-    (datetime.time(hour, 0), f"{hour:02d}:00") for hour in range(9, 18)
-]
-
-
 class CustomUserSignUpForm(UserCreationForm):
     first_name = forms.CharField(required=True, widget=forms.TextInput(attrs={
         'class': 'form-control',
@@ -69,11 +65,29 @@ class LoginForm(AuthenticationForm):
     }))
 
 
+class DoctorSelect(forms.Select):
+    """Doctor <select> that becomes a search box once the directory is too large to list."""
+    typeahead_template_name = 'widgets/doctor_typeahead.html'
+
+    def render(self, name, value, attrs=None, renderer=None):
+        choices = list(self.choices)
+        if len(choices) <= directory.SELECT_LIMIT:
+            return super().render(name, value, attrs, renderer)
+        value = '' if value is None else str(value)
+        context = {'widget': {
+            'name': name,
+            'value': value,
+            'label': dict((str(pk), label) for pk, label in choices).get(value, ''),
+            'attrs': self.build_attrs(self.attrs, attrs),
+        }}
+        return self._render(self.typeahead_template_name, context, renderer)
+
+
 class AppointmentForm(forms.ModelForm):
     doctor = forms.ModelChoiceField(
         queryset=CustomUser.objects.filter(role='doctor'),
         empty_label="Select a Doctor",
-        widget=forms.Select(attrs={'class': 'form-control'}),
+        widget=DoctorSelect(attrs={'class': 'form-control'}),
         required=True
     )
     date = forms.DateField(
@@ -84,12 +98,8 @@ class AppointmentForm(forms.ModelForm):
         }),
         initial=datetime.date.today
     )
-    time_slot = forms.TimeField(
-        widget=forms.Select(
-            choices=TIME_CHOICES,
-            attrs={'class': 'form-control'}
-        )
-    )
+    # offered slots depend on the doctor's schedule and are rendered by the view
+    time_slot = forms.TimeField(widget=forms.HiddenInput)
     reason = forms.CharField(
         required=False,
         widget=forms.Textarea(attrs={
@@ -105,8 +115,9 @@ class AppointmentForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Customize doctor display
-        self.fields['doctor'].label_from_instance = lambda obj: obj.get_display_name() + (f" - {obj.specialization}" if obj.specialization else "")
+        # Choices come lazily from the cached directory; the queryset only validates submissions
+        field = self.fields['doctor']
+        field.choices = lambda: [('', field.empty_label), *directory.choices()]
 
 
 class ContactForm(forms.ModelForm):
@@ -0,0 +1,141 @@
+import datetime
+
+from django.core import signing
+from django.db.models import Count, F, Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from . import schedules
+from .exports import CHUNK_SIZE, batched
+from .models import Appointment, CustomUser
+
+TOKEN_SALT = 'dentalcare.ics'
+# how far back the feed reaches; every future appointment is included
+PAST_DAYS = 90
+
+EVENT_STATUS = {
+    'pending': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+    'completed': 'CONFIRMED',
+    'expired': 'CANCELLED',
+    'cancelled': 'CANCELLED',
+}
+
+
+def feed_token(doctor):
+    return signing.Signer(salt=TOKEN_SALT).sign(f"{doctor.pk}-{doctor.calendar_feed_version}")
+
+
+def doctor_from_token(token):
+    """Return the doctor id a feed token was issued for, or ``None`` if it is forged or revoked."""
+    try:
+        doctor_id, version = map(int, signing.Signer(salt=TOKEN_SALT).unsign(token).split('-'))
+    except (signing.BadSignature, ValueError):
+        return None
+    current = CustomUser.objects.filter(
+        pk=doctor_id, role='doctor', calendar_feed_version=version
+    ).exists()
+    return doctor_id if current else None
+
+
+def rotate_feed_token(doctor):
+    """Revoke the doctor's current feed link; returns the new token."""
+    CustomUser.objects.filter(pk=doctor.pk).update(calendar_feed_version=F('calendar_feed_version') + 1)
+    doctor.refresh_from_db(fields=['calendar_feed_version'])
+    return feed_token(doctor)
+
+
+def window_start():
+    return timezone.localdate() - datetime.timedelta(days=PAST_DAYS)
+
+
+def feed_state(doctor_id):
+    """``(etag, last_modified)`` of a doctor's feed from one aggregate query.
+
+    Only the rows the feed serves are aggregated. The row count catches
+    deletions, which leave no ``updated_at`` behind, the patients' latest
+    edit catches renames shown in the event titles, and the window start
+    turns the tag over as old days drop out.
+    """
+    start = window_start()
+    state = Appointment.objects.filter(doctor_id=doctor_id, date__gte=start).aggregate(
+        latest=Max('updated_at'), patients_latest=Max('user__updated_at'), total=Count('id')
+    )
+    latest = max(filter(None, [state['latest'], state['patients_latest']]), default=None)
+    etag = f"{doctor_id}-{state['total']}-{latest.timestamp() if latest else 0}-{start.isoformat()}"
+    return etag, latest
+
+
+def _escape(text):
+    return (
+        text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    # content lines are limited to 75 octets; continuation lines start with a space
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1  # never split inside a UTF-8 sequence
+        parts.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _events(rows, slot_length):
+    for pk, date, time_slot, status, reason, updated_at, username, first_name, last_name in rows:
+        start = timezone.make_aware(datetime.datetime.combine(date, time_slot))
+        patient = f"{first_name} {last_name}".strip() or username
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:appointment-{pk}@dentalcare',
+            f'DTSTAMP:{_utc(updated_at)}',
+            f'LAST-MODIFIED:{_utc(updated_at)}',
+            f'DTSTART:{_utc(start)}',
+            f'DTEND:{_utc(start + slot_length)}',
+            f'SUMMARY:{_escape(f"Appointment: {patient}")}',
+            f'STATUS:{EVENT_STATUS.get(status, "TENTATIVE")}',
+        ]
+        if reason:
+            lines.append(f'DESCRIPTION:{_escape(reason)}')
+        lines.append('END:VEVENT')
+        yield ''.join(_fold(line) for line in lines)
+
+
+def _calendar(doctor_name, rows, slot_length):
+    yield 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//DentalCare//Appointments//EN\r\nCALSCALE:GREGORIAN\r\n'
+    yield _fold(f'X-WR-CALNAME:{_escape(doctor_name)}')
+    yield from _events(rows, slot_length)
+    yield 'END:VCALENDAR\r\n'
+
+
+def feed_response(doctor):
+    """Stream a doctor's appointments as an iCalendar document.
+
+    Rows are read in server-side chunks and written out in batches, so
+    long date ranges never sit in memory as a whole.
+    """
+    rows = Appointment.objects.filter(
+        doctor=doctor, date__gte=window_start()
+    ).order_by('date', 'time_slot', 'id').values_list(
+        'id', 'date', 'time_slot', 'status', 'reason', 'updated_at',
+        'user__username', 'user__first_name', 'user__last_name'
+    ).iterator(chunk_size=CHUNK_SIZE)
+    grid = schedules.grids([doctor.pk])[doctor.pk]
+    slot_length = datetime.timedelta(minutes=grid.get('slot_minutes', schedules.DEFAULT_SLOT_MINUTES))
+    response = StreamingHttpResponse(
+        batched(_calendar(doctor.get_display_name(), rows, slot_length), size=200),
+        content_type='text/calendar; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'inline; filename="appointments-{doctor.pk}.ics"'
+    return response
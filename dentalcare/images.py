@@ -0,0 +1,107 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = 'profiles'
+THUMBNAIL_DIR = 'profiles/thumbs'
+# avatars render at 96px; 192px covers high-density screens
+THUMBNAIL_SIZES = (96, 192)
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_QUALITY = 80
+
+# thumbnails are produced off the request path, after the upload is committed
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnails')
+
+
+def content_name(upload):
+    """Return a storage name derived from the SHA-256 of the uploaded bytes."""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    extension = os.path.splitext(upload.name)[1].lower() or '.img'
+    return f"{PROFILE_DIR}/{digest.hexdigest()}{extension}"
+
+
+def thumbnail_name(name, size):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f"{THUMBNAIL_DIR}/{stem}_{size}.{THUMBNAIL_FORMAT.lower()}"
+
+
+def avatar_name(name):
+    return thumbnail_name(name, THUMBNAIL_SIZES[-1])
+
+
+def store_profile_image(user, upload):
+    """Save ``upload`` under its content hash and point ``user.profile_image`` at it.
+
+    Identical uploads share one file, so nothing is written if it already exists.
+    """
+    name = content_name(upload)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, upload)
+    user.profile_image = name
+    # a shared file may already have its thumbnail; otherwise it is recorded once rendered
+    target = avatar_name(name)
+    user.avatar_thumbnail = target if default_storage.exists(target) else ''
+    return name
+
+
+def generate_thumbnails(name):
+    with default_storage.open(name, 'rb') as handle:
+        original = ImageOps.exif_transpose(Image.open(handle))
+        original = original.convert('RGBA' if original.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    for size in THUMBNAIL_SIZES:
+        target = thumbnail_name(name, size)
+        if default_storage.exists(target):
+            continue
+        buffer = io.BytesIO()
+        ImageOps.fit(original, (size, size), Image.LANCZOS).save(
+            buffer, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY, method=4
+        )
+        default_storage.save(target, ContentFile(buffer.getvalue()))
+
+
+def record_thumbnail(name):
+    """Point every user showing ``name`` at its avatar thumbnail; returns the rows updated.
+
+    Storing the name lets ``avatar_url`` render without asking the storage
+    whether the thumbnail exists yet.
+    """
+    from .models import CustomUser
+
+    return CustomUser.objects.filter(profile_image=name).update(avatar_thumbnail=avatar_name(name))
+
+
+def _generate_safely(name):
+    try:
+        generate_thumbnails(name)
+        record_thumbnail(name)
+    except Exception:
+        logger.exception("Could not create thumbnails for %s", name)
+    finally:
+        # the worker thread's connection would otherwise stay open
+        connection.close()
+
+
+def schedule_thumbnails(name):
+    transaction.on_commit(lambda: _executor.submit(_generate_safely, name))
+
+
+def discard_if_unused(name):
+    """Delete a replaced image and its thumbnails unless another user still shares it."""
+    from .models import CustomUser
+
+    if not name or CustomUser.objects.filter(profile_image=name).exists():
+        return
+    for target in [name] + [thumbnail_name(name, size) for size in THUMBNAIL_SIZES]:
+        default_storage.delete(target)
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dentalcare import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move finished appointments and old contact submissions into the archive "
+        "tables, then VACUUM and ANALYZE the database. Run from cron in a quiet hour."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE)
+        parser.add_argument('--no-compact', action='store_true', help="Skip VACUUM/ANALYZE.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        started = time.monotonic()
+        appointments = archive.archive_appointments(batch_size=options['batch_size'])
+        contacts = archive.archive_contacts(batch_size=options['batch_size'])
+        self.stdout.write(
+            f"Archived {appointments} appointments and {contacts} contact submissions "
+            f"in {time.monotonic() - started:.2f}s."
+        )
+        if not options['no_compact']:
+            started = time.monotonic()
+            archive.compact()
+            self.stdout.write(f"Compacted the database in {time.monotonic() - started:.2f}s.")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from dentalcare import images
+from dentalcare.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Render missing avatar thumbnails and record them on the users showing them. "
+        "Run once after upgrading, and again if background rendering ever failed."
+    )
+
+    def handle(self, *args, **options):
+        names = (
+            CustomUser.objects.filter(avatar_thumbnail='').exclude(profile_image='')
+            .exclude(profile_image__isnull=True).order_by().values_list('profile_image', flat=True).distinct()
+        )
+        users = failed = 0
+        for name in list(names):
+            try:
+                images.generate_thumbnails(name)
+            except Exception as e:
+                self.stderr.write(f"{name}: {e}")
+                failed += 1
+                continue
+            users += images.record_thumbnail(name)
+        self.stdout.write(self.style.SUCCESS(f"Recorded thumbnails for {users} users; {failed} images failed."))
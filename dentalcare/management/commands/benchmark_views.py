@@ -0,0 +1,202 @@
+import datetime
+import functools
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from dentalcare import ics, urls
+from dentalcare.models import Appointment, ContactSubmission, CustomUser
+
+# Views that change one row per request; repeating them measures nothing useful.
+UNSAFE_VIEWS = {
+    'log_out', 'cancel_appointment', 'confirm_appointment', 'delete_contact', 'reset_calendar_feed',
+}
+SEED_OPTIONS = ('doctors', 'patients', 'appointments', 'contacts')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every view in dentalcare.urls through the test client and report "
+        "p50/p95 latency and query counts per view. Runs against a separate test "
+        "database filled by seed_demo_data, never the configured one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--doctor', help="Username to browse doctor views as (default: busiest doctor).")
+        parser.add_argument('--patient', help="Username to browse patient views as (default: any patient).")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="Keep the seeded benchmark database for the next run.")
+        for name in SEED_OPTIONS:
+            parser.add_argument(f'--{name}', type=int, help="Passed to seed_demo_data when seeding.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            # the default SQLite test database lives in memory, which would flatter every timing
+            connection.settings_dict['TEST']['NAME'] = f"{old_name}.benchmark"
+        test_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb']
+        )
+        # a shared cache must not serve, or be filled with, the benchmark database's rows
+        benchmark_caches = {
+            alias: {**config, 'KEY_PREFIX': f"benchmark{config.get('KEY_PREFIX', '')}"}
+            for alias, config in settings.CACHES.items()
+        }
+        try:
+            with override_settings(CACHES=benchmark_caches):
+                if not CustomUser.objects.exists():
+                    self.stdout.write(f"Seeding {test_name} ...")
+                    seed = {name: options[name] for name in SEED_OPTIONS if options[name] is not None}
+                    call_command('seed_demo_data', stdout=self.stdout, **seed)
+                self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+    def benchmark(self, options):
+        doctor = self.pick_user('doctor', options['doctor'])
+        patient = self.pick_user('patient', options['patient'])
+        contact = ContactSubmission.objects.order_by('-submitted_at').first()
+        if contact is None:
+            raise CommandError("No contact submissions to browse; seed with --contacts above 0.")
+        today = datetime.date.today()
+        tomorrow = (today + datetime.timedelta(days=1)).isoformat()
+        appointment_ids = list(
+            Appointment.objects.filter(doctor=doctor, date__gte=today).order_by('date').values_list('id', flat=True)[:20]
+        )
+        if not appointment_ids:
+            raise CommandError(f"{doctor.username} has no upcoming appointments to browse.")
+        contact_ids = ','.join(str(pk) for pk in ContactSubmission.objects.order_by('-id').values_list('id', flat=True)[:20])
+        batch_ids = ','.join(map(str, appointment_ids))
+
+        # name -> (user, method, path, data)
+        scenarios = {
+            'home': (doctor, 'get', reverse('home'), None),
+            'log_in': (None, 'get', reverse('log_in'), None),
+            'sign_up': (None, 'get', reverse('sign_up'), None),
+            'doctor_index': (doctor, 'get', reverse('doctor_index'), None),
+            'book_appointment': (patient, 'post', reverse('book_appointment'),
+                                 {'check_availability': '1', 'doctor': doctor.id, 'date': tomorrow}),
+            'availability_search': (patient, 'get', reverse('availability_search'), {'days': 14}),
+            'doctor_search': (patient, 'get', reverse('doctor_search'), {'q': doctor.first_name[:3]}),
+            'my_appointments': (patient, 'get', reverse('my_appointments'), None),
+            'total_appointments': (doctor, 'get', reverse('total_appointments'), None),
+            'export_appointments': (doctor, 'get', reverse('export_appointments'), {'date': tomorrow}),
+            # after the warm-up request these are already confirmed, so this times the checks and the no-op UPDATE
+            'bulk_appointment_status': (doctor, 'post', reverse('bulk_appointment_status'),
+                                        {'action': 'confirm', 'ids': appointment_ids}),
+            'contact_page': (None, 'get', reverse('contact_page'), None),
+            'received_contacts': (doctor, 'get', reverse('received_contacts'), None),
+            'export_contacts': (doctor, 'get', reverse('export_contacts'), {'date': today.isoformat()}),
+            'view_contact': (doctor, 'get', reverse('view_contact', args=[contact.id]), None),
+            'utilization_report': (doctor, 'get', reverse('utilization_report'), {'doctor': doctor.id}),
+            'doctor_patients': (doctor, 'get', reverse('doctor_patients'), None),
+            'profile': (patient, 'get', reverse('profile'), None),
+            'edit_profile': (patient, 'get', reverse('edit_profile'), None),
+            'doctor_calendar': (None, 'get', reverse('doctor_calendar', args=[ics.feed_token(doctor)]), None),
+            # the test client is not ASGI, so this times the handshake that turns WSGI clients away
+            'appointment_events': (doctor, 'get', reverse('appointment_events'), None),
+            'metrics': (doctor, 'get', reverse('metrics'), None),
+            'api_appointments': (doctor, 'get', reverse('api_appointments'), {'limit': 50}),
+            'api_appointments_batch': (doctor, 'get', reverse('api_appointments_batch'), {'ids': batch_ids}),
+            'api_appointments_status': (doctor, 'post', reverse('api_appointments_status'),
+                                        json.dumps({'action': 'confirm', 'ids': appointment_ids})),
+            'api_appointment_detail': (doctor, 'get', reverse('api_appointment_detail', args=[appointment_ids[0]]), None),
+            'api_doctors': (patient, 'get', reverse('api_doctors'), None),
+            'api_contacts': (doctor, 'get', reverse('api_contacts'), {'limit': 50}),
+            'api_contacts_batch': (doctor, 'get', reverse('api_contacts_batch'), {'ids': contact_ids}),
+            'api_contact_detail': (doctor, 'get', reverse('api_contact_detail', args=[contact.id]), None),
+        }
+
+        names = [pattern.name for pattern in urls.urlpatterns if pattern.name]
+        missing = [name for name in names if name not in scenarios and name not in UNSAFE_VIEWS]
+        if missing:
+            raise CommandError(
+                f"No benchmark scenario for: {', '.join(missing)}. Add one, or list the view in UNSAFE_VIEWS."
+            )
+        results = {}
+        clients = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name in names:
+                if name in UNSAFE_VIEWS:
+                    continue
+                user, method, path, data = scenarios[name]
+                if user not in clients:
+                    clients[user] = Client()
+                    if user is not None:
+                        clients[user].force_login(user)
+                results[name] = self.measure(clients[user], method, path, data, options['iterations'])
+                self.stdout.write(
+                    f"{name:24} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+                    f"queries {results[name]['queries']:4}  status {results[name]['status']}"
+                )
+        skipped = [name for name in names if name in UNSAFE_VIEWS]
+        self.stdout.write(f"Not driven (change data on every request): {', '.join(skipped)}")
+
+        report = {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'iterations': options['iterations'],
+            'rows': {
+                'doctors': CustomUser.objects.filter(role='doctor').count(),
+                'patients': CustomUser.objects.filter(role='patient').count(),
+                'appointments': Appointment.objects.count(),
+                'contacts': ContactSubmission.objects.count(),
+            },
+            'views': results,
+            'skipped': skipped,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def pick_user(self, role, username):
+        users = CustomUser.objects.filter(role=role)
+        if username:
+            user = users.filter(username=username).first()
+        elif role == 'doctor':
+            user = users.order_by('-doctor_appointments__date').first()
+        else:
+            user = users.filter(patient_appointments__isnull=False).first() or users.first()
+        if user is None:
+            raise CommandError(f"No {role} found; run seed_demo_data first or pass --{role}.")
+        return user
+
+    def measure(self, client, method, path, data, iterations):
+        if isinstance(data, str):
+            # a JSON body
+            request = functools.partial(getattr(client, method), content_type='application/json')
+        else:
+            request = getattr(client, method)
+        request(path, data)  # warm caches and imports
+        timings, queries, status = [], 0, None
+        for _ in range(max(1, iterations)):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request(path, data)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries, status = len(captured), response.status_code
+        return {
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'mean_ms': round(statistics.fmean(timings), 3),
+            'queries': queries,
+            'status': status,
+        }
@@ -0,0 +1,281 @@
+import csv
+import datetime
+import json
+import time
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from dentalcare import availability, dashboard, directory, summary
+from dentalcare.booking import MAX_APPOINTMENTS_PER_DAY
+from dentalcare.models import Appointment, CustomUser
+
+# (id, date) pairs per lookup query, well under every backend's parameter limit
+PAIR_CHUNK = 1000
+
+USER_FIELDS = (
+    'first_name', 'last_name', 'email', 'phone', 'gender', 'specialization', 'qualification',
+)
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path, fmt):
+    """Yield ``(line_number, row_dict)`` from a CSV or JSON-lines file."""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if fmt == 'jsonl':
+            for number, line in enumerate(handle, start=1):
+                if line.strip():
+                    try:
+                        yield number, json.loads(line)
+                    except ValueError:
+                        yield number, None
+        else:
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _active_by_pairs(column, pairs, extra='id'):
+    """Yield ``(column value, date, extra)`` for active appointments matching any pair.
+
+    Joining against a VALUES list keeps this to one indexed query per chunk;
+    building the equivalent OR of Q objects costs more than the import itself.
+    """
+    table = Appointment._meta.db_table
+    date_field = Appointment._meta.get_field('date')
+    extra_field = Appointment._meta.get_field(extra)
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for chunk in batched(pairs, PAIR_CHUNK):
+            params = []
+            for value, date in chunk:
+                params += [value, connection.ops.adapt_datefield_value(date)]
+            cursor.execute(
+                f"SELECT a.{qn(column)}, a.{qn('date')}, a.{qn(extra)} "
+                f"FROM (VALUES {', '.join(['(%s, %s)'] * len(chunk))}) AS v "
+                f"JOIN {qn(table)} AS a ON a.{qn(column)} = v.column1 AND a.{qn('date')} = v.column2 "
+                f"WHERE a.{qn('status')} <> 'cancelled'",
+                params,
+            )
+            for value, date, other in cursor.fetchall():
+                yield value, date_field.to_python(date), extra_field.to_python(other)
+
+
+def _text(row, key):
+    value = row.get(key)
+    return str(value).strip() if value not in (None, '') else ''
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import doctors/patients or historical appointments from CSV or JSON lines. "
+        "Rows are validated in batches with the same rules as online booking "
+        "(doctor role, one active booking per doctor slot, two per patient per day) "
+        "and written with bulk_create, one transaction per batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--kind', choices=['users', 'appointments'], required=True)
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Input format; defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Rows validated and committed per transaction.")
+        parser.add_argument('--rejects', help="Write rejected rows (line, reason) to this CSV file.")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, write nothing.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        self.dry_run = options['dry_run']
+        self.rejected = []
+        self.usernames = {}
+        self.seen_usernames = set()
+        self.touched_slots = set()
+        # imports tend to share a handful of initial passwords; hashing is the slow part
+        self.password_hashes = {None: make_password(None)}
+        # rows of earlier batches are only visible in the database when written
+        self.dry_run_slots = set()
+        self.dry_run_per_day = Counter()
+
+        importer = self.import_users if options['kind'] == 'users' else self.import_appointments
+        started = time.monotonic()
+        try:
+            imported = sum(importer(batch) for batch in batched(read_rows(path, fmt), options['batch_size']))
+        except FileNotFoundError:
+            raise CommandError(f"No such file: {path}")
+        elapsed = time.monotonic() - started
+
+        if self.touched_slots and not self.dry_run:
+            # bulk_create skips the signal handlers that keep these caches current;
+            # past days are never served from the availability index
+            today = datetime.date.today()
+            availability.invalidate_many(pair for pair in self.touched_slots if pair[1] >= today)
+            dashboard.invalidate({doctor_id for doctor_id, _ in self.touched_slots})
+            summary.refresh(self.touched_slots)
+
+        if options['rejects']:
+            with open(options['rejects'], 'w', newline='', encoding='utf-8') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(['line', 'reason'])
+                writer.writerows(self.rejected)
+        else:
+            for line, reason in self.rejected[:20]:
+                self.stderr.write(f"line {line}: {reason}")
+            if len(self.rejected) > 20:
+                self.stderr.write(f"... and {len(self.rejected) - 20} more rejected rows")
+
+        rate = imported / elapsed if elapsed else imported
+        verb = "Validated" if self.dry_run else "Imported"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {imported} {options['kind']}, rejected {len(self.rejected)} ({rate:,.0f} rows/s)."
+        ))
+
+    def _reject(self, line, reason):
+        self.rejected.append((line, reason))
+
+    def _save(self, model, objects):
+        if objects and not self.dry_run:
+            with transaction.atomic():
+                model.objects.bulk_create(objects)
+        return len(objects)
+
+    # -- users ---------------------------------------------------------------
+
+    def _hash(self, password):
+        if password not in self.password_hashes:
+            self.password_hashes[password] = make_password(password)
+        return self.password_hashes[password]
+
+    def import_users(self, batch):
+        names = {_text(row, 'username') for _, row in batch if row}
+        existing = set(CustomUser.objects.filter(username__in=names).values_list('username', flat=True))
+        users = []
+        for line, row in batch:
+            try:
+                if not row:
+                    raise RowError("unreadable row")
+                username = _text(row, 'username')
+                if not username:
+                    raise RowError("missing username")
+                if username in existing or username in self.seen_usernames:
+                    raise RowError(f"username {username!r} already exists")
+                role = _text(row, 'role') or 'patient'
+                if role not in dict(CustomUser.ROLE_CHOICES):
+                    raise RowError(f"unknown role {role!r}")
+                age = _text(row, 'age')
+                user = CustomUser(
+                    username=username,
+                    role=role,
+                    # CustomUser.save() is bypassed by bulk_create
+                    is_staff=role == 'doctor',
+                    age=int(age) if age else None,
+                    **{field: _text(row, field) or None for field in USER_FIELDS},
+                )
+                user.first_name = user.first_name or ''
+                user.last_name = user.last_name or ''
+                user.email = user.email or ''
+                user.password = self._hash(_text(row, 'password') or None)
+            except (RowError, ValueError) as e:
+                self._reject(line, str(e))
+                continue
+            self.seen_usernames.add(username)
+            users.append(user)
+        saved = self._save(CustomUser, users)
+        if not self.dry_run and any(user.role == 'doctor' for user in users):
+            # bulk_create skips the signal that keeps the doctor directory current
+            directory.invalidate()
+        return saved
+
+    # -- appointments --------------------------------------------------------
+
+    def _resolve_users(self, names):
+        missing = names - self.usernames.keys()
+        if missing:
+            for pk, username, role in CustomUser.objects.filter(username__in=missing).values_list('id', 'username', 'role'):
+                self.usernames[username] = (pk, role)
+        return self.usernames
+
+    def import_appointments(self, batch):
+        parsed = []
+        for line, row in batch:
+            try:
+                if not row:
+                    raise RowError("unreadable row")
+                status = _text(row, 'status') or 'pending'
+                if status not in dict(Appointment.STATUS_CHOICES):
+                    raise RowError(f"unknown status {status!r}")
+                parsed.append((line, {
+                    'patient': _text(row, 'patient'),
+                    'doctor': _text(row, 'doctor'),
+                    'date': datetime.date.fromisoformat(_text(row, 'date')),
+                    'time_slot': datetime.time.fromisoformat(_text(row, 'time_slot')),
+                    'status': status,
+                    'reason': _text(row, 'reason') or None,
+                }))
+            except (RowError, ValueError) as e:
+                self._reject(line, str(e))
+
+        users = self._resolve_users({r['patient'] for _, r in parsed} | {r['doctor'] for _, r in parsed})
+        resolved = []
+        for line, r in parsed:
+            patient, doctor = users.get(r['patient']), users.get(r['doctor'])
+            if patient is None:
+                self._reject(line, f"unknown patient {r['patient']!r}")
+            elif doctor is None:
+                self._reject(line, f"unknown doctor {r['doctor']!r}")
+            elif doctor[1] != 'doctor':
+                self._reject(line, f"{r['doctor']!r} is not a doctor")
+            else:
+                resolved.append((line, patient[0], doctor[0], r))
+
+        # Existing active bookings these rows could clash with, fetched by
+        # exact (doctor, date) and (patient, date) pairs
+        active = [(p, d, r['date']) for _, p, d, r in resolved if r['status'] != 'cancelled']
+        taken = set(_active_by_pairs('doctor_id', {(d, date) for _, d, date in active}, 'time_slot'))
+        per_day = Counter(
+            (user_id, date) for user_id, date, _ in _active_by_pairs('user_id', {(p, date) for p, _, date in active})
+        )
+        if self.dry_run:
+            taken |= self.dry_run_slots
+            per_day.update(self.dry_run_per_day)
+
+        appointments = []
+        for line, patient_id, doctor_id, r in resolved:
+            if r['status'] != 'cancelled':
+                slot = (doctor_id, r['date'], r['time_slot'])
+                if slot in taken:
+                    self._reject(line, "time slot already booked for this doctor")
+                    continue
+                if per_day[(patient_id, r['date'])] >= MAX_APPOINTMENTS_PER_DAY:
+                    self._reject(line, "patient already has two appointments that day")
+                    continue
+                taken.add(slot)
+                per_day[(patient_id, r['date'])] += 1
+                if self.dry_run:
+                    self.dry_run_slots.add(slot)
+                    self.dry_run_per_day[(patient_id, r['date'])] += 1
+            self.touched_slots.add((doctor_id, r['date']))
+            appointments.append(Appointment(
+                user_id=patient_id,
+                doctor_id=doctor_id,
+                date=r['date'],
+                time_slot=r['time_slot'],
+                status=r['status'],
+                reason=r['reason'],
+            ))
+        return self._save(Appointment, appointments)
@@ -0,0 +1,32 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dentalcare import summary
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date {value!r}; use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-doctor daily appointment summary from the appointments table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD); default is all history.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD); default is all future days.")
+
+    def handle(self, *args, **options):
+        start = _date(options['start']) if options['start'] else None
+        end = _date(options['end']) if options['end'] else None
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end.")
+        started = time.monotonic()
+        written = summary.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {written} summary rows in {time.monotonic() - started:.1f}s."
+        ))
@@ -0,0 +1,165 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from dentalcare import dashboard, directory, summary
+from dentalcare.availability import slots_from_mask
+from dentalcare.models import Appointment, ContactSubmission, CustomUser
+from dentalcare.schedules import DEFAULT_DAY_MASK
+
+SPECIALIZATIONS = ['General Dentistry', 'Orthodontics', 'Endodontics', 'Periodontics', 'Oral Surgery', 'Pediatric Dentistry']
+FIRST_NAMES = ['Alex', 'Sam', 'Priya', 'Chen', 'Maria', 'Omar', 'Lena', 'Ravi', 'Noah', 'Aisha', 'Ivan', 'Mei']
+LAST_NAMES = ['Sharma', 'Smith', 'Garcia', 'Kim', 'Singh', 'Brown', 'Ali', 'Novak', 'Rossi', 'Tanaka', 'Khan', 'Silva']
+SLOT_TIMES = [datetime.time.fromisoformat(value) for value, _ in slots_from_mask(DEFAULT_DAY_MASK)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic doctors, patients, appointments and contact submissions "
+        "for benchmarking. Appointments respect the booking rules: one active booking "
+        "per doctor slot and at most two per patient per day."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--patients', type=int, default=5000)
+        parser.add_argument('--appointments', type=int, default=100000)
+        parser.add_argument('--contacts', type=int, default=10000)
+        parser.add_argument('--fill', type=float, default=0.7,
+                            help="Share of each doctor's daily slots that get booked.")
+        parser.add_argument('--days-ahead', type=int, default=30,
+                            help="Appointments run from this many days in the future backwards.")
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--prefix', default='seed', help="Username prefix for generated users.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for repeatable data.")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if not 0 < options['fill'] <= 1:
+            raise CommandError("--fill must be in (0, 1].")
+        if CustomUser.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Users with prefix {prefix!r} already exist; pass a different --prefix.")
+
+        started = time.monotonic()
+        doctor_ids = self.create_users(prefix, 'doctor', options['doctors'])
+        patient_ids = self.create_users(prefix, 'patient', options['patients'])
+        appointments = self.create_appointments(
+            doctor_ids, patient_ids, options['appointments'], options['fill'], options['days_ahead']
+        )
+        contacts = self.create_contacts(patient_ids, options['contacts'])
+        dashboard.invalidate_messages(timezone.localdate())
+        directory.invalidate()
+        # bulk_create skips the signals that maintain the summary table
+        summary.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(doctor_ids)} doctors, {len(patient_ids)} patients, {appointments} appointments "
+            f"and {contacts} contact submissions in {time.monotonic() - started:.1f}s."
+        ))
+
+    def _insert(self, model, objects):
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def create_users(self, prefix, role, count):
+        password = make_password('password')
+        users = []
+        for i in range(count):
+            users.append(CustomUser(
+                username=f"{prefix}_{role}_{i}",
+                role=role,
+                is_staff=role == 'doctor',
+                password=password,
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                email=f"{prefix}.{role}.{i}@example.com",
+                phone=f"9{self.random.randrange(10 ** 9):09d}",
+                age=self.random.randint(18, 80) if role == 'patient' else None,
+                specialization=self.random.choice(SPECIALIZATIONS) if role == 'doctor' else None,
+            ))
+            if len(users) >= self.batch_size:
+                self._insert(CustomUser, users)
+                users = []
+        if users:
+            self._insert(CustomUser, users)
+        return list(CustomUser.objects.filter(
+            username__startswith=f"{prefix}_{role}_"
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_appointments(self, doctor_ids, patient_ids, count, fill, days_ahead):
+        if not doctor_ids or not patient_ids:
+            return 0
+        per_day = max(1, int(len(doctor_ids) * len(SLOT_TIMES) * fill))
+        # two bookings per patient per day at most, so cap the daily volume
+        per_day = min(per_day, 2 * len(patient_ids))
+        slots = [(doctor_id, slot) for doctor_id in doctor_ids for slot in SLOT_TIMES]
+        day = timezone.localdate() + datetime.timedelta(days=days_ahead)
+        today = timezone.localdate()
+        created = 0
+        batch = []
+        while created < count:
+            booked = self.random.sample(slots, min(per_day, count - created))
+            # consecutive patients wrap around at most twice a day
+            offset = self.random.randrange(len(patient_ids))
+            for n, (doctor_id, slot) in enumerate(booked):
+                if day < today:
+                    status = self.random.choices(['confirmed', 'cancelled', 'pending'], [80, 15, 5])[0]
+                else:
+                    status = self.random.choices(['pending', 'confirmed', 'cancelled'], [50, 40, 10])[0]
+                batch.append(Appointment(
+                    user_id=patient_ids[(offset + n) % len(patient_ids)],
+                    doctor_id=doctor_id,
+                    date=day,
+                    time_slot=slot,
+                    status=status,
+                ))
+            created += len(booked)
+            if len(batch) >= self.batch_size:
+                self._insert(Appointment, batch)
+                batch = []
+                self.stdout.write(f"  {created} appointments", ending='\r')
+            day -= datetime.timedelta(days=1)
+        if batch:
+            self._insert(Appointment, batch)
+        self.stdout.write('')
+        return created
+
+    def create_contacts(self, patient_ids, count):
+        now = timezone.now()
+        contacts = []
+        for i in range(count):
+            first, last = self.random.choice(FIRST_NAMES), self.random.choice(LAST_NAMES)
+            email = f"{first.lower()}.{last.lower()}{i}@example.com"
+            message = f"Hello, I would like to ask about {self.random.choice(SPECIALIZATIONS).lower()}."
+            contact = ContactSubmission(
+                first_name=first,
+                last_name=last,
+                mobile=f"9{self.random.randrange(10 ** 9):09d}",
+                email=email,
+                message=message,
+                message_hash=ContactSubmission.hash_message(email, message),
+                user_id=self.random.choice(patient_ids) if patient_ids and self.random.random() < 0.3 else None,
+            )
+            contact.seed_submitted_at = now - datetime.timedelta(minutes=self.random.randrange(60 * 24 * 365))
+            contacts.append(contact)
+            if len(contacts) >= self.batch_size:
+                self._insert_contacts(contacts)
+                contacts = []
+        if contacts:
+            self._insert_contacts(contacts)
+        return count
+
+    def _insert_contacts(self, contacts):
+        # submitted_at is auto_now_add, so inserts stamp "now"; spread the rows over the past year afterwards
+        with transaction.atomic():
+            ContactSubmission.objects.bulk_create(contacts, batch_size=self.batch_size)
+            for contact in contacts:
+                contact.submitted_at = contact.seed_submitted_at
+            ContactSubmission.objects.bulk_update(contacts, ['submitted_at'], batch_size=1000)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dentalcare.booking import SWEEP_BATCH_SIZE, sweep_past_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Move pending appointments whose time has passed to 'expired' and "
+        "confirmed ones to 'completed'. Run once (e.g. from cron) or with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping until interrupted.")
+        parser.add_argument('--interval', type=float, default=300,
+                            help="Seconds between sweeps in --loop mode.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        if options['interval'] <= 0:
+            raise CommandError("--interval must be positive.")
+
+        while True:
+            started = time.monotonic()
+            swept = sweep_past_due(batch_size=options['batch_size'])
+            if swept or not options['loop']:
+                self.stdout.write(f"Swept {swept} appointments in {time.monotonic() - started:.2f}s.")
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write("Stopped.")
+                return
@@ -0,0 +1,168 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_QUERY_BUDGET = 30
+
+
+class ViewStats:
+    __slots__ = ('buckets', 'count', 'latency', 'queries', 'db_time')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.latency = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+
+
+class Registry:
+    """Per-process request metrics keyed by URL name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, latency, queries, db_time):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats()
+            stats.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            stats.count += 1
+            stats.latency += latency
+            stats.queries += queries
+            stats.db_time += db_time
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            snapshot = sorted(self._views.items())
+            snapshot = [(view, list(s.buckets), s.count, s.latency, s.queries, s.db_time) for view, s in snapshot]
+        lines = [
+            '# HELP dentalcare_request_duration_seconds Request latency by view.',
+            '# TYPE dentalcare_request_duration_seconds histogram',
+        ]
+        for view, buckets, count, latency, _, _ in snapshot:
+            cumulative = 0
+            for bound, hits in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                cumulative += hits
+                lines.append(f'dentalcare_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+            lines.append(f'dentalcare_request_duration_seconds_sum{{view="{view}"}} {latency:.6f}')
+            lines.append(f'dentalcare_request_duration_seconds_count{{view="{view}"}} {count}')
+        lines += [
+            '# HELP dentalcare_db_queries_total Database queries issued by view.',
+            '# TYPE dentalcare_db_queries_total counter',
+        ]
+        lines += [f'dentalcare_db_queries_total{{view="{view}"}} {queries}' for view, _, _, _, queries, _ in snapshot]
+        lines += [
+            '# HELP dentalcare_db_query_seconds_total Time spent in database queries by view.',
+            '# TYPE dentalcare_db_query_seconds_total counter',
+        ]
+        lines += [f'dentalcare_db_query_seconds_total{{view="{view}"}} {db_time:.6f}' for view, _, _, _, _, db_time in snapshot]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    """Counts the queries of one request and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+
+# the current request's counter; context variables follow the request into
+# the threads sync_to_async runs its database work in
+_counter = contextvars.ContextVar('dentalcare_query_counter', default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    counter = _counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.time += time.perf_counter() - start
+        counter.count += 1
+
+
+@receiver(connection_created)
+def _install_counter(sender, connection, **kwargs):
+    # every connection, whichever thread opens it, reports to the current request
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+class MetricsMiddleware:
+    """Record latency, query count and DB time for every request, per URL name.
+
+    Works in both modes, so async views under ASGI are not pushed into a
+    thread by this middleware. Queries run while a streaming response is
+    consumed happen after this middleware returns and are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'QUERY_BUDGET', DEFAULT_QUERY_BUDGET)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # connections opened before this module was imported missed the signal
+        for connection in connections.all(initialized_only=True):
+            _install_counter(sender=None, connection=connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = _counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _counter.reset(token)
+        self.record(request, time.perf_counter() - start, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = _counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _counter.reset(token)
+        self.record(request, time.perf_counter() - start, counter)
+        return response
+
+    def record(self, request, latency, counter):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        registry.observe(view, latency, counter.count, counter.time)
+        if self.query_budget and counter.count > self.query_budget:
+            logger.warning(
+                "View %s issued %d queries (budget %d) for %s",
+                view, counter.count, self.query_budget, request.path,
+            )
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0003_customuser_profile_image'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('doctor', 'date', 'time_slot'), name='unique_active_doctor_slot'),
+        ),
+    ]
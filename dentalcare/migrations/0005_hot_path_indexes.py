@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0004_appointment_active_slot_constraint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'time_slot'], name='appt_doctor_date_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['user', 'date', 'time_slot'], name='appt_user_date_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'time_slot'], name='appt_date_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactsubmission',
+            index=models.Index(fields=['submitted_at'], name='contact_submitted_at_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:58
+
+import datetime
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0006_customuser_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('working_days', models.CharField(default='01234', help_text='Weekday numbers the doctor works, Monday is 0 (e.g. 01234).', max_length=7, validators=[django.core.validators.RegexValidator('^[0-6]{0,7}$', 'Use weekday numbers 0-6 (Monday is 0).')])),
+                ('start_time', models.TimeField(default=datetime.time(9, 0))),
+                ('end_time', models.TimeField(default=datetime.time(18, 0))),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=60, validators=[django.core.validators.MinValueValidator(5), django.core.validators.MaxValueValidator(240)])),
+                ('doctor', models.OneToOneField(limit_choices_to={'role': 'doctor'}, on_delete=django.db.models.deletion.CASCADE, related_name='schedule', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScheduleBreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breaks', to='dentalcare.doctorschedule')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='dentalcare.doctorschedule')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('schedule', 'date'), name='unique_schedule_exception_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0007_doctor_schedules'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('completed', 'Completed'), ('expired', 'Expired')], default='pending', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'date', 'time_slot'], name='appt_status_date_slot_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0008_appointment_terminal_statuses'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyDoctorSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('pending', models.PositiveIntegerField(default=0)),
+                ('confirmed', models.PositiveIntegerField(default=0)),
+                ('cancelled', models.PositiveIntegerField(default=0)),
+                ('completed', models.PositiveIntegerField(default=0)),
+                ('expired', models.PositiveIntegerField(default=0)),
+                ('doctor', models.ForeignKey(limit_choices_to={'role': 'doctor'}, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='summary_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='unique_daily_doctor_summary')],
+            },
+        ),
+    ]
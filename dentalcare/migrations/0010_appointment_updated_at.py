@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0009_daily_doctor_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'updated_at'], name='appt_doctor_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:10
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_messages(apps, schema_editor):
+    # mirrors ContactSubmission.hash_message, which historical models don't carry
+    ContactSubmission = apps.get_model('dentalcare', 'ContactSubmission')
+    batch = []
+    for contact in ContactSubmission.objects.only('email', 'message').iterator(chunk_size=2000):
+        normalized = f"{contact.email.strip().lower()}\n{' '.join(contact.message.split()).lower()}"
+        contact.message_hash = hashlib.sha256(normalized.encode()).hexdigest()
+        batch.append(contact)
+        if len(batch) >= 2000:
+            ContactSubmission.objects.bulk_update(batch, ['message_hash'])
+            batch = []
+    if batch:
+        ContactSubmission.objects.bulk_update(batch, ['message_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0010_appointment_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactsubmission',
+            name='message_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(hash_existing_messages, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contactsubmission',
+            index=models.Index(fields=['message_hash', 'submitted_at'], name='contact_message_hash_idx'),
+        ),
+    ]
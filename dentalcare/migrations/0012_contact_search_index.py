@@ -0,0 +1,53 @@
+from django.db import migrations
+
+FTS_TABLE = 'dentalcare_contactsubmission_fts'
+COLUMNS = 'first_name, last_name, email, mobile, message'
+NEW_VALUES = 'new.first_name, new.last_name, new.email, new.mobile, new.message'
+OLD_VALUES = 'old.first_name, old.last_name, old.email, old.mobile, old.message'
+
+CREATE = [
+    # external-content table: the text lives once, in the contact table
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        {COLUMNS}, content='dentalcare_contactsubmission', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON dentalcare_contactsubmission BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON dentalcare_contactsubmission BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES});
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON dentalcare_contactsubmission BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES});
+        INSERT INTO {FTS_TABLE}(rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES});
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite only; other backends fall back to LIKE in dentalcare.search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0011_contactsubmission_message_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE), _run(DROP)),
+    ]
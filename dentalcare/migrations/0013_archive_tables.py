@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0012_contact_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('time_slot', models.TimeField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('completed', 'Completed'), ('expired', 'Expired')], max_length=10)),
+                ('reason', models.TextField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_doctor_appointments', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_patient_appointments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'date', 'time_slot', 'id'], name='archived_appt_doctor_idx'), models.Index(fields=['user', 'date', 'time_slot', 'id'], name='archived_appt_user_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedContactSubmission',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(blank=True, max_length=100)),
+                ('mobile', models.CharField(max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('message', models.TextField(blank=True)),
+                ('submitted_at', models.DateTimeField()),
+                ('message_hash', models.CharField(blank=True, max_length=64)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['submitted_at'], name='archived_contact_submitted_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:25
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('dentalcare', '0013_archive_tables'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='user_email_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='user_first_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='user_last_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='user_username_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='user_email_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0014_customuser_lower_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_thumbnail',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+    ]
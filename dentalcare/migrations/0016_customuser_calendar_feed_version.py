@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0015_customuser_avatar_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='calendar_feed_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0017_customuser_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'user', 'date'], name='appt_doctor_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappointment',
+            index=models.Index(fields=['doctor', 'user', 'date'], name='archived_appt_doctor_user_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dentalcare', '0018_doctor_user_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedcontactsubmission',
+            name='archived_contact_submitted_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedcontactsubmission',
+            index=models.Index(fields=['submitted_at', 'id'], name='archived_contact_listing_idx'),
+        ),
+    ]
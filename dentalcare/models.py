@@ -1,6 +1,104 @@
+import datetime
+import hashlib
+import string
+
 from django.contrib.auth.models import AbstractUser, UserManager
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
+from django.db import connection, models
+from django.db.models.functions import Lower
 from django.conf import settings
+from django.utils import timezone
+
+
+
+# SQLite's lower() only folds ASCII letters; search terms are folded to match
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def db_lower(value):
+    """``value`` lowered the way the database's LOWER() does it."""
+    return value.translate(_ASCII_LOWER) if connection.vendor == 'sqlite' else value.lower()
+
+
+def prefix_range(field, prefix):
+    """Q matching values of ``field`` that start with ``prefix``, as an index-friendly range."""
+    return models.Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix[:-1] + chr(ord(prefix[-1]) + 1)})
+
+
+class PatientRoster:
+    """A doctor's distinct patients, most recent visit first, with ``last_visit`` and ``visit_count``.
+
+    Live and archived appointments both count as visits. Each table is
+    grouped by patient through its ``(doctor, user, date)`` index and the two
+    results are merged; users are joined to the page being read only, so
+    the cost follows the doctor's history rather than the size of the user
+    table. Supports ``count()`` and slicing, which is what ``Paginator`` needs.
+    """
+
+    def __init__(self, doctor_id, patients=None):
+        self.doctor_id = doctor_id
+        # optional queryset of candidate users, e.g. a search
+        self.patients = patients
+
+    def _branches(self, select):
+        branches, params = [], []
+        for model in (Appointment, ArchivedAppointment):
+            sql = f"SELECT {select} FROM {connection.ops.quote_name(model._meta.db_table)} WHERE doctor_id = %s"
+            params.append(self.doctor_id)
+            if self.patients is not None:
+                patients_sql, patients_params = self.patients.order_by().values('id').query.sql_with_params()
+                sql += f" AND user_id IN ({patients_sql})"
+                params.extend(patients_params)
+            branches.append(sql)
+        return branches, params
+
+    def count_sql(self):
+        """SQL and params counting the distinct patients."""
+        branches, params = self._branches('user_id')
+        return f"SELECT COUNT(*) FROM ({' UNION '.join(branches)}) AS patients", params
+
+    def page_sql(self, offset=0, limit=None):
+        """SQL and params for one page of users, annotated with ``last_visit`` and ``visit_count``."""
+        branches, params = self._branches('user_id, MAX(date) AS last_visit, COUNT(*) AS visits')
+        page = (
+            f"SELECT user_id, MAX(last_visit) AS last_visit, SUM(visits) AS visit_count FROM "
+            f"({' UNION ALL '.join(branch + ' GROUP BY user_id' for branch in branches)}) AS per_table "
+            f"GROUP BY user_id ORDER BY last_visit DESC, user_id LIMIT %s OFFSET %s"
+        )
+        # a negative limit means none on SQLite; other backends take NULL
+        no_limit = -1 if connection.vendor == 'sqlite' else None
+        sql = (
+            f"SELECT u.*, page.last_visit, page.visit_count FROM ({page}) AS page "
+            f"JOIN {connection.ops.quote_name(CustomUser._meta.db_table)} u ON u.id = page.user_id "
+            f"ORDER BY page.last_visit DESC, page.user_id"
+        )
+        return sql, params + [no_limit if limit is None else limit, offset]
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(*self.count_sql())
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if index.step or (index.start or 0) < 0 or (index.stop or 0) < 0:
+            raise ValueError("Only forward slices without a step are supported.")
+        offset = index.start or 0
+        limit = None if index.stop is None else max(index.stop - offset, 0)
+        users = list(CustomUser.objects.raw(*self.page_sql(offset, limit)))
+        for user in users:
+            user.last_visit = models.DateField().to_python(user.last_visit)
+            user.visit_count = int(user.visit_count)
+        return users
 
 
 class CustomUserManager(UserManager):
@@ -10,6 +108,34 @@ class CustomUserManager(UserManager):
         extra_fields.setdefault('is_superuser', True)
         return super().create_superuser(username, email, password, **extra_fields)
 
+    def search(self, prefix):
+        """Users whose name, username, email or phone starts with ``prefix``, ignoring case.
+
+        Each term is a range over an indexed expression; LIKE, which
+        ``istartswith`` compiles to, cannot use an index on SQLite.
+        """
+        lowered = db_lower(prefix)
+        return self.alias(
+            first_name_lower=Lower('first_name'),
+            last_name_lower=Lower('last_name'),
+            username_lower=Lower('username'),
+            email_lower=Lower('email'),
+        ).filter(
+            prefix_range('first_name_lower', lowered)
+            | prefix_range('last_name_lower', lowered)
+            | prefix_range('username_lower', lowered)
+            | prefix_range('email_lower', lowered)
+            | prefix_range('phone', prefix)
+        )
+
+    def patients_of(self, doctor, search=None):
+        """Distinct patients of a doctor with their last visit and visit count, as a :class:`PatientRoster`.
+
+        Archived appointments count as visits, so a patient whose history
+        has been archived stays on the roster.
+        """
+        return PatientRoster(getattr(doctor, 'pk', doctor), self.search(search) if search else None)
+
 
 class CustomUser(AbstractUser):
     ROLE_CHOICES = (
@@ -32,9 +158,25 @@ class CustomUser(AbstractUser):
         upload_to='profiles/', null=True, blank=True,
         help_text="Optional profile image (avatar)."
     )
+    # storage name of the rendered avatar thumbnail; empty until it exists
+    avatar_thumbnail = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # part of the signed calendar feed token; bumping it revokes every issued link
+    calendar_feed_version = models.PositiveIntegerField(default=0, editable=False)
+    # lets caches of rows that show a user's name notice when it is edited
+    updated_at = models.DateTimeField(auto_now=True)
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # roster search: case-insensitive prefixes of names and email, see CustomUserManager.search
+            models.Index(Lower('first_name'), name='user_first_name_lower_idx'),
+            models.Index(Lower('last_name'), name='user_last_name_lower_idx'),
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+            models.Index(fields=['phone'], name='user_phone_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # ensure patients cannot be staff
         if self.role == 'patient':
@@ -43,6 +185,13 @@ class CustomUser(AbstractUser):
             self.is_staff = True   # allow doctors to access admin
         super().save(*args, **kwargs)
     
+    @property
+    def avatar_url(self):
+        """URL of the avatar thumbnail, falling back to the original upload."""
+        if not self.profile_image:
+            return ''
+        return default_storage.url(self.avatar_thumbnail or self.profile_image.name)
+
     def get_display_name(self):
         """Return a formatted display name for the user"""
         if self.first_name and self.last_name:
@@ -50,12 +199,46 @@ class CustomUser(AbstractUser):
         return f"Dr. {self.username}"
 
 
+class AppointmentQuerySet(models.QuerySet):
+    @staticmethod
+    def expired_condition(now=None):
+        """Q matching appointments whose start time is at or before ``now``."""
+        local_now = timezone.localtime(now)
+        return models.Q(date__lt=local_now.date()) | models.Q(
+            date=local_now.date(), time_slot__lte=local_now.time()
+        )
+
+    def with_expiry(self, now=None):
+        # swept rows carry a terminal status; the time check covers the rest
+        return self.annotate(is_expired=models.Case(
+            models.When(status__in=Appointment.TERMINAL_STATUSES, then=models.Value(True)),
+            models.When(self.expired_condition(now), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+    def expired(self, now=None):
+        return self.filter(self.expired_condition(now))
+
+    def upcoming(self, now=None):
+        return self.exclude(self.expired_condition(now))
+
+    def past_due(self, now=None):
+        """Open (pending or confirmed) appointments whose time has come."""
+        return self.filter(self.expired_condition(now), status__in=Appointment.OPEN_STATUSES)
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
         ('cancelled', 'Cancelled'),
+        ('completed', 'Completed'),
+        ('expired', 'Expired'),
     ]
+    OPEN_STATUSES = ('pending', 'confirmed')
+    # set by the sweeper once an open appointment's time has passed
+    TERMINAL_STATUSES = ('completed', 'expired')
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE,
@@ -72,17 +255,163 @@ class Appointment(models.Model):
     date = models.DateField()
     time_slot = models.TimeField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # queryset.update() skips auto_now; bulk status changes set it explicitly
+    updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     reason = models.TextField(null=True, blank=True, help_text="Reason for appointment")
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
-        unique_together = ('doctor', 'date', 'time_slot')  # Prevent double-booking for same doctor
+        constraints = [
+            # Prevent double-booking for same doctor; cancelled rows free the slot again
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time_slot'],
+                condition=~models.Q(status='cancelled'),
+                name='unique_active_doctor_slot',
+            ),
+        ]
+        indexes = [
+            # availability/booking lookups and a doctor's own listing; status is
+            # left out so the implicit trailing id keeps (date, time_slot, id) order
+            models.Index(fields=['doctor', 'date', 'time_slot'], name='appt_doctor_date_slot_idx'),
+            # two-per-day rule and a patient's own listing
+            models.Index(fields=['user', 'date', 'time_slot'], name='appt_user_date_slot_idx'),
+            # total_appointments date filter and (date, time_slot, id) ordering
+            models.Index(fields=['date', 'time_slot'], name='appt_date_slot_idx'),
+            # sweeper: open appointments up to today, without walking the history
+            models.Index(fields=['status', 'date', 'time_slot'], name='appt_status_date_slot_idx'),
+            # calendar feed validators: latest change and row count per doctor
+            models.Index(fields=['doctor', 'updated_at'], name='appt_doctor_updated_idx'),
+            # patient roster and distinct-patient counter, grouped per patient without a sort
+            models.Index(fields=['doctor', 'user', 'date'], name='appt_doctor_user_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the slot as loaded so signal handlers can see what changed
+        instance._loaded_slot = instance.slot_state()
+        return instance
+
+    def slot_state(self):
+        return (self.doctor_id, self.date, self.time_slot, self.status)
 
     def __str__(self):
         doctor_name = self.doctor.get_display_name() if self.doctor else "No Doctor"
         return f"{self.user.username} with {doctor_name} - {self.date} {self.time_slot} ({self.status})"
 
 
+class DoctorSchedule(models.Model):
+    """Weekly working hours of a doctor; doctors without one keep the default 09:00-18:00 hours."""
+    doctor = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='schedule',
+        limit_choices_to={'role': 'doctor'}
+    )
+    working_days = models.CharField(
+        max_length=7, default='01234',
+        validators=[RegexValidator(r'^[0-6]{0,7}$', "Use weekday numbers 0-6 (Monday is 0).")],
+        help_text="Weekday numbers the doctor works, Monday is 0 (e.g. 01234)."
+    )
+    start_time = models.TimeField(default=datetime.time(9, 0))
+    end_time = models.TimeField(default=datetime.time(18, 0))
+    slot_minutes = models.PositiveSmallIntegerField(
+        default=60, validators=[MinValueValidator(5), MaxValueValidator(240)]
+    )
+
+    def clean(self):
+        if self.start_time >= self.end_time:
+            raise ValidationError("The working day must end after it starts.")
+
+    def __str__(self):
+        return f"Schedule of {self.doctor.get_display_name()}"
+
+
+class ScheduleBreak(models.Model):
+    """A daily pause (e.g. lunch); slots overlapping it are not offered."""
+    schedule = models.ForeignKey(DoctorSchedule, on_delete=models.CASCADE, related_name='breaks')
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    def clean(self):
+        if self.start_time >= self.end_time:
+            raise ValidationError("A break must end after it starts.")
+
+    def __str__(self):
+        return f"{self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class ScheduleException(models.Model):
+    """Different hours on one date; leaving both times empty marks a day off."""
+    schedule = models.ForeignKey(DoctorSchedule, on_delete=models.CASCADE, related_name='exceptions')
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'date'], name='unique_schedule_exception_date'),
+        ]
+
+    def clean(self):
+        if (self.start_time is None) != (self.end_time is None):
+            raise ValidationError("Give both times, or neither for a day off.")
+        if self.start_time is not None and self.start_time >= self.end_time:
+            raise ValidationError("The working day must end after it starts.")
+
+    def __str__(self):
+        if self.start_time is None:
+            return f"{self.date}: day off"
+        return f"{self.date}: {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+
+class DailyDoctorSummary(models.Model):
+    """Per-doctor, per-day appointment counts, kept current by dentalcare.summary."""
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_summaries',
+        limit_choices_to={'role': 'doctor'}
+    )
+    date = models.DateField()
+    pending = models.PositiveIntegerField(default=0)
+    confirmed = models.PositiveIntegerField(default=0)
+    cancelled = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    expired = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_daily_doctor_summary'),
+        ]
+        indexes = [
+            # clinic-wide reports over a date range
+            models.Index(fields=['date'], name='summary_date_idx'),
+        ]
+
+    @property
+    def booked(self):
+        return self.pending + self.confirmed + self.completed + self.expired
+
+    def __str__(self):
+        return f"{self.doctor_id} on {self.date}: {self.booked} booked"
+
+
+def day_range(day):
+    """The ``[start, end)`` datetimes of ``day`` in the current time zone."""
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+    return start, start + datetime.timedelta(days=1)
+
+
+class ContactSubmissionQuerySet(models.QuerySet):
+    def submitted_on(self, day):
+        # a range on submitted_at can use its index; submitted_at__date cannot
+        start, end = day_range(day)
+        return self.filter(submitted_at__gte=start, submitted_at__lt=end)
+
+
 class ContactSubmission(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100, blank=True)
@@ -93,6 +422,85 @@ class ContactSubmission(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL
     )
+    # sha256 of the normalised sender and text, for spotting resubmissions
+    message_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    objects = ContactSubmissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['submitted_at'], name='contact_submitted_at_idx'),
+            models.Index(fields=['message_hash', 'submitted_at'], name='contact_message_hash_idx'),
+        ]
+
+    @staticmethod
+    def hash_message(email, message):
+        # case and whitespace changes don't make a message new
+        normalized = f"{email.strip().lower()}\n{' '.join(message.split()).lower()}"
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        if not self.message_hash:
+            self.message_hash = self.hash_message(self.email, self.message)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.first_name} {self.last_name} ({self.email}) - {self.submitted_at.date()}"
+
+class ArchivedAppointment(models.Model):
+    """A finished appointment moved out of the live table by ``archive_old_records``.
+
+    Rows keep their original id, so links and exports stay stable.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_patient_appointments'
+    )
+    doctor = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='archived_doctor_appointments', null=True
+    )
+    date = models.DateField()
+    time_slot = models.TimeField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    reason = models.TextField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # history listings in (date, time_slot, id) order; id is spelled out
+            # because a bigint primary key is not SQLite's implicit rowid
+            models.Index(fields=['doctor', 'date', 'time_slot', 'id'], name='archived_appt_doctor_idx'),
+            models.Index(fields=['user', 'date', 'time_slot', 'id'], name='archived_appt_user_idx'),
+            models.Index(fields=['doctor', 'user', 'date'], name='archived_appt_doctor_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} with {self.doctor_id} - {self.date} {self.time_slot} ({self.status}, archived)"
+
+
+class ArchivedContactSubmission(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    first_name = models.CharField(max_length=100)
+    last_name = models.CharField(max_length=100, blank=True)
+    mobile = models.CharField(max_length=20)
+    email = models.EmailField()
+    message = models.TextField(blank=True)
+    submitted_at = models.DateTimeField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    message_hash = models.CharField(max_length=64, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ContactSubmissionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # listings in (submitted_at, id) order, as for the live table
+            models.Index(fields=['submitted_at', 'id'], name='archived_contact_listing_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.first_name} {self.last_name} ({self.email}) - {self.submitted_at.date()}"
\ No newline at end of file
+        return f"{self.first_name} {self.last_name} ({self.email}) - {self.submitted_at.date()}, archived"
@@ -0,0 +1,98 @@
+import base64
+import json
+
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(model, keys, token):
+    """Decode a cursor token into typed key values, or ``None`` if it is invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+        if len(values) != len(keys):
+            return None
+        return [model._meta.get_field(key).to_python(value) for key, value in zip(keys, values)]
+    except Exception:
+        return None
+
+
+def _after(keys, values, descending):
+    # (k1, k2, k3) > (v1, v2, v3) spelled out so every backend can use the index
+    lookup = 'lt' if descending else 'gt'
+    condition = Q()
+    for i, key in enumerate(keys):
+        term = Q(**{f'{key}__{lookup}': values[i]})
+        for prev_key, prev_value in zip(keys[:i], values[:i]):
+            term &= Q(**{prev_key: prev_value})
+        condition |= term
+    return condition
+
+
+def _page_query(queryset, cursor, keys, descending, page_size):
+    queryset = queryset.order_by(*(f'-{key}' if descending else key for key in keys))
+    values = decode_cursor(queryset.model, keys, cursor) if cursor else None
+    if values is not None:
+        queryset = queryset.filter(_after(keys, values, descending))
+    return queryset[:page_size + 1]
+
+
+def _key_values(row, keys):
+    return [row[key] if isinstance(row, dict) else getattr(row, key) for key in keys]
+
+
+def _split(rows, keys, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(_key_values(rows[-1], keys))
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor=None, keys=('date', 'time_slot', 'id'), descending=False, page_size=PAGE_SIZE):
+    """Return ``(rows, next_cursor)`` for one page of ``queryset`` ordered by ``keys``.
+
+    ``next_cursor`` is ``None`` on the last page. An unreadable cursor falls
+    back to the first page. Rows may be model instances or ``values()``
+    dicts, as long as the dicts carry every key.
+    """
+    rows = list(_page_query(queryset, cursor, keys, descending, page_size))
+    return _split(rows, keys, page_size)
+
+
+async def akeyset_page(queryset, cursor=None, keys=('date', 'time_slot', 'id'), descending=False, page_size=PAGE_SIZE):
+    """Async variant of :func:`keyset_page` for async views."""
+    rows = [row async for row in _page_query(queryset, cursor, keys, descending, page_size)]
+    return _split(rows, keys, page_size)
+
+
+def _merge(rows, keys, descending, page_size):
+    rows.sort(key=lambda row: _key_values(row, keys), reverse=descending)
+    return _split(rows, keys, page_size)
+
+
+def merged_keyset_page(querysets, cursor=None, keys=('date', 'time_slot', 'id'), descending=False, page_size=PAGE_SIZE):
+    """:func:`keyset_page` over several querysets at once, e.g. live and archived rows.
+
+    The cursor holds key values rather than positions, so each queryset is
+    paged independently and the candidates merged; keys must not repeat
+    across querysets.
+    """
+    rows = []
+    for queryset in querysets:
+        rows += list(_page_query(queryset, cursor, keys, descending, page_size))
+    return _merge(rows, keys, descending, page_size)
+
+
+async def amerged_keyset_page(querysets, cursor=None, keys=('date', 'time_slot', 'id'), descending=False, page_size=PAGE_SIZE):
+    """Async variant of :func:`merged_keyset_page` for async views."""
+    rows = []
+    for queryset in querysets:
+        rows += [row async for row in _page_query(queryset, cursor, keys, descending, page_size)]
+    return _merge(rows, keys, descending, page_size)
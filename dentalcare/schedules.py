@@ -0,0 +1,105 @@
+import datetime
+
+from django.core.cache import cache
+
+from .models import DoctorSchedule, ScheduleBreak, ScheduleException
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+DEFAULT_START = datetime.time(9, 0)
+DEFAULT_END = datetime.time(18, 0)
+DEFAULT_SLOT_MINUTES = 60
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def day_mask(start, end, slot_minutes, breaks=()):
+    """Bitmap of the slot start minutes between ``start`` and ``end``.
+
+    Uses the same bit positions as the occupancy bitmaps in
+    :mod:`dentalcare.availability`, so free slots are ``grid & ~booked``.
+    Slots that would run past ``end`` or overlap a break are left out.
+    """
+    breaks = [(_minutes(b_start), _minutes(b_end)) for b_start, b_end in breaks]
+    mask = 0
+    minute, stop = _minutes(start), _minutes(end)
+    while minute + slot_minutes <= stop:
+        slot_end = minute + slot_minutes
+        if not any(b_start < slot_end and minute < b_end for b_start, b_end in breaks):
+            mask |= 1 << minute
+        minute += slot_minutes
+    return mask
+
+
+DEFAULT_DAY_MASK = day_mask(DEFAULT_START, DEFAULT_END, DEFAULT_SLOT_MINUTES)
+# doctors without a schedule work the default hours every day
+DEFAULT_GRID = {'weekly': (DEFAULT_DAY_MASK,) * 7, 'exceptions': {}, 'slot_minutes': DEFAULT_SLOT_MINUTES}
+
+
+def compile_grid(schedule, breaks, exceptions):
+    """Compile a schedule into ``{'weekly': 7 masks, 'exceptions': {date: mask}, 'slot_minutes': n}``."""
+    working_day = day_mask(schedule.start_time, schedule.end_time, schedule.slot_minutes, breaks)
+    weekly = tuple(working_day if str(day) in schedule.working_days else 0 for day in range(7))
+    return {
+        'weekly': weekly,
+        'exceptions': {
+            exception.date: (
+                0 if exception.start_time is None
+                else day_mask(exception.start_time, exception.end_time, schedule.slot_minutes, breaks)
+            )
+            for exception in exceptions
+        },
+        'slot_minutes': schedule.slot_minutes,
+    }
+
+
+def _cache_key(doctor_id):
+    return f"schedule:{doctor_id}"
+
+
+def grids(doctor_ids):
+    """Return ``{doctor_id: grid}``, compiling whatever is not cached.
+
+    Misses cost three queries in total however many doctors are involved:
+    schedules, breaks and exceptions. Past exceptions are kept too, since
+    capacity reports look back over past ranges.
+    """
+    keys = {_cache_key(doctor_id): doctor_id for doctor_id in doctor_ids}
+    cached = cache.get_many(keys)
+    result = {keys[key]: grid for key, grid in cached.items()}
+    missing = [doctor_id for key, doctor_id in keys.items() if key not in cached]
+    if missing:
+        schedules = {
+            schedule.id: schedule
+            for schedule in DoctorSchedule.objects.filter(doctor_id__in=missing)
+        }
+        breaks = {schedule_id: [] for schedule_id in schedules}
+        for schedule_id, start, end in ScheduleBreak.objects.filter(
+            schedule_id__in=schedules
+        ).values_list('schedule_id', 'start_time', 'end_time'):
+            breaks[schedule_id].append((start, end))
+        exceptions = {schedule_id: [] for schedule_id in schedules}
+        for exception in ScheduleException.objects.filter(schedule_id__in=schedules):
+            exceptions[exception.schedule_id].append(exception)
+
+        fresh = dict.fromkeys(missing, DEFAULT_GRID)
+        for schedule_id, schedule in schedules.items():
+            fresh[schedule.doctor_id] = compile_grid(schedule, breaks[schedule_id], exceptions[schedule_id])
+        cache.set_many({_cache_key(doctor_id): grid for doctor_id, grid in fresh.items()}, CACHE_TIMEOUT)
+        result.update(fresh)
+    return result
+
+
+def grid_mask(grid, date):
+    """Bitmap of the slots a compiled grid offers on ``date``."""
+    return grid['exceptions'].get(date, grid['weekly'][date.weekday()])
+
+
+def slot_mask(doctor_id, date):
+    return grid_mask(grids([doctor_id])[doctor_id], date)
+
+
+def invalidate(doctor_id):
+    cache.delete(_cache_key(doctor_id))
@@ -0,0 +1,61 @@
+"""Full-text search over received contact messages.
+
+On SQLite the ``dentalcare_contactsubmission_fts`` FTS5 table, kept in step
+by triggers from migration 0012, answers the match and the bm25 ranking
+in one query. Other backends fall back to ``icontains`` across the same
+fields, newest first.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import ContactSubmission, day_range
+
+FTS_TABLE = 'dentalcare_contactsubmission_fts'
+SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'mobile', 'message')
+PAGE_SIZE = 50
+# deep pages of a ranked search are never read; this keeps OFFSET cheap
+MAX_PAGE = 20
+
+
+def terms(query):
+    return re.findall(r'\w+', query)[:10]
+
+
+def match_expression(words):
+    # every word must match and the last may be unfinished; quoting keeps FTS5 syntax out of user input
+    return ' '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+
+
+def search_contacts(query, page=1, submitted_on=None, page_size=PAGE_SIZE):
+    """Return ``(contacts, has_next)`` for one page of contacts matching ``query``.
+
+    ``submitted_on`` optionally limits the results to one day.
+    """
+    words = terms(query)
+    if not words:
+        return [], False
+    page = min(max(page, 1), MAX_PAGE)
+    offset = (page - 1) * page_size
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT c.* FROM dentalcare_contactsubmission c "
+            f"JOIN {FTS_TABLE} f ON f.rowid = c.id WHERE f.{FTS_TABLE} MATCH %s"
+        )
+        params = [match_expression(words)]
+        if submitted_on is not None:
+            sql += " AND c.submitted_at >= %s AND c.submitted_at < %s"
+            params += [connection.ops.adapt_datetimefield_value(bound) for bound in day_range(submitted_on)]
+        sql += " ORDER BY f.rank, c.id DESC LIMIT %s OFFSET %s"
+        params += [page_size + 1, offset]
+        contacts = list(ContactSubmission.objects.raw(sql, params))
+    else:
+        condition = Q()
+        for word in words:
+            condition &= Q(*(Q(**{f'{field}__icontains': word}) for field in SEARCH_FIELDS), _connector=Q.OR)
+        queryset = ContactSubmission.objects.filter(condition)
+        if submitted_on is not None:
+            queryset = queryset.submitted_on(submitted_on)
+        contacts = list(queryset.order_by('-submitted_at', '-id')[offset:offset + page_size + 1])
+    return contacts[:page_size], len(contacts) > page_size and page < MAX_PAGE
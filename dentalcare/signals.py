@@ -0,0 +1,85 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import availability, dashboard, directory, events, schedules, summary
+from .models import (
+    Appointment, ContactSubmission, CustomUser, DoctorSchedule, ScheduleBreak, ScheduleException
+)
+
+# Sent after a queryset update() changed appointments in bulk, with
+# ``changes``: a list of ``(id, old_state, new_state)`` slot_state() tuples.
+appointments_updated = Signal()
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, **kwargs):
+    new = instance.slot_state()
+    old = None if created else getattr(instance, '_loaded_slot', None)
+    if old is None and not created:
+        # previous state unknown (instance not loaded from the db): rebuild lazily
+        availability.invalidate_on_commit([new[:2]])
+        dashboard.appointment_removed(new[0], new[1])
+        summary.refresh([(new[0], new[1])])
+    elif old is not None and old != new:
+        availability.invalidate_on_commit([old[:2], new[:2]])
+        dashboard.appointment_changed(old, new)
+        summary.appointment_changed(old, new)
+        events.appointment_event(events.status_event_type(old[3], new[3]), instance.pk, new)
+    if created:
+        availability.invalidate_on_commit([new[:2]])
+        dashboard.appointment_created(instance)
+        summary.appointment_changed(None, new)
+        events.appointment_event('created', instance.pk, new)
+    instance._loaded_slot = new
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    availability.invalidate_on_commit([(instance.doctor_id, instance.date)])
+    dashboard.appointment_removed(instance.doctor_id, instance.date)
+    summary.appointment_changed(instance.slot_state(), None)
+
+
+@receiver(appointments_updated, sender=Appointment)
+def appointments_bulk_updated(sender, changes, **kwargs):
+    availability.invalidate_on_commit(
+        state[:2] for pk, old, new in changes for state in (old, new)
+    )
+    for pk, old, new in changes:
+        dashboard.appointment_changed(old, new)
+        events.appointment_event(events.status_event_type(old[3], new[3]), pk, new)
+    summary.apply_changes([(old, new) for pk, old, new in changes])
+
+
+@receiver(post_save, sender=ContactSubmission)
+def contact_saved(sender, instance, created, **kwargs):
+    if created:
+        dashboard.contact_created(instance)
+
+
+@receiver(post_delete, sender=ContactSubmission)
+def contact_deleted(sender, instance, **kwargs):
+    dashboard.contact_removed(instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    directory.user_changed(instance, update_fields)
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_deleted(sender, instance, **kwargs):
+    directory.user_changed(instance)
+
+
+@receiver([post_save, post_delete], sender=DoctorSchedule)
+def schedule_changed(sender, instance, **kwargs):
+    schedules.invalidate(instance.doctor_id)
+
+
+@receiver([post_save, post_delete], sender=ScheduleBreak)
+@receiver([post_save, post_delete], sender=ScheduleException)
+def schedule_detail_changed(sender, instance, **kwargs):
+    doctor_id = DoctorSchedule.objects.filter(pk=instance.schedule_id).values_list('doctor_id', flat=True).first()
+    if doctor_id is not None:
+        schedules.invalidate(doctor_id)
@@ -0,0 +1,171 @@
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest
+
+from . import schedules
+from .models import Appointment, ArchivedAppointment, DailyDoctorSummary
+
+STATUS_FIELDS = tuple(status for status, _ in Appointment.STATUS_CHOICES)
+BATCH_SIZE = 5000
+
+
+def appointment_changed(old, new):
+    """Move one appointment's count between summary rows.
+
+    ``old`` and ``new`` are ``slot_state()`` tuples, or ``None`` for a
+    created or deleted appointment.
+    """
+    apply_changes([(old, new)])
+
+
+def apply_changes(changes):
+    """Apply the net count deltas of many ``(old, new)`` state changes.
+
+    Each touched day costs one UPDATE with F() expressions; days without a
+    summary row yet are counted from scratch instead.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for old, new in changes:
+        if old is not None and old[0] is not None:
+            deltas[(old[0], old[1])][old[3]] -= 1
+        if new is not None and new[0] is not None:
+            deltas[(new[0], new[1])][new[3]] += 1
+    missing = []
+    for (doctor_id, date), fields in deltas.items():
+        # a count that has drifted must not go negative: the column is unsigned
+        updates = {
+            field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+            for field, delta in fields.items() if delta
+        }
+        if updates and not DailyDoctorSummary.objects.filter(doctor_id=doctor_id, date=date).update(**updates):
+            missing.append((doctor_id, date))
+    refresh(missing)
+
+
+def _rows(counts):
+    return [
+        DailyDoctorSummary(
+            doctor_id=doctor_id, date=date, **{field: by_status.get(field, 0) for field in STATUS_FIELDS}
+        )
+        for (doctor_id, date), by_status in counts.items()
+    ]
+
+
+def _store(counts):
+    DailyDoctorSummary.objects.bulk_create(
+        _rows(counts),
+        update_conflicts=True,
+        unique_fields=['doctor', 'date'],
+        update_fields=STATUS_FIELDS,
+        batch_size=BATCH_SIZE,
+    )
+
+
+def _grouped(**filters):
+    """Status counts per doctor and day over live and archived appointments.
+
+    A day can have rows in both tables, so callers add up its counts.
+    """
+    live, archived = (
+        model.objects.filter(doctor__isnull=False, **filters).order_by().values('doctor_id', 'date', 'status').annotate(
+            total=Count('id')
+        ).values_list('doctor_id', 'date', 'status', 'total')
+        for model in (Appointment, ArchivedAppointment)
+    )
+    return live.union(archived, all=True)
+
+
+def refresh(pairs):
+    """Recount the summary rows of the given ``(doctor_id, date)`` pairs.
+
+    Used after writes that skip the signals (bulk imports) and to heal a
+    missing row. Days left without appointments lose their row.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    dates = [date for _, date in pairs]
+    rows = _grouped(doctor_id__in={doctor_id for doctor_id, _ in pairs}, date__range=(min(dates), max(dates)))
+    counts = defaultdict(lambda: defaultdict(int))
+    for doctor_id, date, status, total in rows:
+        if (doctor_id, date) in pairs:
+            counts[(doctor_id, date)][status] += total
+    _store(counts)
+
+    empty = defaultdict(list)
+    for doctor_id, date in pairs - counts.keys():
+        empty[doctor_id].append(date)
+    for doctor_id, days in empty.items():
+        DailyDoctorSummary.objects.filter(doctor_id=doctor_id, date__in=days).delete()
+
+
+def rebuild(start=None, end=None):
+    """Recompute every summary row between ``start`` and ``end`` (inclusive, both optional).
+
+    Archived appointments are counted alongside live ones. Runs as one
+    transaction so reports never see a half-built table; the grouped query
+    is streamed and written back in batches.
+    """
+    filters = {}
+    summaries = DailyDoctorSummary.objects.all()
+    if start:
+        filters['date__gte'] = start
+        summaries = summaries.filter(date__gte=start)
+    if end:
+        filters['date__lte'] = end
+        summaries = summaries.filter(date__lte=end)
+
+    written = 0
+    with transaction.atomic():
+        summaries.delete()
+        counts = defaultdict(lambda: defaultdict(int))
+        # ordered so both tables' counts for a day arrive together and land in one batch
+        rows = _grouped(**filters).order_by('doctor_id', 'date')
+        for doctor_id, date, status, total in rows.iterator(chunk_size=BATCH_SIZE):
+            if len(counts) >= BATCH_SIZE and (doctor_id, date) not in counts:
+                DailyDoctorSummary.objects.bulk_create(_rows(counts))
+                written += len(counts)
+                counts.clear()
+            counts[(doctor_id, date)][status] += total
+        DailyDoctorSummary.objects.bulk_create(_rows(counts))
+        written += len(counts)
+    return written
+
+
+def capacity(grid, start, end):
+    """Number of slots a compiled schedule grid offers from ``start`` to ``end``."""
+    total = 0
+    day = start
+    while day <= end:
+        total += schedules.grid_mask(grid, day).bit_count()
+        day += datetime.timedelta(days=1)
+    return total
+
+
+def doctor_totals(doctor_ids, start, end):
+    """Per-doctor status counts, booked total, capacity and utilization for a date range.
+
+    Reads only the summary table (one grouped query) and the cached schedule
+    grids, so the cost does not depend on how many appointments exist.
+    Capacity is measured against each doctor's current schedule.
+    """
+    rows = DailyDoctorSummary.objects.filter(
+        doctor_id__in=doctor_ids, date__range=(start, end)
+    ).values('doctor_id').annotate(*(Sum(field) for field in STATUS_FIELDS)).order_by()
+    sums = {row['doctor_id']: {field: row[f'{field}__sum'] for field in STATUS_FIELDS} for row in rows}
+    grids = schedules.grids(doctor_ids)
+    totals = {}
+    for doctor_id in doctor_ids:
+        counts = sums.get(doctor_id) or dict.fromkeys(STATUS_FIELDS, 0)
+        booked = sum(counts[field] for field in STATUS_FIELDS if field != 'cancelled')
+        slots = capacity(grids[doctor_id], start, end)
+        totals[doctor_id] = {
+            **counts,
+            'booked': booked,
+            'capacity': slots,
+            'utilization': booked / slots if slots else None,
+        }
+    return totals
@@ -1,3 +1,1626 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.hashers import make_password
+from django.contrib.messages import get_messages
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, models, transaction
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    api, archive, availability, booking, contacts, dashboard, events, ics, images, metrics, schedules, search, summary,
+    throttle, views,
+)
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedContactSubmission, ContactSubmission, CustomUser, DailyDoctorSummary,
+    DoctorSchedule, ScheduleBreak, ScheduleException,
+)
+from .pagination import encode_cursor
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN is SQLite specific")
+class HotQueryIndexTests(TestCase):
+    """Every hot query must be answered through an index, not a table scan."""
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertSearchesTables(self, sql, params, indexes):
+        # for grouped raw SQL: subqueries are scanned and sorted, but no table may be
+        plan = self.plan(sql, params)
+        for step in plan:
+            self.assertIsNone(re.fullmatch(r"SCAN dentalcare_\w+", step), f"full table scan in {plan}")
+        for index in indexes:
+            self.assertTrue([step for step in plan if f"INDEX {index} " in step], f"{index} unused in {plan}")
+
+    def assertUsesIndex(self, queryset):
+        plan = self.plan(*queryset.query.sql_with_params())
+        for step in plan:
+            self.assertIsNone(re.fullmatch(r"SCAN \w+", step), f"full table scan in {plan}")
+            self.assertNotIn("TEMP B-TREE", step, f"unindexed sort in {plan}")
+
+    def test_availability_lookup(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(doctor_id=1, date=datetime.date(2025, 1, 1))
+            .exclude(status='cancelled').values_list('time_slot', flat=True)
+        )
+
+    def test_availability_range_lookup(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(doctor_id__in=[1, 2], date__range=(datetime.date(2025, 1, 1), datetime.date(2025, 1, 14)))
+            .exclude(status='cancelled').values_list('doctor_id', 'date', 'time_slot')
+        )
+
+    def test_patient_day_count(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(user_id=1, date=datetime.date(2025, 1, 1))
+            .exclude(status='cancelled').values('id')
+        )
+
+    def test_total_appointments_by_date(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(date=datetime.date(2025, 1, 1)).order_by('date', 'time_slot', 'id')
+        )
+
+    def test_total_appointments_ordering(self):
+        self.assertUsesIndex(Appointment.objects.order_by('date', 'time_slot', 'id'))
+
+    def test_doctor_listing(self):
+        self.assertUsesIndex(Appointment.objects.filter(doctor_id=1).order_by('-date', '-time_slot', '-id'))
+
+    def test_patient_listing(self):
+        self.assertUsesIndex(Appointment.objects.filter(user_id=1).order_by('-date', '-time_slot', '-id'))
+
+    def test_sweeper_batch(self):
+        self.assertUsesIndex(
+            Appointment.objects.past_due().order_by('status', 'date', 'time_slot')
+            .values_list('id', 'doctor_id', 'date', 'time_slot', 'status')[:1000]
+        )
+
+    def test_archive_batch(self):
+        self.assertUsesIndex(
+            Appointment.objects.filter(date__lt=datetime.date(2025, 1, 1))
+            .exclude(status__in=Appointment.OPEN_STATUSES).values('id')[:1000]
+        )
+
+    def test_archived_patient_listing(self):
+        self.assertUsesIndex(ArchivedAppointment.objects.filter(user_id=1).order_by('-date', '-time_slot', '-id'))
+
+    def test_patient_roster(self):
+        indexes = ['appt_doctor_user_date_idx', 'archived_appt_doctor_user_idx']
+        roster = CustomUser.objects.patients_of(1)
+        self.assertSearchesTables(*roster.page_sql(0, 20), indexes)
+        self.assertSearchesTables(*roster.count_sql(), indexes)
+        self.assertSearchesTables(*CustomUser.objects.patients_of(1, 'Sm').page_sql(0, 20), indexes)
+
+    def test_dashboard_counters(self):
+        self.assertSearchesTables(
+            *dashboard._counters_query(1, datetime.date(2025, 1, 1)).query.sql_with_params(),
+            ['appt_doctor_date_slot_idx', 'appt_doctor_user_date_idx', 'archived_appt_doctor_user_idx'],
+        )
+
+    def test_user_search(self):
+        self.assertUsesIndex(CustomUser.objects.search('Sm').values('id'))
+
+    def test_contacts_by_day(self):
+        self.assertUsesIndex(
+            ContactSubmission.objects.submitted_on(datetime.date(2025, 1, 1)).order_by('-submitted_at')
+        )
+
+    def test_contact_listing(self):
+        self.assertUsesIndex(ContactSubmission.objects.order_by('-submitted_at', '-id'))
+
+    def test_archived_contact_listing(self):
+        self.assertUsesIndex(ArchivedContactSubmission.objects.order_by('-submitted_at', '-id'))
+
+    def test_duplicate_contact_lookup(self):
+        self.assertUsesIndex(
+            ContactSubmission.objects.filter(
+                message_hash='0' * 64, submitted_at__gte=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+            ).values('id')[:1]
+        )
+
+
+class ViewQueryCountTests(TestCase):
+    """Pin the number of queries per view and check it does not grow with the data."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor', first_name='Ada', last_name='Lee')
+        cls.patients = CustomUser.objects.bulk_create(
+            CustomUser(username=f'patient{i}', role='patient', phone=f'555{i:04d}') for i in range(50)
+        )
+
+    def setUp(self):
+        self.created = 0
+        cache.clear()
+
+    def populate(self, total):
+        """Grow the appointment and contact tables to ``total`` rows each."""
+        start = self.created
+        today = datetime.date.today()
+        slots = [datetime.time(hour) for hour in range(9, 18)]
+        Appointment.objects.bulk_create(
+            Appointment(
+                user=self.patients[i % len(self.patients)],
+                doctor=self.doctor,
+                # spread over past and future days, one booking per doctor slot
+                date=today + datetime.timedelta(days=i // len(slots) - 60),
+                time_slot=slots[i % len(slots)],
+                status=('pending', 'confirmed', 'cancelled')[i % 3],
+                reason='Check-up',
+            )
+            for i in range(start, total)
+        )
+        ContactSubmission.objects.bulk_create(
+            ContactSubmission(first_name=f'Visitor{i}', mobile='5550000', email=f'v{i}@example.com', message='Hello')
+            for i in range(start, total)
+        )
+        self.created = total
+
+    def count_queries(self, user, path, data=None, method='get'):
+        self.client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = getattr(self.client, method)(path, data)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def assertConstantQueries(self, expected, user, path, data=None, method='get'):
+        counts = []
+        for total in (10, 1000):
+            self.populate(total)
+            counts.append(self.count_queries(user, path, data, method))
+        self.assertEqual(counts, [expected, expected], f"query counts at 10 and 1000 rows for {path}")
+
+    def test_total_appointments(self):
+        self.assertConstantQueries(3, self.doctor, reverse('total_appointments'))
+
+    def test_total_appointments_by_date(self):
+        self.assertConstantQueries(3, self.doctor, reverse('total_appointments'), {'date': datetime.date.today()})
+
+    def test_my_appointments_as_patient(self):
+        self.assertConstantQueries(3, self.patients[0], reverse('my_appointments'))
+
+    def test_my_appointments_as_doctor(self):
+        self.assertConstantQueries(3, self.doctor, reverse('my_appointments'))
+
+    def test_my_appointments_with_archive(self):
+        self.assertConstantQueries(4, self.patients[0], reverse('my_appointments'), {'include_archived': '1'})
+
+    def test_doctor_index(self):
+        self.assertConstantQueries(3, self.doctor, reverse('doctor_index'))
+
+    def test_doctor_patients(self):
+        self.assertConstantQueries(4, self.doctor, reverse('doctor_patients'))
+
+    def test_book_appointment_form(self):
+        self.assertConstantQueries(3, self.patients[0], reverse('book_appointment'))
+
+    def test_book_appointment_check_availability(self):
+        data = {
+            'check_availability': '1',
+            'doctor': self.doctor.id,
+            'date': (datetime.date.today() + datetime.timedelta(days=1)).isoformat(),
+        }
+        self.assertConstantQueries(5, self.patients[0], reverse('book_appointment'), data, method='post')
+
+    def test_received_contacts(self):
+        self.assertConstantQueries(3, self.doctor, reverse('received_contacts'))
+
+    def test_received_contacts_search(self):
+        self.assertConstantQueries(3, self.doctor, reverse('received_contacts'), {'q': 'visitor hello'})
+
+    def test_received_contacts_with_archive(self):
+        self.assertConstantQueries(4, self.doctor, reverse('received_contacts'), {'include_archived': '1'})
+
+
+class AvailabilityCacheTests(TestCase):
+    """The cached occupancy bitmap follows bookings once they commit, and only then."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+        cls.date = datetime.date.today() + datetime.timedelta(days=7)
+        cls.slot = datetime.time(10)
+
+    def setUp(self):
+        cache.clear()
+
+    def booked(self):
+        return availability.booked_mask(self.doctor.pk, self.date)
+
+    def book(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return booking.book_slot(self.patient, self.doctor, self.date, self.slot)
+
+    def test_booking_marks_slot(self):
+        self.assertEqual(self.booked(), 0)
+        self.book()
+        self.assertEqual(self.booked(), 1 << availability.slot_bit(self.slot))
+        self.assertNotIn(('10:00:00', '10:00'), availability.free_slots(self.doctor.pk, self.date))
+
+    def test_cancel_frees_slot(self):
+        appointment = self.book()
+        self.assertTrue(self.booked())
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'cancelled'
+            appointment.save()
+        self.assertEqual(self.booked(), 0)
+        self.assertIn(('10:00:00', '10:00'), availability.free_slots(self.doctor.pk, self.date))
+
+    def test_bulk_cancel_frees_slot(self):
+        appointment = self.book()
+        self.assertTrue(self.booked())
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.change_status(self.doctor, [appointment.pk], 'cancel')
+        self.assertEqual(self.booked(), 0)
+
+    def test_cache_untouched_until_commit(self):
+        self.assertEqual(self.booked(), 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            booking.book_slot(self.patient, self.doctor, self.date, self.slot)
+            self.assertEqual(self.booked(), 0)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.booked())
+
+    def test_rollback_leaves_bitmap(self):
+        self.assertEqual(self.booked(), 0)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                booking.book_slot(self.patient, self.doctor, self.date, self.slot)
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.booked(), 0)
+
+
+class BookSlotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.other_doctor = CustomUser.objects.create_user('other', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+        cls.rival = CustomUser.objects.create_user('rival', role='patient')
+        cls.date = datetime.date.today() + datetime.timedelta(days=7)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_taken_slot(self):
+        booking.book_slot(self.rival, self.doctor, self.date, datetime.time(10))
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.book_slot(self.patient, self.doctor, self.date, datetime.time(10))
+
+    def test_cancelled_slot_can_be_rebooked(self):
+        first = booking.book_slot(self.rival, self.doctor, self.date, datetime.time(10))
+        first.status = 'cancelled'
+        first.save()
+        second = booking.book_slot(self.patient, self.doctor, self.date, datetime.time(10))
+        self.assertEqual(second.status, 'pending')
+        self.assertEqual(
+            Appointment.objects.filter(doctor=self.doctor, date=self.date, time_slot=datetime.time(10)).count(), 2
+        )
+
+    def test_daily_limit_per_patient(self):
+        booking.book_slot(self.patient, self.doctor, self.date, datetime.time(9))
+        booking.book_slot(self.patient, self.other_doctor, self.date, datetime.time(11))
+        with self.assertRaises(booking.DailyLimitReached):
+            booking.book_slot(self.patient, self.doctor, self.date, datetime.time(14))
+        # other days and other patients are unaffected
+        booking.book_slot(self.patient, self.doctor, self.date + datetime.timedelta(days=1), datetime.time(9))
+        booking.book_slot(self.rival, self.doctor, self.date, datetime.time(14))
+
+    def test_cancelled_bookings_do_not_count_towards_limit(self):
+        first = booking.book_slot(self.patient, self.doctor, self.date, datetime.time(9))
+        booking.book_slot(self.patient, self.doctor, self.date, datetime.time(10))
+        first.status = 'cancelled'
+        first.save()
+        booking.book_slot(self.patient, self.doctor, self.date, datetime.time(11))
+
+    def test_outside_schedule(self):
+        with self.assertRaises(booking.SlotUnavailable):
+            booking.book_slot(self.patient, self.doctor, self.date, datetime.time(7))
+
+    def test_unrelated_integrity_error_is_not_hidden(self):
+        error = IntegrityError("NOT NULL constraint failed: dentalcare_appointment.reason")
+        with mock.patch.object(Appointment.objects, 'create', side_effect=error):
+            with self.assertRaises(IntegrityError):
+                booking.book_slot(self.patient, self.doctor, self.date, datetime.time(10))
+
+
+class DashboardCounterTests(TestCase):
+    """Cached dashboard counters are dropped on commit and match a fresh count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+
+    def setUp(self):
+        cache.clear()
+
+    def create(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                user=self.patient, doctor=self.doctor, date=datetime.date.today(), time_slot=datetime.time(17), **kwargs
+            )
+
+    def fresh(self):
+        cache.clear()
+        return dashboard.doctor_counters(self.doctor.pk)
+
+    def test_counters_follow_changes(self):
+        self.assertEqual(dashboard.doctor_counters(self.doctor.pk)['todays_appointments'], 0)
+        appointment = self.create()
+        self.assertEqual(dashboard.doctor_counters(self.doctor.pk), {
+            'todays_appointments': 1, 'todays_messages': 0, 'unique_patients': 1,
+        })
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'cancelled'
+            appointment.save()
+        self.assertEqual(dashboard.doctor_counters(self.doctor.pk)['todays_appointments'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            ContactSubmission.objects.create(first_name='A', mobile='1', email='a@example.com', message='Hi')
+        self.assertEqual(dashboard.doctor_counters(self.doctor.pk), self.fresh())
+
+    def test_rollback_leaves_counters(self):
+        before = dashboard.doctor_counters(self.doctor.pk)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                Appointment.objects.create(
+                    user=self.patient, doctor=self.doctor, date=datetime.date.today(), time_slot=datetime.time(17)
+                )
+                ContactSubmission.objects.create(first_name='A', mobile='1', email='a@example.com', message='Hi')
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(dashboard.doctor_counters(self.doctor.pk), before)
+        self.assertEqual(before, self.fresh())
+
+    def test_home_shows_the_dashboard_to_doctors(self):
+        self.create()
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('home'))
+        self.assertTemplateUsed(response, 'doctor_index.html')
+        self.assertEqual(response.context['todays_appointments_count'], 1)
+        self.assertEqual(response.context['unique_patients_count'], 1)
+
+    def test_archived_patients_still_count(self):
+        archived_only = CustomUser.objects.create_user('zzpatient', role='patient')
+        for day, patient in enumerate((self.patient, archived_only), start=1):
+            Appointment.objects.create(
+                user=patient, doctor=self.doctor, date=datetime.date(2020, 1, day),
+                time_slot=datetime.time(9), status='completed',
+            )
+        self.create()
+        self.assertEqual(dashboard.doctor_counters(self.doctor.pk)['unique_patients'], 2)
+        archive.archive_appointments(cutoff=datetime.date(2021, 1, 1))
+        # the patient with both live and archived visits is counted once
+        self.assertEqual(dashboard.doctor_counters(self.doctor.pk)['unique_patients'], 2)
+
+
+class PatientRosterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.smith = CustomUser.objects.create_user(
+            'jsmith', role='patient', first_name='John', last_name='Smith', email='John.Smith@Example.com', phone='5551234'
+        )
+        cls.other = CustomUser.objects.create_user('asmithers', role='patient', last_name='Brown', phone='7770000')
+        cls.stranger = CustomUser.objects.create_user('smythe', role='patient', last_name='Smith')
+        day = datetime.date.today()
+        for patient in (cls.smith, cls.other):
+            Appointment.objects.create(user=patient, doctor=cls.doctor, date=day, time_slot=datetime.time(10))
+            day -= datetime.timedelta(days=1)
+        Appointment.objects.create(user=cls.smith, doctor=cls.doctor, date=day, time_slot=datetime.time(11))
+
+    def search(self, term):
+        return [user.username for user in CustomUser.objects.patients_of(self.doctor, term)]
+
+    def test_roster(self):
+        patients = list(CustomUser.objects.patients_of(self.doctor))
+        self.assertEqual([user.username for user in patients], ['jsmith', 'asmithers'])
+        self.assertEqual(patients[0].visit_count, 2)
+
+    def test_prefix_search_ignores_case(self):
+        self.assertEqual(self.search('SMI'), ['jsmith'])
+        self.assertEqual(self.search('john.s'), ['jsmith'])
+        self.assertEqual(self.search('asm'), ['asmithers'])
+        self.assertEqual(self.search('555'), ['jsmith'])
+        # prefixes only, and only the doctor's own patients
+        self.assertEqual(self.search('mith'), [])
+        self.assertEqual(self.search('smy'), [])
+
+    def test_archived_visits_stay_on_roster(self):
+        archived_only = CustomUser.objects.create_user('zzpatient', role='patient')
+        for patient, day in ((self.smith, 1), (archived_only, 2)):
+            Appointment.objects.create(
+                user=patient, doctor=self.doctor, date=datetime.date(2020, 1, day),
+                time_slot=datetime.time(9), status='completed',
+            )
+        self.assertEqual(archive.archive_appointments(cutoff=datetime.date(2021, 1, 1)), 2)
+        patients = list(CustomUser.objects.patients_of(self.doctor))
+        self.assertEqual([user.username for user in patients], ['jsmith', 'asmithers', 'zzpatient'])
+        self.assertEqual(patients[0].visit_count, 3)
+        self.assertEqual(patients[0].last_visit, datetime.date.today())
+        self.assertEqual((patients[2].visit_count, patients[2].last_visit), (1, datetime.date(2020, 1, 2)))
+        self.assertEqual(self.search('zz'), ['zzpatient'])
+        roster = CustomUser.objects.patients_of(self.doctor)
+        self.assertEqual(roster.count(), 3)
+        self.assertEqual([user.username for user in roster[1:3]], ['asmithers', 'zzpatient'])
+        self.assertEqual(roster[2].visit_count, 1)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+        ContactSubmission.objects.create(
+            first_name='=HYPERLINK("http://evil")', last_name='-2+3', mobile='+15550000',
+            email='eve@example.com', message='@SUM(A1)',
+        )
+        Appointment.objects.create(
+            user=cls.patient, doctor=cls.doctor, date=datetime.date(2025, 1, 2), time_slot=datetime.time(9), reason='Check-up'
+        )
+        Appointment.objects.create(
+            user=cls.patient, doctor=cls.doctor, date=datetime.date(2025, 1, 3), time_slot=datetime.time(9), reason='=1+1'
+        )
+
+    def export(self, name, **params):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_neutralises_formulas(self):
+        response, body = self.export('export_contacts')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:6], ['id', 'first_name', 'last_name', 'mobile', 'email', 'message'])
+        self.assertEqual(rows[1][1:6], ["'=HYPERLINK(\"http://evil\")", "'-2+3", "'+15550000", 'eve@example.com', "'@SUM(A1)"])
+
+    def test_ndjson_keeps_values(self):
+        response, body = self.export('export_contacts', format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        row = json.loads(body.splitlines()[0])
+        self.assertEqual(row['message'], '@SUM(A1)')
+
+    def test_appointment_filters(self):
+        response, body = self.export('export_appointments', date='2025-01-03')
+        self.assertIn('attachment; filename="appointments.csv"', response['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(len(rows), 2)
+        self.assertIn("'=1+1", rows[1])
+
+    def test_bad_filter(self):
+        self.client.force_login(self.doctor)
+        self.assertEqual(self.client.get(reverse('export_appointments'), {'date': 'soon'}).status_code, 400)
+
+    def test_doctors_only(self):
+        self.client.force_login(self.patient)
+        self.assertRedirects(self.client.get(reverse('export_contacts')), reverse('home'), fetch_redirect_response=False)
+
+
+class ImportClinicDataTests(TestCase):
+    def run_import(self, kind, content, suffix='.csv', **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        call_command('import_clinic_data', handle.name, kind=kind, stdout=io.StringIO(), stderr=io.StringIO(), **options)
+
+    def test_users_hash_each_password_once(self):
+        content = (
+            "username,role,password,first_name\n"
+            "drwho,doctor,secret,Who\n"
+            "amy,patient,secret,Amy\n"
+            "rory,patient,,Rory\n"
+            "amy,patient,other,Amy\n"
+        )
+        with mock.patch(
+            'dentalcare.management.commands.import_clinic_data.make_password', wraps=make_password
+        ) as hasher:
+            self.run_import('users', content)
+        # the unusable password and one hash for 'secret'
+        self.assertEqual(hasher.call_count, 2)
+        users = {user.username: user for user in CustomUser.objects.all()}
+        self.assertEqual(set(users), {'drwho', 'amy', 'rory'})
+        self.assertTrue(users['drwho'].is_staff)
+        self.assertTrue(users['amy'].check_password('secret'))
+        self.assertFalse(users['rory'].has_usable_password())
+
+    def test_appointments_apply_booking_rules(self):
+        doctor = CustomUser.objects.create_user('drwho', role='doctor')
+        CustomUser.objects.create_user('amy', role='patient')
+        Appointment.objects.create(
+            user=CustomUser.objects.create_user('rory', role='patient'), doctor=doctor,
+            date=datetime.date(2025, 1, 2), time_slot=datetime.time(9),
+        )
+        content = "\n".join(json.dumps(row) for row in [
+            {'patient': 'amy', 'doctor': 'drwho', 'date': '2025-01-02', 'time_slot': '09:00'},
+            {'patient': 'amy', 'doctor': 'drwho', 'date': '2025-01-02', 'time_slot': '10:00'},
+            {'patient': 'amy', 'doctor': 'drwho', 'date': '2025-01-02', 'time_slot': '11:00'},
+            {'patient': 'amy', 'doctor': 'amy', 'date': '2025-01-03', 'time_slot': '09:00'},
+            {'patient': 'amy', 'doctor': 'drwho', 'date': '2025-01-02', 'time_slot': '09:00', 'status': 'cancelled'},
+            {'patient': 'amy', 'doctor': 'drwho', 'date': '2025-01-02', 'time_slot': '12:00'},
+        ])
+        with tempfile.NamedTemporaryFile('r', suffix='.csv', delete=False) as rejects:
+            pass
+        self.addCleanup(os.remove, rejects.name)
+        self.run_import('appointments', content, suffix='.jsonl', rejects=rejects.name)
+        with open(rejects.name, newline='') as handle:
+            rejected = sorted(list(csv.reader(handle))[1:])
+        self.assertEqual(rejected, [
+            ['1', 'time slot already booked for this doctor'],
+            ['4', "'amy' is not a doctor"],
+            ['6', 'patient already has two appointments that day'],
+        ])
+        self.assertEqual(
+            sorted(Appointment.objects.filter(user__username='amy').values_list('time_slot', 'status')),
+            [(datetime.time(9), 'cancelled'), (datetime.time(10), 'pending'), (datetime.time(11), 'pending')],
+        )
+
+    def test_dry_run_writes_nothing(self):
+        self.run_import('users', "username\namy\n", dry_run=True)
+        self.assertFalse(CustomUser.objects.exists())
+
+
+def png_upload(name='me.png', color='red'):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (300, 200), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = CustomUser.objects.create_user('amy', role='patient')
+
+    def test_upload_is_stored_by_content(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(images, 'schedule_thumbnails') as schedule:
+            response = self.client.post(reverse('edit_profile'), {'profile_image': png_upload()})
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertRegex(self.user.profile_image.name, r'^profiles/[0-9a-f]{64}\.png$')
+        self.assertEqual(self.user.avatar_thumbnail, '')
+        schedule.assert_called_once_with(self.user.profile_image.name)
+
+    def test_avatar_url_does_not_touch_storage(self):
+        images.store_profile_image(self.user, png_upload())
+        self.user.save()
+        with mock.patch.object(default_storage, 'exists') as exists:
+            self.assertEqual(self.user.avatar_url, default_storage.url(self.user.profile_image.name))
+        exists.assert_not_called()
+        images.generate_thumbnails(self.user.profile_image.name)
+        self.assertEqual(images.record_thumbnail(self.user.profile_image.name), 1)
+        self.user.refresh_from_db()
+        with mock.patch.object(default_storage, 'exists') as exists:
+            self.assertTrue(self.user.avatar_url.endswith('_192.webp'))
+        exists.assert_not_called()
+
+    def test_shared_upload_reuses_thumbnail(self):
+        images.store_profile_image(self.user, png_upload())
+        self.user.save()
+        images.generate_thumbnails(self.user.profile_image.name)
+        other = CustomUser(username='rory')
+        images.store_profile_image(other, png_upload('copy.png'))
+        self.assertEqual(other.profile_image.name, self.user.profile_image.name)
+        self.assertEqual(other.avatar_thumbnail, images.avatar_name(other.profile_image.name))
+
+    def test_backfill(self):
+        for username in ('rory', 'clara'):
+            user = CustomUser(username=username)
+            images.store_profile_image(user, png_upload())
+            user.save()
+        images.store_profile_image(self.user, png_upload(color='blue'))
+        self.user.save()
+        CustomUser.objects.create_user('nobody')
+        out = io.StringIO()
+        call_command('backfill_avatar_thumbnails', stdout=out, stderr=io.StringIO())
+        self.assertIn("Recorded thumbnails for 3 users; 0 images failed.", out.getvalue())
+        for user in CustomUser.objects.exclude(username='nobody'):
+            self.assertEqual(user.avatar_thumbnail, images.avatar_name(user.profile_image.name))
+            self.assertTrue(default_storage.exists(user.avatar_thumbnail))
+        self.assertEqual(CustomUser.objects.get(username='nobody').avatar_thumbnail, '')
+
+
+class SeedDemoDataTests(TestCase):
+    def test_seeds_within_booking_rules(self):
+        call_command(
+            'seed_demo_data', doctors=2, patients=10, appointments=60, contacts=30, stdout=io.StringIO()
+        )
+        self.assertEqual(Appointment.objects.count(), 60)
+        self.assertFalse(
+            Appointment.objects.exclude(status='cancelled').values('doctor', 'date', 'time_slot')
+            .annotate(n=models.Count('id')).filter(n__gt=1).exists()
+        )
+        # submitted_at is spread over the past year, not the moment of seeding
+        stamps = list(ContactSubmission.objects.values_list('submitted_at', flat=True))
+        self.assertEqual(len(stamps), 30)
+        self.assertGreater(len(set(stamps)), 1)
+        self.assertTrue(all(stamp <= timezone.now() for stamp in stamps))
+        self.assertLess(min(stamps), timezone.now() - datetime.timedelta(days=1))
+
+
+class BenchmarkViewsTests(SimpleTestCase):
+    def test_every_route_runs_on_a_tiny_seed(self):
+        # a separate process: the command creates and drops its own test database
+        result = subprocess.run(
+            [
+                sys.executable, 'manage.py', 'benchmark_views', '--iterations', '1',
+                '--doctors', '1', '--patients', '3', '--appointments', '10', '--contacts', '3',
+            ],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=300,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        statuses = re.findall(r'^(\w+) .* status (\d+)$', result.stdout, re.MULTILINE)
+        self.assertIn(('home', '200'), statuses)
+        self.assertFalse([name for name, status in statuses if status.startswith('5')], result.stdout)
+
+
+class ScheduleGridTests(TestCase):
+    # 2025-01-06 is a Monday
+    MONDAY = datetime.date(2025, 1, 6)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.schedule = DoctorSchedule.objects.create(
+            doctor=cls.doctor, working_days='012', start_time=datetime.time(8), end_time=datetime.time(12),
+            slot_minutes=30,
+        )
+        ScheduleBreak.objects.create(schedule=cls.schedule, start_time=datetime.time(10), end_time=datetime.time(10, 30))
+        ScheduleException.objects.create(schedule=cls.schedule, date=cls.MONDAY)
+        ScheduleException.objects.create(
+            schedule=cls.schedule, date=cls.MONDAY + datetime.timedelta(days=1),
+            start_time=datetime.time(9), end_time=datetime.time(10),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def slots(self, date):
+        return [label for _, label in availability.slots_from_mask(schedules.slot_mask(self.doctor.pk, date))]
+
+    def test_weekly_hours_and_breaks(self):
+        wednesday = self.MONDAY + datetime.timedelta(days=2)
+        self.assertEqual(self.slots(wednesday), ['08:00', '08:30', '09:00', '09:30', '10:30', '11:00', '11:30'])
+        self.assertEqual(self.slots(wednesday + datetime.timedelta(days=1)), [])
+
+    def test_exceptions_including_past_ones(self):
+        self.assertEqual(self.slots(self.MONDAY), [])
+        self.assertEqual(self.slots(self.MONDAY + datetime.timedelta(days=1)), ['09:00', '09:30'])
+        week = (self.MONDAY, self.MONDAY + datetime.timedelta(days=6))
+        self.assertEqual(summary.capacity(schedules.grids([self.doctor.pk])[self.doctor.pk], *week), 0 + 2 + 7)
+
+    def test_doctors_without_schedule_get_default_hours(self):
+        other = CustomUser.objects.create_user('other', role='doctor')
+        with self.assertNumQueries(3):
+            grids = schedules.grids([self.doctor.pk, other.pk])
+        self.assertIs(grids[other.pk], schedules.DEFAULT_GRID)
+        with self.assertNumQueries(0):
+            schedules.grids([self.doctor.pk, other.pk])
+
+    def test_changes_invalidate_the_grid(self):
+        wednesday = self.MONDAY + datetime.timedelta(days=2)
+        self.assertEqual(len(self.slots(wednesday)), 7)
+        ScheduleException.objects.create(schedule=self.schedule, date=wednesday)
+        self.assertEqual(self.slots(wednesday), [])
+        self.schedule.working_days = '0123'
+        self.schedule.save()
+        self.assertEqual(len(self.slots(wednesday + datetime.timedelta(days=1))), 7)
+
+    def test_in_schedule(self):
+        wednesday = self.MONDAY + datetime.timedelta(days=2)
+        self.assertTrue(availability.in_schedule(self.doctor.pk, wednesday, datetime.time(8, 30)))
+        # off the slot grid, inside the break, after hours, with seconds, on a day off
+        self.assertFalse(availability.in_schedule(self.doctor.pk, wednesday, datetime.time(8, 15)))
+        self.assertFalse(availability.in_schedule(self.doctor.pk, wednesday, datetime.time(10)))
+        self.assertFalse(availability.in_schedule(self.doctor.pk, wednesday, datetime.time(12)))
+        self.assertFalse(availability.in_schedule(self.doctor.pk, wednesday, datetime.time(8, 30, 5)))
+        self.assertFalse(availability.in_schedule(self.doctor.pk, self.MONDAY, datetime.time(8, 30)))
+
+
+class ChangeStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.other_doctor = CustomUser.objects.create_user('other', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+        future = datetime.date.today() + datetime.timedelta(days=7)
+        past = datetime.date.today() - datetime.timedelta(days=7)
+
+        def appointment(status, date=future, hour=9, doctor=cls.doctor):
+            return Appointment.objects.create(
+                user=cls.patient, doctor=doctor, date=date, time_slot=datetime.time(hour), status=status
+            ).pk
+
+        cls.pending = appointment('pending')
+        cls.confirmed = appointment('confirmed', hour=10)
+        cls.cancelled = appointment('cancelled', hour=11)
+        cls.past_pending = appointment('pending', date=past)
+        cls.swept = appointment('completed', date=past, hour=10)
+        cls.foreign = appointment('pending', hour=12, doctor=cls.other_doctor)
+
+    def setUp(self):
+        cache.clear()
+
+    def statuses(self):
+        return dict(Appointment.objects.values_list('id', 'status'))
+
+    def test_confirm(self):
+        outcomes = booking.change_status(self.doctor, [
+            self.pending, self.confirmed, self.cancelled, self.past_pending, self.swept, self.foreign, 0,
+        ], 'confirm')
+        self.assertEqual(outcomes, {
+            self.pending: 'updated',
+            self.confirmed: 'invalid_status',
+            self.cancelled: 'invalid_status',
+            self.past_pending: 'expired',
+            self.swept: 'expired',
+            self.foreign: 'not_found',
+            0: 'not_found',
+        })
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.pending], 'confirmed')
+        self.assertEqual(statuses[self.past_pending], 'pending')
+        self.assertEqual(statuses[self.foreign], 'pending')
+
+    def test_cancel_leaves_terminal_rows_alone(self):
+        outcomes = booking.change_status(
+            self.doctor, [self.pending, self.confirmed, self.cancelled, self.swept], 'cancel'
+        )
+        self.assertEqual(outcomes, {
+            self.pending: 'updated',
+            self.confirmed: 'updated',
+            self.cancelled: 'invalid_status',
+            self.swept: 'expired',
+        })
+        statuses = self.statuses()
+        self.assertEqual([statuses[self.pending], statuses[self.confirmed]], ['cancelled', 'cancelled'])
+        self.assertEqual(statuses[self.swept], 'completed')
+
+    def test_cancel_frees_the_slot(self):
+        date = datetime.date.today() + datetime.timedelta(days=7)
+        self.assertTrue(availability.booked_mask(self.doctor.pk, date) >> availability.slot_bit(datetime.time(9)) & 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.change_status(self.doctor, [self.pending], 'cancel')
+        self.assertFalse(availability.booked_mask(self.doctor.pk, date) >> availability.slot_bit(datetime.time(9)) & 1)
+
+    def post(self, user, data):
+        self.client.force_login(user)
+        return self.client.post(reverse('bulk_appointment_status'), data)
+
+    def test_bulk_view(self):
+        response = self.post(self.doctor, {'action': 'confirm', 'ids': [f'{self.pending},{self.foreign}', self.confirmed]})
+        self.assertEqual(response.json(), {
+            'action': 'confirm',
+            'updated': 1,
+            'results': {
+                str(pk): outcome for pk, outcome in sorted({
+                    self.pending: 'updated', self.confirmed: 'invalid_status', self.foreign: 'not_found',
+                }.items())
+            },
+        })
+
+    def test_bulk_view_redirects_to_next(self):
+        response = self.post(self.doctor, {
+            'action': 'cancel', 'ids': [self.pending, self.cancelled], 'next': reverse('total_appointments'),
+        })
+        self.assertRedirects(response, reverse('total_appointments'), fetch_redirect_response=False)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["1 appointment(s) cancelled.", "1 appointment(s) could not be cancelled."],
+        )
+        # other hosts are not followed
+        response = self.post(self.doctor, {'action': 'cancel', 'ids': [self.confirmed], 'next': 'https://evil.example/'})
+        self.assertEqual(response.json()['updated'], 1)
+
+    def test_bulk_view_rejects(self):
+        self.assertEqual(self.post(self.patient, {'action': 'cancel', 'ids': [self.pending]}).status_code, 403)
+        self.assertEqual(self.post(self.doctor, {'action': 'complete', 'ids': [self.pending]}).status_code, 400)
+        self.assertEqual(self.post(self.doctor, {'action': 'cancel', 'ids': ['x']}).status_code, 400)
+        self.assertEqual(self.post(self.doctor, {'action': 'cancel'}).status_code, 400)
+        self.assertEqual(self.statuses()[self.pending], 'pending')
+
+    def test_single_views_check_ownership(self):
+        self.client.force_login(self.other_doctor)
+        response = self.client.post(reverse('confirm_appointment', args=[self.pending]))
+        self.assertEqual(response.status_code, 404)
+        self.client.get(reverse('cancel_appointment', args=[self.pending]))
+        self.assertEqual(self.statuses()[self.pending], 'pending')
+        self.client.force_login(self.patient)
+        self.client.get(reverse('cancel_appointment', args=[self.past_pending]))
+        self.client.get(reverse('cancel_appointment', args=[self.pending]))
+        self.assertEqual(self.statuses()[self.past_pending], 'pending')
+        self.assertEqual(self.statuses()[self.pending], 'cancelled')
+
+
+class SweepTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+        cls.now = timezone.make_aware(datetime.datetime(2025, 3, 10, 12, 0))
+        today = cls.now.date()
+        rows = {
+            'pending_yesterday': (today - datetime.timedelta(days=1), 9, 'pending'),
+            'confirmed_this_morning': (today, 11, 'confirmed'),
+            'pending_starting_now': (today, 12, 'pending'),
+            'pending_later_today': (today, 13, 'pending'),
+            'confirmed_tomorrow': (today + datetime.timedelta(days=1), 9, 'confirmed'),
+            'cancelled_yesterday': (today - datetime.timedelta(days=1), 10, 'cancelled'),
+        }
+        cls.ids = {
+            name: Appointment.objects.create(
+                user=cls.patient, doctor=cls.doctor, date=date, time_slot=datetime.time(hour), status=status
+            ).pk
+            for name, (date, hour, status) in rows.items()
+        }
+
+    def statuses(self):
+        by_id = dict(Appointment.objects.values_list('id', 'status'))
+        return {name: by_id[pk] for name, pk in self.ids.items()}
+
+    def test_only_past_due_rows_are_swept(self):
+        # a batch size of one exercises the batching loop
+        self.assertEqual(booking.sweep_past_due(now=self.now, batch_size=1), 3)
+        self.assertEqual(self.statuses(), {
+            'pending_yesterday': 'expired',
+            'confirmed_this_morning': 'completed',
+            'pending_starting_now': 'expired',
+            'pending_later_today': 'pending',
+            'confirmed_tomorrow': 'confirmed',
+            'cancelled_yesterday': 'cancelled',
+        })
+        self.assertEqual(booking.sweep_past_due(now=self.now), 0)
+
+    def test_updates_summary(self):
+        summary.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.sweep_past_due(now=self.now)
+        row = DailyDoctorSummary.objects.get(doctor=self.doctor, date=self.now.date())
+        self.assertEqual((row.pending, row.confirmed, row.completed, row.expired), (1, 0, 1, 1))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('sweep_appointments', batch_size=2, stdout=out)
+        # every open row is in the past by now
+        self.assertIn("Swept 5 appointments", out.getvalue())
+        self.assertEqual(self.statuses()['confirmed_tomorrow'], 'completed')
+        self.assertEqual(self.statuses()['cancelled_yesterday'], 'cancelled')
+        with self.assertRaises(CommandError):
+            call_command('sweep_appointments', batch_size=0)
+
+
+class DailySummaryTests(TestCase):
+    DAY = datetime.date(2025, 1, 6)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+
+    def book(self, hour, status='pending', date=DAY):
+        return Appointment.objects.create(
+            user=self.patient, doctor=self.doctor, date=date, time_slot=datetime.time(hour), status=status
+        )
+
+    def counts(self, date=DAY):
+        row = DailyDoctorSummary.objects.filter(doctor=self.doctor, date=date).values(*summary.STATUS_FIELDS).first()
+        return {field: count for field, count in row.items() if count} if row else None
+
+    def test_signals_keep_counts_current(self):
+        first = self.book(9)
+        self.book(10, 'confirmed')
+        self.assertEqual(self.counts(), {'pending': 1, 'confirmed': 1})
+        first.status = 'cancelled'
+        first.save()
+        self.assertEqual(self.counts(), {'confirmed': 1, 'cancelled': 1})
+        first.date = self.DAY + datetime.timedelta(days=1)
+        first.save()
+        self.assertEqual(self.counts(), {'confirmed': 1})
+        self.assertEqual(self.counts(first.date), {'cancelled': 1})
+        first.delete()
+        self.assertEqual(self.counts(first.date), {})
+
+    def test_drifted_counts_do_not_go_negative(self):
+        appointment = self.book(9)
+        DailyDoctorSummary.objects.filter(doctor=self.doctor, date=self.DAY).update(pending=0)
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertEqual(self.counts(), {'cancelled': 1})
+
+    def test_refresh(self):
+        self.book(9)
+        self.book(10, 'cancelled')
+        other_day = self.DAY + datetime.timedelta(days=3)
+        DailyDoctorSummary.objects.filter(doctor=self.doctor, date=self.DAY).update(pending=7, cancelled=0)
+        DailyDoctorSummary.objects.create(doctor=self.doctor, date=other_day, pending=2)
+        summary.refresh([(self.doctor.pk, self.DAY), (self.doctor.pk, other_day)])
+        self.assertEqual(self.counts(), {'pending': 1, 'cancelled': 1})
+        # days left without appointments lose their row
+        self.assertIsNone(self.counts(other_day))
+
+    def test_rebuild(self):
+        later = self.DAY + datetime.timedelta(days=10)
+        self.book(9)
+        self.book(9, 'confirmed', date=later)
+        DailyDoctorSummary.objects.all().delete()
+        self.assertEqual(summary.rebuild(end=self.DAY), 1)
+        self.assertEqual(self.counts(), {'pending': 1})
+        self.assertIsNone(self.counts(later))
+        DailyDoctorSummary.objects.filter(date=self.DAY).update(pending=5)
+        out = io.StringIO()
+        call_command('rebuild_daily_summary', stdout=out)
+        self.assertIn("Wrote 2 summary rows", out.getvalue())
+        self.assertEqual(self.counts(), {'pending': 1})
+        self.assertEqual(self.counts(later), {'confirmed': 1})
+        with self.assertRaises(CommandError):
+            call_command('rebuild_daily_summary', start='2025-02-01', end='2025-01-01')
+
+    def test_archived_appointments_keep_counting(self):
+        self.book(9, 'completed')
+        self.book(10, 'cancelled')
+        # still open, so it stays in the live table on an archived day
+        self.book(11)
+        expected = {'pending': 1, 'completed': 1, 'cancelled': 1}
+        self.assertEqual(archive.archive_appointments(cutoff=self.DAY + datetime.timedelta(days=1)), 2)
+        self.assertEqual(self.counts(), expected)
+        self.assertEqual(summary.rebuild(), 1)
+        self.assertEqual(self.counts(), expected)
+        DailyDoctorSummary.objects.update(pending=0, completed=0)
+        summary.refresh([(self.doctor.pk, self.DAY)])
+        self.assertEqual(self.counts(), expected)
+
+    def test_doctor_totals(self):
+        self.book(9)
+        self.book(10, 'confirmed')
+        self.book(11, 'cancelled')
+        totals = summary.doctor_totals([self.doctor.pk], self.DAY, self.DAY)[self.doctor.pk]
+        self.assertEqual((totals['booked'], totals['cancelled']), (2, 1))
+        self.assertEqual(totals['capacity'], 9)
+        self.assertAlmostEqual(totals['utilization'], 2 / 9)
+
+
+class CalendarFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor', first_name='Ada', last_name='Lovelace')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient', first_name='Amy', last_name='Pond')
+        today = datetime.date.today()
+        cls.upcoming = Appointment.objects.create(
+            user=cls.patient, doctor=cls.doctor, date=today + datetime.timedelta(days=3),
+            time_slot=datetime.time(9), reason='Broken tooth; ' + 'very painful ' * 10,
+        )
+        cls.old = Appointment.objects.create(
+            user=cls.patient, doctor=cls.doctor, date=today - datetime.timedelta(days=ics.PAST_DAYS + 5),
+            time_slot=datetime.time(9), status='completed',
+        )
+
+    def feed(self, token=None, **headers):
+        return self.client.get(reverse('doctor_calendar', args=[token or ics.feed_token(self.doctor)]), headers=headers)
+
+    def test_feed(self):
+        response = self.feed()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:appointment-{self.upcoming.pk}@dentalcare', body)
+        self.assertNotIn(f'UID:appointment-{self.old.pk}@dentalcare', body)
+        self.assertIn('SUMMARY:Appointment: Amy Pond', body)
+        self.assertIn('DESCRIPTION:Broken tooth\\; very', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+
+    def test_conditional_get(self):
+        etag = self.feed()['ETag']
+        with self.assertNumQueries(2):
+            self.assertEqual(self.feed(if_none_match=etag).status_code, 304)
+        # rows outside the window do not change the feed
+        self.old.reason = 'Filed'
+        self.old.save()
+        self.assertEqual(self.feed(if_none_match=etag).status_code, 304)
+        self.upcoming.status = 'confirmed'
+        self.upcoming.save()
+        response = self.feed(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_renamed_patient_changes_the_feed(self):
+        etag = self.feed()['ETag']
+        self.patient.last_name = 'Williams'
+        self.patient.save()
+        self.assertEqual(self.feed(if_none_match=etag).status_code, 200)
+
+    def test_unknown_tokens(self):
+        token = ics.feed_token(self.doctor)
+        self.assertEqual(self.feed(token[:-1] + ('A' if token[-1] != 'A' else 'B')).status_code, 404)
+        self.assertEqual(self.feed(ics.feed_token(self.patient)).status_code, 404)
+
+    def test_reset_revokes_the_old_link(self):
+        old_token = ics.feed_token(self.doctor)
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.post(reverse('reset_calendar_feed')).status_code, 403)
+        self.client.force_login(self.doctor)
+        response = self.client.post(reverse('reset_calendar_feed'))
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        self.doctor.refresh_from_db()
+        new_token = ics.feed_token(self.doctor)
+        self.assertNotEqual(new_token, old_token)
+        self.assertIn(new_token, self.client.get(reverse('profile')).content.decode())
+        self.client.logout()
+        self.assertEqual(self.feed(old_token).status_code, 404)
+        self.assertEqual(self.feed(new_token).status_code, 200)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor', first_name='Ada', last_name='Lovelace')
+        cls.other_doctor = CustomUser.objects.create_user('other', role='doctor', first_name='Bob', last_name='Kelso')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient', first_name='Amy', last_name='Pond')
+        cls.other_patient = CustomUser.objects.create_user('rory', role='patient')
+        start = datetime.date.today() + datetime.timedelta(days=7)
+        cls.appointments = [
+            Appointment.objects.create(
+                user=cls.patient, doctor=cls.doctor, date=start + datetime.timedelta(days=day), time_slot=datetime.time(9)
+            ).pk
+            for day in range(5)
+        ]
+        cls.foreign = Appointment.objects.create(
+            user=cls.other_patient, doctor=cls.other_doctor, date=start, time_slot=datetime.time(9)
+        ).pk
+        cls.contacts = [
+            ContactSubmission.objects.create(
+                first_name=f'Visitor{i}', last_name='X', mobile='1', email=f'v{i}@example.com', message=f'Hello {i}'
+            ).pk
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, user, name, args=(), **params):
+        if user:
+            self.client.force_login(user)
+        return self.client.get(reverse(name, args=args), params)
+
+    def post_json(self, user, name, body):
+        self.client.force_login(user)
+        return self.client.post(reverse(name), json.dumps(body), content_type='application/json')
+
+    def test_authentication_required(self):
+        response = self.get(None, 'api_appointments')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': "Authentication required."})
+
+    def test_appointments_are_scoped_to_the_user(self):
+        ids = lambda user: [row['id'] for row in self.get(user, 'api_appointments', fields='id').json()['results']]
+        self.assertEqual(ids(self.patient), self.appointments)
+        self.assertEqual(ids(self.doctor), self.appointments)
+        self.assertEqual(ids(self.other_patient), [self.foreign])
+        self.assertEqual(self.get(self.patient, 'api_appointment_detail', [self.foreign]).status_code, 404)
+
+    def test_doctor_only_endpoints(self):
+        for name, args in [('api_contacts', ()), ('api_contact_detail', (self.contacts[0],))]:
+            self.assertEqual(self.get(self.patient, name, args).status_code, 403)
+        self.assertEqual(self.get(self.patient, 'api_contacts_batch', ids='1').status_code, 403)
+        response = self.post_json(self.patient, 'api_appointments_status', {'action': 'cancel', 'ids': [self.appointments[0]]})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Appointment.objects.get(pk=self.appointments[0]).status, 'pending')
+
+    def test_keyset_cursor(self):
+        seen, cursor = [], None
+        for _ in range(3):
+            params = {'fields': 'id', 'limit': 2, **({'cursor': cursor} if cursor else {})}
+            page = self.get(self.doctor, 'api_appointments', **params).json()
+            seen += [row['id'] for row in page['results']]
+            cursor = page['next_cursor']
+        self.assertEqual(seen, self.appointments)
+        self.assertIsNone(cursor)
+        # rows inserted ahead of the cursor do not shift later pages
+        first = self.get(self.doctor, 'api_appointments', fields='id', limit=2).json()
+        Appointment.objects.create(
+            user=self.other_patient, doctor=self.doctor, date=datetime.date.today() + datetime.timedelta(days=1),
+            time_slot=datetime.time(9),
+        )
+        second = self.get(self.doctor, 'api_appointments', fields='id', limit=2, cursor=first['next_cursor']).json()
+        self.assertEqual([row['id'] for row in second['results']], self.appointments[2:4])
+        self.assertEqual(self.get(self.doctor, 'api_appointments', limit=0).status_code, 400)
+        self.assertEqual(self.get(self.doctor, 'api_appointments', ordering='reason').status_code, 400)
+
+    def test_updated_ordering_for_sync(self):
+        page = self.get(self.doctor, 'api_appointments', fields='id', ordering='updated', limit=10).json()
+        appointment = Appointment.objects.get(pk=self.appointments[0])
+        appointment.status = 'confirmed'
+        appointment.save()
+        cursor = encode_cursor([Appointment.objects.get(pk=self.appointments[-1]).updated_at, self.appointments[-1]])
+        changed = self.get(self.doctor, 'api_appointments', fields='id,status', ordering='updated', cursor=cursor).json()
+        self.assertEqual(len(page['results']), 5)
+        self.assertEqual(changed['results'], [{'id': self.appointments[0], 'status': 'confirmed'}])
+
+    def test_fields_selection(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.get(self.doctor, 'api_appointments', fields='id,status').json()['results']
+        self.assertEqual(rows[0], {'id': self.appointments[0], 'status': 'pending'})
+        self.assertFalse(any('JOIN' in query['sql'] for query in queries.captured_queries if 'appointment' in query['sql']))
+        detail = self.get(self.doctor, 'api_appointment_detail', [self.appointments[0]], fields='patient_first_name').json()
+        self.assertEqual(detail, {'patient_first_name': 'Amy'})
+        response = self.get(self.doctor, 'api_appointments', fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Unknown fields: password", response.json()['error'])
+
+    def test_etag(self):
+        response = self.get(self.doctor, 'api_appointments', fields='id,patient_first_name')
+        etag = response['ETag']
+        with self.assertNumQueries(3):  # session, user and one aggregate
+            self.assertEqual(self.client.get(
+                reverse('api_appointments'), {'fields': 'id,patient_first_name'}, headers={'if-none-match': etag}
+            ).status_code, 304)
+        # a renamed patient changes the output, so it changes the tag
+        self.patient.first_name = 'Amelia'
+        self.patient.save()
+        response = self.client.get(
+            reverse('api_appointments'), {'fields': 'id,patient_first_name'}, headers={'if-none-match': etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['patient_first_name'], 'Amelia')
+
+    def test_detail_etag_follows_joined_rows(self):
+        path = reverse('api_appointment_detail', args=[self.appointments[0]])
+        self.client.force_login(self.doctor)
+        etag = self.client.get(path, {'fields': 'patient_last_name'})['ETag']
+        self.assertEqual(self.client.get(path, {'fields': 'patient_last_name'}, headers={'if-none-match': etag}).status_code, 304)
+        self.patient.last_name = 'Williams'
+        self.patient.save()
+        self.assertEqual(self.client.get(path, {'fields': 'patient_last_name'}, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_batches(self):
+        ids = f"{self.appointments[1]},{self.appointments[0]},{self.foreign},0"
+        body = self.get(self.patient, 'api_appointments_batch', ids=ids, fields='id').json()
+        self.assertEqual(body, {
+            'results': [{'id': self.appointments[0]}, {'id': self.appointments[1]}],
+            'missing': sorted([0, self.foreign]),
+        })
+        too_many = ','.join(str(pk) for pk in range(1, api.MAX_BATCH_IDS + 2))
+        self.assertEqual(self.get(self.patient, 'api_appointments_batch', ids=too_many).status_code, 400)
+        self.assertEqual(self.get(self.patient, 'api_appointments_batch', ids='1,x').status_code, 400)
+        contacts = self.get(self.doctor, 'api_contacts_batch', ids=f"{self.contacts[0]},0", fields='email').json()
+        self.assertEqual(contacts, {'results': [{'email': 'v0@example.com'}], 'missing': [0]})
+
+    def test_status_batch(self):
+        response = self.post_json(self.doctor, 'api_appointments_status', {
+            'action': 'confirm', 'ids': [self.appointments[0], self.foreign],
+        })
+        self.assertEqual(response.json(), {
+            'action': 'confirm',
+            'updated': 1,
+            'results': {str(self.appointments[0]): 'updated', str(self.foreign): 'not_found'},
+        })
+        self.assertEqual(self.post_json(self.doctor, 'api_appointments_status', {'action': 'confirm', 'ids': 'all'}).status_code, 400)
+
+    def test_create(self):
+        date = (datetime.date.today() + datetime.timedelta(days=30)).isoformat()
+        booking_body = {'doctor': self.doctor.pk, 'date': date, 'time_slot': '10:00', 'reason': 'Cleaning'}
+        response = self.post_json(self.other_patient, 'api_appointments', booking_body)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['patient_id'], self.other_patient.pk)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(self.post_json(self.patient, 'api_appointments', booking_body).status_code, 409)
+        self.assertEqual(self.post_json(self.patient, 'api_appointments', {'doctor': self.doctor.pk}).status_code, 400)
+        self.assertEqual(self.post_json(self.patient, 'api_appointments', {**booking_body, 'doctor': self.patient.pk}).status_code, 400)
+
+    def test_contacts(self):
+        page = self.get(self.doctor, 'api_contacts', fields='id', limit=2).json()
+        rest = self.get(self.doctor, 'api_contacts', fields='id', limit=2, cursor=page['next_cursor']).json()
+        self.assertEqual([row['id'] for row in page['results'] + rest['results']], self.contacts[::-1])
+        response = self.get(self.doctor, 'api_contact_detail', [self.contacts[0]], fields='first_name')
+        self.assertEqual(response.json(), {'first_name': 'Visitor0'})
+        self.assertEqual(self.get(self.doctor, 'api_contact_detail', [0]).status_code, 404)
+
+    def test_doctors(self):
+        page = self.get(self.patient, 'api_doctors', limit=1).json()
+        self.assertEqual(page['results'][0]['id'], self.other_doctor.pk)  # ordered by last name
+        rest = self.get(self.patient, 'api_doctors', limit=1, cursor=page['next_cursor']).json()
+        self.assertEqual([row['id'] for row in rest['results']], [self.doctor.pk])
+        self.assertIsNone(rest['next_cursor'])
+        self.assertEqual(self.get(self.patient, 'api_doctors', q='ada', fields='name').json()['results'], [{'name': 'Dr. Ada Lovelace'}])
+
+
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def stats(self, view):
+        return metrics.registry._views[view]
+
+    def test_supports_both_modes(self):
+        async def async_view(request):
+            return HttpResponse()
+
+        self.assertTrue(metrics.MetricsMiddleware.sync_capable and metrics.MetricsMiddleware.async_capable)
+        self.assertTrue(iscoroutinefunction(metrics.MetricsMiddleware(async_view)))
+        self.assertFalse(iscoroutinefunction(metrics.MetricsMiddleware(lambda request: HttpResponse())))
+
+    def test_sync_request(self):
+        self.client.force_login(self.doctor)
+        self.client.get(reverse('doctor_patients'))
+        stats = self.stats('doctor_patients')
+        self.assertEqual(stats.count, 1)
+        self.assertGreater(stats.queries, 0)
+
+    async def test_async_request_counts_queries_in_worker_threads(self):
+        await self.async_client.aforce_login(self.doctor)
+        response = await self.async_client.get(reverse('doctor_index'))
+        self.assertEqual(response.status_code, 200)
+        stats = self.stats('doctor_index')
+        self.assertEqual(stats.count, 1)
+        # session, user and the counters query
+        self.assertEqual(stats.queries, 3)
+
+    def test_queries_outside_requests_are_not_counted(self):
+        CustomUser.objects.count()
+        self.assertEqual(metrics.registry._views, {})
+
+
+class AppointmentEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        cls.patient = CustomUser.objects.create_user('patient', role='patient')
+
+    def test_wsgi_clients_are_turned_away(self):
+        self.client.force_login(self.doctor)
+        self.assertEqual(self.client.get(reverse('appointment_events')).status_code, 204)
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get(reverse('appointment_events')).status_code, 403)
+
+    async def test_asgi_stream(self):
+        await self.async_client.aforce_login(self.doctor)
+        response = await self.async_client.get(reverse('appointment_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        # the test client cannot disconnect, so drop the stream's subscription afterwards
+        self.addCleanup(events.broadcaster._subscriptions.pop, self.doctor.pk, None)
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        events.broadcaster.publish(self.doctor.pk, {'type': 'created', 'id': 7})
+        self.assertEqual(await anext(stream), b'event: created\ndata: {"type": "created", "id": 7}\n\n')
+
+    async def test_stream_keepalive_and_unsubscribe(self):
+        before = events.broadcaster.subscriber_count()
+        stream = views._appointment_stream(self.doctor.pk)
+        await anext(stream)
+        self.assertEqual(events.broadcaster.subscriber_count(), before + 1)
+        with mock.patch.object(views, 'SSE_KEEPALIVE_SECONDS', 0.01):
+            self.assertEqual(await anext(stream), ': keepalive\n\n')
+        await stream.aclose()
+        self.assertEqual(events.broadcaster.subscriber_count(), before)
+
+    def test_events_are_published_on_commit(self):
+        published = []
+        with mock.patch.object(events.broadcaster, 'publish', side_effect=lambda *args: published.append(args)):
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment = Appointment.objects.create(
+                    user=self.patient, doctor=self.doctor, date=datetime.date(2025, 1, 6), time_slot=datetime.time(9)
+                )
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment.status = 'confirmed'
+                appointment.save()
+                appointment.reason = 'Check-up'
+                appointment.save()
+            with self.captureOnCommitCallbacks(execute=False):
+                appointment.status = 'cancelled'
+                appointment.save()
+        self.assertEqual([(doctor_id, event['type'], event['id']) for doctor_id, event in published], [
+            (self.doctor.pk, 'created', appointment.pk),
+            (self.doctor.pk, 'confirmed', appointment.pk),
+        ])
+
+
+class BroadcasterTests(SimpleTestCase):
+    async def test_fan_out_per_doctor(self):
+        broadcaster = events.Broadcaster()
+        first, second, other = broadcaster.subscribe(1), broadcaster.subscribe(1), broadcaster.subscribe(2)
+        broadcaster.publish(1, {'type': 'created'})
+        self.assertEqual(await asyncio.wait_for(first.get(), 1), {'type': 'created'})
+        self.assertEqual(await asyncio.wait_for(second.get(), 1), {'type': 'created'})
+        self.assertTrue(other.queue.empty())
+        first.close()
+        second.close()
+        self.assertEqual(broadcaster.subscriber_count(), 1)
+        self.assertNotIn(1, broadcaster._subscriptions)
+
+    async def test_publish_from_another_thread(self):
+        broadcaster = events.Broadcaster()
+        subscription = broadcaster.subscribe(1)
+        thread = threading.Thread(target=broadcaster.publish, args=(1, {'type': 'cancelled'}))
+        thread.start()
+        self.assertEqual(await asyncio.wait_for(subscription.get(), 1), {'type': 'cancelled'})
+        thread.join()
+
+    async def test_stalled_streams_drop_events(self):
+        broadcaster = events.Broadcaster(queue_size=2)
+        subscription = broadcaster.subscribe(1)
+        for n in range(4):
+            broadcaster.publish(1, {'n': n})
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.queue.qsize(), 2)
+        self.assertEqual([await subscription.get(), await subscription.get()], [{'n': 0}, {'n': 1}])
+
+    def test_publish_to_a_closed_loop_is_ignored(self):
+        broadcaster = events.Broadcaster()
+        loop = asyncio.new_event_loop()
+        subscription = loop.run_until_complete(self._subscribe(broadcaster))
+        loop.close()
+        broadcaster.publish(1, {'type': 'created'})
+        subscription.close()
+        self.assertEqual(broadcaster.subscriber_count(), 0)
+
+    @staticmethod
+    async def _subscribe(broadcaster):
+        return broadcaster.subscribe(1)
+
+
+@override_settings(THROTTLE_RATES={'contact': (2, 60), 'booking': (2, 10)})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_refills(self):
+        self.assertEqual(throttle.consume('booking', 'k', now=100), 0)
+        self.assertEqual(throttle.consume('booking', 'k', now=100), 0)
+        # two tokens per ten seconds: the next one is five seconds away
+        self.assertAlmostEqual(throttle.consume('booking', 'k', now=100), 5)
+        self.assertAlmostEqual(throttle.consume('booking', 'k', now=103), 2)
+        self.assertEqual(throttle.consume('booking', 'k', now=105), 0)
+        self.assertEqual(throttle.consume('booking', 'other', now=105), 0)
+        # a long pause refills to the burst, not beyond it
+        self.assertEqual(throttle.consume('booking', 'k', now=1000), 0)
+        self.assertEqual(throttle.consume('booking', 'k', now=1000), 0)
+        self.assertGreater(throttle.consume('booking', 'k', now=1000), 0)
+
+    def contact(self, message):
+        return self.client.post(reverse('contact_page'), {
+            'first_name': 'Amy', 'last_name': 'Pond', 'mobile': '5550000', 'email': 'amy@example.com', 'message': message,
+        })
+
+    def test_contact_form_is_throttled_per_address(self):
+        self.assertEqual(self.contact('one').status_code, 302)
+        self.assertEqual(self.contact('two').status_code, 302)
+        response = self.contact('three')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(self.client.get(reverse('contact_page')).status_code, 200)
+        self.assertEqual(ContactSubmission.objects.count(), 2)
+
+    def test_api_booking_is_throttled_per_user(self):
+        doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        patient = CustomUser.objects.create_user('patient', role='patient')
+        self.client.force_login(patient)
+        date = (datetime.date.today() + datetime.timedelta(days=30)).isoformat()
+        statuses = [
+            self.client.post(reverse('api_appointments'), json.dumps(
+                {'doctor': doctor.pk, 'date': date, 'time_slot': f'{hour:02d}:00'}
+            ), content_type='application/json').status_code
+            for hour in (9, 10, 11)
+        ]
+        self.assertEqual(statuses, [201, 201, 429])
+        # reads are not throttled
+        self.assertEqual(self.client.get(reverse('api_appointments')).status_code, 200)
+
+
+class ContactSubmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.buffer = contacts.WriteBehindBuffer(size=3, interval=3600)
+        self.addCleanup(self.buffer.flush)
+        patcher = mock.patch.object(contacts, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def contact(self, message='Hello', email='amy@example.com'):
+        return ContactSubmission(first_name='Amy', last_name='Pond', mobile='1', email=email, message=message)
+
+    def test_duplicates_are_dropped(self):
+        self.assertTrue(contacts.submit(self.contact()))
+        self.assertFalse(contacts.submit(self.contact()))
+        # the hash ignores case and surrounding whitespace
+        self.assertFalse(contacts.submit(self.contact(' hello ', 'AMY@example.com')))
+        self.assertTrue(contacts.submit(self.contact('Hello again')))
+        self.assertTrue(contacts.submit(self.contact(email='rory@example.com')))
+        self.assertEqual(ContactSubmission.objects.count(), 3)
+
+    def test_duplicates_expire(self):
+        contacts.submit(self.contact())
+        ContactSubmission.objects.update(submitted_at=timezone.now() - contacts.DUPLICATE_WINDOW - datetime.timedelta(minutes=1))
+        self.assertTrue(contacts.submit(self.contact()))
+
+    @override_settings(CONTACT_WRITE_BEHIND=True)
+    def test_write_behind(self):
+        self.assertTrue(contacts.submit(self.contact('one')))
+        self.assertTrue(contacts.submit(self.contact('two')))
+        self.assertFalse(ContactSubmission.objects.exists())
+        # buffered messages count as duplicates too
+        self.assertFalse(contacts.submit(self.contact('one')))
+        # the third fills the buffer and writes all of them at once
+        with self.assertNumQueries(2):  # duplicate check and the insert
+            self.assertTrue(contacts.submit(self.contact('three')))
+        self.assertEqual(sorted(ContactSubmission.objects.values_list('message', flat=True)), ['one', 'three', 'two'])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_flush_invalidates_the_message_counter(self):
+        doctor = CustomUser.objects.create_user('doctor', role='doctor')
+        self.assertEqual(dashboard.doctor_counters(doctor.pk)['todays_messages'], 0)
+        self.buffer.add(self.contact())
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(dashboard.doctor_counters(doctor.pk)['todays_messages'], 1)
+
+    def test_failed_flush_is_requeued(self):
+        self.buffer.add(self.contact('one'))
+        self.buffer.add(self.contact('two'))
+        with mock.patch.object(ContactSubmission.objects, 'bulk_create', side_effect=DatabaseError("locked")):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+            # a full buffer keeps the submission even though its flush fails
+            with self.assertLogs('dentalcare.contacts', 'ERROR'):
+                self.buffer.add(self.contact('three'))
+        self.assertIsNotNone(self.buffer._timer)
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(list(ContactSubmission.objects.order_by('id').values_list('message', flat=True)), ['one', 'two', 'three'])
+        self.assertIsNone(self.buffer._timer)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "the FTS5 index is SQLite specific")
+class ContactSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_user('doctor', role='doctor')
+
+        def contact(first_name, email, message):
+            return ContactSubmission.objects.create(
+                first_name=first_name, last_name='Smith', mobile='5550000', email=email, message=message
+            )
+
+        cls.braces = contact('Amy', 'amy@example.com', 'Do you fit braces for adults?')
+        cls.mentions = contact('Rory', 'rory@example.com', 'My tooth hurts, maybe braces later. Braces braces.')
+        cls.unrelated = contact('Clara', 'clara@example.com', 'What are your opening hours?')
+
+    def ids(self, query, **kwargs):
+        return [contact.id for contact in search.search_contacts(query, **kwargs)[0]]
+
+    def test_finds_matching_contacts(self):
+        self.assertEqual(self.ids('opening hours'), [self.unrelated.id])
+        # the last word may be unfinished, the earlier ones may not
+        self.assertEqual(self.ids('open'), [self.unrelated.id])
+        self.assertEqual(self.ids('open hours'), [])
+        self.assertEqual(self.ids('clara@example.com'), [self.unrelated.id])
+        # quoting keeps FTS5 syntax in the query from being interpreted
+        self.assertEqual(self.ids('hours" OR "braces'), [])
+        self.assertEqual(self.ids('!!!'), [])
+
+    def test_results_are_ranked(self):
+        self.assertEqual(self.ids('braces'), [self.mentions.id, self.braces.id])
+        self.assertEqual(self.ids('braces amy'), [self.braces.id])
+
+    def test_paging_and_day_filter(self):
+        contacts, has_next = search.search_contacts('smith', page_size=2)
+        self.assertEqual(len(contacts), 2)
+        self.assertTrue(has_next)
+        self.assertEqual(len(search.search_contacts('smith', page=2, page_size=2)[0]), 1)
+        self.assertEqual(self.ids('smith', submitted_on=datetime.date(2000, 1, 1)), [])
+        self.assertEqual(len(self.ids('smith', submitted_on=timezone.localdate())), 3)
+
+    def test_edits_and_deletes_reach_the_index(self):
+        self.unrelated.message = 'Do you take walk-ins?'
+        self.unrelated.save()
+        self.assertEqual(self.ids('opening'), [])
+        self.assertEqual(self.ids('walk'), [self.unrelated.id])
+
+        self.client.force_login(self.doctor)
+        self.client.post(reverse('delete_contact', args=[self.braces.id]))
+        self.assertFalse(ContactSubmission.objects.filter(id=self.braces.id).exists())
+        self.assertEqual(self.ids('braces'), [self.mentions.id])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {search.FTS_TABLE} WHERE {search.FTS_TABLE} MATCH %s", ['adults']
+            )
+            self.assertEqual(cursor.fetchall(), [])
+            # the index agrees with the table it is built from
+            cursor.execute(f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+
+    def test_view(self):
+        self.client.force_login(self.doctor)
+        response = self.client.get(reverse('received_contacts'), {'q': 'braces'})
+        self.assertEqual([contact.id for contact in response.context['contacts']], [self.mentions.id, self.braces.id])
+        self.assertIsNone(response.context['next_page'])
+
+
+class ArchivedContactTests(TestCase):
+    """Archived messages stay readable when asked for."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = CustomUser.objects.create_superuser('doctor', 'doctor@example.com', 'pw')
+        old = ContactSubmission.objects.create(first_name='Old', mobile='1', email='old@example.com', message='Braces?')
+        ContactSubmission.objects.filter(id=old.id).update(submitted_at=timezone.now() - datetime.timedelta(days=400))
+        cls.recent = ContactSubmission.objects.create(first_name='New', mobile='2', email='new@example.com')
+        archive.archive_contacts()
+        cls.old = ArchivedContactSubmission.objects.get(id=old.id)
+
+    def setUp(self):
+        self.client.force_login(self.doctor)
+
+    def listed(self, **params):
+        response = self.client.get(reverse('received_contacts'), params)
+        return [(contact.id, getattr(contact, 'is_archived', False)) for contact in response.context['contacts']]
+
+    def test_listing_opts_in(self):
+        self.assertEqual(self.listed(), [(self.recent.id, False)])
+        self.assertEqual(self.listed(include_archived='1'), [(self.recent.id, False), (self.old.id, True)])
+        day = timezone.localdate(self.old.submitted_at).isoformat()
+        self.assertEqual(self.listed(include_archived='1', date=day), [(self.old.id, True)])
+        response = self.client.get(reverse('received_contacts'), {'include_archived': '1'})
+        # archived rows are history, so they cannot be deleted from here
+        self.assertNotContains(response, reverse('delete_contact', args=[self.old.id]))
+        self.assertContains(response, reverse('delete_contact', args=[self.recent.id]))
+
+    def test_view_falls_back_to_archive(self):
+        response = self.client.get(reverse('view_contact', args=[self.old.id]))
+        self.assertEqual(response.context['contact'], self.old)
+        self.assertContains(response, 'archived')
+        self.assertEqual(self.client.get(reverse('view_contact', args=[self.old.id + 100])).status_code, 404)
+
+    def test_export_opts_in(self):
+        def exported(**params):
+            response = self.client.get(reverse('export_contacts'), params)
+            body = b''.join(response.streaming_content).decode()
+            return [row[0] for row in csv.reader(io.StringIO(body))][1:]
+
+        self.assertEqual(exported(), [str(self.recent.id)])
+        self.assertEqual(exported(include_archived='1'), [str(self.recent.id), str(self.old.id)])
+
+    def test_admin_lists_and_searches_the_archive(self):
+        response = self.client.get(reverse('admin:dentalcare_archivedcontactsubmission_changelist'), {'q': 'braces'})
+        self.assertEqual([contact.id for contact in response.context['cl'].result_list], [self.old.id])
+        response = self.client.get(reverse('admin:dentalcare_archivedappointment_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['has_add_permission'])
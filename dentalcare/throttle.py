@@ -0,0 +1,59 @@
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+# scope: (burst, seconds to refill the whole burst); overridable through THROTTLE_RATES
+DEFAULT_RATES = {
+    'contact': (5, 60 * 10),
+    'booking': (30, 60),
+}
+
+
+def _rate(scope):
+    return getattr(settings, 'THROTTLE_RATES', {}).get(scope, DEFAULT_RATES[scope])
+
+
+def client_key(request):
+    """Signed-in users are throttled per account, everyone else per address."""
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def consume(scope, key, now=None):
+    """Take one token from ``key``'s bucket; return 0, or the seconds until one is free.
+
+    Buckets live in the cache as ``(tokens, timestamp)`` and refill
+    continuously. The read and write are not atomic, so racing requests can
+    occasionally slip an extra one through; that is fine for damping bursts.
+    """
+    burst, period = _rate(scope)
+    per_second = burst / period
+    now = time.time() if now is None else now
+    cache_key = f"throttle:{scope}:{key}"
+    tokens, stamp = cache.get(cache_key, (burst, now))
+    tokens = min(burst, tokens + (now - stamp) * per_second)
+    if tokens < 1:
+        return (1 - tokens) / per_second
+    cache.set(cache_key, (tokens - 1, now), math.ceil(period))
+    return 0
+
+
+def throttle(scope, methods=('POST',)):
+    """Answer 429 when a client exceeds ``scope``'s rate on ``methods``."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                wait = consume(scope, client_key(request))
+                if wait:
+                    response = HttpResponse("Too many requests. Please try again shortly.", status=429)
+                    response['Retry-After'] = str(math.ceil(wait))
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
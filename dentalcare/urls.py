@@ -1,6 +1,6 @@
 from django.urls import path
  
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -9,19 +9,39 @@ urlpatterns = [
     path('log_out/', views.log_out, name='log_out'),
     path('doctor_index/', views.doctor_index, name='doctor_index'),
     path('book_appointment/', views.book_appointment, name='book_appointment'),
+    path('availability/', views.availability_search, name='availability_search'),
+    path('doctors/search/', views.doctor_search, name='doctor_search'),
     path('my_appointments/', views.my_appointments, name='my_appointments'),
     
     path('appointments/', views.total_appointments, name='total_appointments'),
+    path('appointments/export/', views.export_appointments, name='export_appointments'),
     path('appointments/cancel/<int:appointment_id>/', views.cancel_appointment, name='cancel_appointment'),
     path('appointments/confirm/<int:appointment_id>/', views.confirm_appointment, name='confirm_appointment'),
+    path('appointments/bulk/', views.bulk_appointment_status, name='bulk_appointment_status'),
 
 
 
     path('contact_us/', views.contact_page, name='contact_page'),
     path('received_contacts/', views.received_contacts, name='received_contacts'),
+    path('received_contacts/export/', views.export_contacts, name='export_contacts'),
     path('contact/<int:contact_id>/', views.view_contact, name='view_contact'),
     path('contact/<int:contact_id>/delete/', views.delete_contact, name='delete_contact'),
+    path('reports/utilization/', views.utilization_report, name='utilization_report'),
     path('doctor_patients/', views.doctor_patients, name='doctor_patients'),
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
+    path('calendar/<str:token>.ics', views.doctor_calendar, name='doctor_calendar'),
+    path('calendar/reset/', views.reset_calendar_feed, name='reset_calendar_feed'),
+    path('events/appointments/', views.appointment_events, name='appointment_events'),
+    path('metrics', views.metrics_view, name='metrics'),
+
+    # JSON API for the mobile client
+    path('api/v1/appointments/', api.appointments, name='api_appointments'),
+    path('api/v1/appointments/batch/', api.appointments_batch, name='api_appointments_batch'),
+    path('api/v1/appointments/status/', api.appointments_status, name='api_appointments_status'),
+    path('api/v1/appointments/<int:appointment_id>/', api.appointment_detail, name='api_appointment_detail'),
+    path('api/v1/doctors/', api.doctors, name='api_doctors'),
+    path('api/v1/contacts/', api.contacts, name='api_contacts'),
+    path('api/v1/contacts/batch/', api.contacts_batch, name='api_contacts_batch'),
+    path('api/v1/contacts/<int:contact_id>/', api.contact_detail, name='api_contact_detail'),
 ]
@@ -2,26 +2,61 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Appointment, CustomUser, ContactSubmission
+from .models import (
+    Appointment, ArchivedAppointment, ArchivedContactSubmission, CustomUser, ContactSubmission, DailyDoctorSummary,
+)
 from .forms import CustomUserSignUpForm, LoginForm, AppointmentForm, ContactForm
+import asyncio
 import datetime
-from django.utils import timezone
-from django.views.decorators.http import require_POST
+import json
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import condition, require_GET, require_POST, require_safe
+from django.views.decorators.cache import cache_control
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.db.models import Value
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
 from .forms import UserProfileForm
+from . import availability, booking, contacts, dashboard, directory, events, ics, images, metrics, search, summary
+from .pagination import akeyset_page, amerged_keyset_page, keyset_page, merged_keyset_page
+from .exports import streaming_export
+from .throttle import throttle
 
 def home(request):
     if request.user.is_authenticated and hasattr(request.user, "role") and request.user.role == "doctor":
-        return render(request, "doctor_index.html")
+        return _doctor_index_page(request)
     else:
         return render(request, "index.html")
 
+
+async def _auser(request):
+    # share the async lookup with request.user, so templates don't fetch the user again
+    request.user = await request.auser()
+    return request.user
+
+
 @login_required
 def edit_profile(request):
     user = request.user
     if request.method == 'POST':
+        old_image = user.profile_image.name
         form = UserProfileForm(request.POST, request.FILES, instance=user)
         if form.is_valid():
-            form.save()
+            user = form.save(commit=False)
+            if 'profile_image' in form.changed_data:
+                upload = form.cleaned_data.get('profile_image')
+                if upload:
+                    images.store_profile_image(user, upload)
+                    if not user.avatar_thumbnail:
+                        images.schedule_thumbnails(user.profile_image.name)
+                else:
+                    user.avatar_thumbnail = ''
+            user.save()
+            if user.profile_image.name != old_image:
+                images.discard_if_unused(old_image)
             messages.success(request, "Profile updated successfully.")
             return redirect('profile')
         else:
@@ -74,6 +109,7 @@ def log_out(request):
     return redirect("/")
 
 @login_required
+@throttle('booking')
 def book_appointment(request):
     available_slots = []
     selected_date = None
@@ -95,21 +131,8 @@ def book_appointment(request):
                     if selected_date < datetime.date.today():
                         messages.error(request, "Cannot book appointments for past dates.")
                     else:
-                        # Get booked slots for this doctor on this date
-                        appointments = Appointment.objects.filter(
-                            doctor=selected_doctor,
-                            date=selected_date
-                        ).exclude(status='cancelled')
-                        
-                        booked_slots = [a.time_slot.strftime("%H:%M:%S") for a in appointments]
-                        
-                        # Get all time slots and filter available ones
-                        all_slots = [(datetime.time(hour, 0), f"{hour:02d}:00") for hour in range(9, 18)]
-                        available_slots = [
-                            (slot.strftime("%H:%M:%S"), label) 
-                            for slot, label in all_slots 
-                            if slot.strftime("%H:%M:%S") not in booked_slots
-                        ]
+                        # Free slots come from the cached occupancy bitmap
+                        available_slots = availability.free_slots(selected_doctor.id, selected_date)
                         
                         if not available_slots:
                             messages.warning(request, "No available slots for this doctor on the selected date.")
@@ -148,34 +171,14 @@ def book_appointment(request):
                     messages.error(request, "Cannot book appointments for past dates.")
                     return redirect('book_appointment')
                 
-                # Check if user already has 2 appointments for this date
-                user_day_count = Appointment.objects.filter(
-                    user=request.user, 
-                    date=selected_date
-                ).exclude(status='cancelled').count()
-                
-                if user_day_count >= 2:
-                    messages.error(request, "You can only book two appointments per day.")
+                try:
+                    booking.book_slot(request.user, selected_doctor, selected_date, time_slot, reason)
+                except booking.DailyLimitReached as e:
+                    messages.error(request, str(e))
                     return redirect('my_appointments')
-                
-                # Check if slot is already booked for this doctor
-                if Appointment.objects.filter(
-                    doctor=selected_doctor,
-                    date=selected_date, 
-                    time_slot=time_slot
-                ).exclude(status='cancelled').exists():
-                    messages.error(request, "This time slot is already booked for this doctor.")
+                except booking.SlotUnavailable as e:
+                    messages.error(request, str(e))
                     return redirect('book_appointment')
-                
-                # Create appointment
-                appointment = Appointment.objects.create(
-                    user=request.user,
-                    doctor=selected_doctor,
-                    date=selected_date,
-                    time_slot=time_slot,
-                    reason=reason,
-                    status='pending'
-                )
                 messages.success(request, f"Appointment booked successfully with {selected_doctor.get_display_name()}! Awaiting confirmation.")
                 return redirect('my_appointments')
                 
@@ -196,80 +199,121 @@ def book_appointment(request):
     })
 
 
+MAX_AVAILABILITY_DAYS = 31
+
+
 @login_required
-def my_appointments(request):
-    if hasattr(request.user, 'role'):
-        if request.user.role == 'doctor':
-            appointments = Appointment.objects.filter(
-                doctor=request.user
-            ).order_by('-date', '-time_slot')
-        else:
-            appointments = Appointment.objects.filter(
-                user=request.user
-            ).order_by('-date', '-time_slot')
-    else:
-        appointments = Appointment.objects.filter(
-            user=request.user
-        ).order_by('-date', '-time_slot')
+@require_GET
+@cache_control(private=True, max_age=60)
+def availability_search(request):
+    """Free slots for a set of doctors over a date range, as JSON."""
+    try:
+        start = datetime.date.fromisoformat(request.GET['start']) if request.GET.get('start') else datetime.date.today()
+        days = int(request.GET.get('days', 7))
+        doctor_ids = [int(pk) for pk in request.GET.get('doctors', '').split(',') if pk.strip()]
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start, days or doctors parameter.'}, status=400)
+    if not 1 <= days <= MAX_AVAILABILITY_DAYS:
+        return JsonResponse({'error': f'days must be between 1 and {MAX_AVAILABILITY_DAYS}.'}, status=400)
+
+    start = max(start, datetime.date.today())
+    dates = [start + datetime.timedelta(days=offset) for offset in range(days)]
+    doctors = directory.doctors()
+    if doctor_ids:
+        wanted = set(doctor_ids)
+        doctors = [doctor for doctor in doctors if doctor['id'] in wanted]
+
+    masks = availability.free_masks([doctor['id'] for doctor in doctors], dates)
+    return JsonResponse({
+        'start': start.isoformat(),
+        'days': days,
+        'doctors': [
+            {
+                'id': doctor['id'],
+                'name': doctor['name'],
+                'specialization': doctor['specialization'],
+                'slots': {
+                    date.isoformat(): [value for value, label in availability.slots_from_mask(masks[(doctor['id'], date)])]
+                    for date in dates
+                },
+            }
+            for doctor in doctors
+        ],
+    })
 
-    # Add is_expired flag
-    now = timezone.now()
-    for appt in appointments:
-        appt_datetime = timezone.make_aware(datetime.datetime.combine(appt.date, appt.time_slot))
-        appt.is_expired = now >= appt_datetime
 
-    return render(request, 'my_appointments.html', {'appointments': appointments})
+@login_required
+@require_GET
+@cache_control(private=True, max_age=60)
+def doctor_search(request):
+    """Typeahead lookup of doctors by name or specialization, as JSON."""
+    query = request.GET.get('q', '').strip()
+    results = directory.search(query) if query else []
+    return JsonResponse({
+        'results': [
+            {key: doctor[key] for key in ('id', 'name', 'specialization', 'label')}
+            for doctor in results
+        ],
+    })
 
 
+@login_required
+async def my_appointments(request):
+    user = await _auser(request)
+    owner = 'doctor' if getattr(user, 'role', None) == 'doctor' else 'user'
+    appointments = Appointment.objects.filter(**{owner: user}).select_related('user', 'doctor').with_expiry()
+    include_archived = request.GET.get('include_archived') == '1'
+
+    # Newest first, one bounded page at a time
+    if include_archived:
+        archived = ArchivedAppointment.objects.filter(**{owner: user}).select_related('user', 'doctor').annotate(
+            is_expired=Value(True)
+        )
+        appointments, next_cursor = await amerged_keyset_page(
+            [appointments, archived], request.GET.get('cursor'), descending=True
+        )
+    else:
+        appointments, next_cursor = await akeyset_page(appointments, request.GET.get('cursor'), descending=True)
 
+    return await sync_to_async(render)(request, 'my_appointments.html', {
+        'appointments': appointments,
+        'next_cursor': next_cursor,
+        'include_archived': include_archived,
+        'is_paginated': bool(next_cursor or request.GET.get('cursor')),
+    })
 
 
-@login_required
-def doctor_index(request):
-    if not request.user.is_authenticated or request.user.role != 'doctor':
+async def doctor_index(request):
+    user = await _auser(request)
+    if not user.is_authenticated or user.role != 'doctor':
         messages.error(request, "Access denied. Doctors only.")
         return redirect('home')
-    
-    today = datetime.date.today()
-
-    # 1️⃣ Today's Appointments
-    todays_appointments = Appointment.objects.filter(
-        doctor=request.user,
-        date=today
-    ).exclude(status='cancelled')
-    todays_appointments_count = todays_appointments.count()
-
-    # 2️⃣ Today's Messages (Contacts)
-    todays_messages_count = ContactSubmission.objects.filter(
-        submitted_at__date=today
-    ).count()
-
-    # 3️⃣ Total unique patients
-    all_appointments = Appointment.objects.filter(doctor=request.user)
-    unique_patients_count = all_appointments.values('user').distinct().count()
-
-    context = {
-        'todays_appointments_count': todays_appointments_count,
-        'todays_messages_count': todays_messages_count,
-        'unique_patients_count': unique_patients_count,
-        'todays_appointments': todays_appointments,  # optional, if you want to list them
-    }
+    counters = await dashboard.adoctor_counters(user.id)
+    return await sync_to_async(render)(request, "doctor_index.html", _doctor_index_context(counters))
+
+
+def _doctor_index_page(request):
+    # home is sync, so it reads the counters through the sync API
+    return render(request, "doctor_index.html", _doctor_index_context(dashboard.doctor_counters(request.user.id)))
 
-    return render(request, "doctor_index.html", context)
+
+def _doctor_index_context(counters):
+    return {
+        'todays_appointments_count': counters['todays_appointments'],
+        'todays_messages_count': counters['todays_messages'],
+        'unique_patients_count': counters['unique_patients'],
+    }
 
 
 
 @login_required
 def cancel_appointment(request, appointment_id):
-    appointment = get_object_or_404(Appointment, id=appointment_id)
+    appointment = get_object_or_404(Appointment.objects.with_expiry(), id=appointment_id)
     # Only allow the patient who booked, or the doctor, to cancel
-    is_patient = appointment.user == request.user
-    is_doctor = appointment.doctor == request.user
+    is_patient = appointment.user_id == request.user.id
+    is_doctor = appointment.doctor_id == request.user.id
     # Only allow cancellation before the appointment time
-    appointment_datetime = timezone.make_aware(
-        datetime.datetime.combine(appointment.date, appointment.time_slot)
-    )
-    if timezone.now() >= appointment_datetime:
+    if appointment.is_expired:
         messages.error(request, "You cannot cancel past or ongoing appointments.")
         # Redirect to the correct page
         if is_patient:
@@ -280,7 +324,7 @@ def cancel_appointment(request, appointment_id):
     if is_patient or is_doctor:
         if appointment.status in ['pending', 'confirmed']:
             appointment.status = 'cancelled'
-            appointment.save()
+            appointment.save(update_fields=['status', 'updated_at'])
             messages.success(request, "Appointment cancelled successfully.")
         else:
             messages.warning(request, "This appointment is already cancelled.")
@@ -293,40 +337,121 @@ def cancel_appointment(request, appointment_id):
         return redirect('total_appointments')
 
 
+@login_required
 @require_POST
 def confirm_appointment(request, appointment_id):
-    appointment = get_object_or_404(Appointment, id=appointment_id)
-    if appointment.status == 'pending':
+    appointment = get_object_or_404(
+        Appointment.objects.with_expiry(), id=appointment_id, doctor=request.user
+    )
+    if appointment.is_expired:
+        messages.error(request, "You cannot confirm past or ongoing appointments.")
+    elif appointment.status == 'pending':
         appointment.status = 'confirmed'
-        appointment.save()
+        appointment.save(update_fields=['status', 'updated_at'])
         messages.success(request, "Appointment confirmed.")
     else:
         messages.warning(request, "Only pending appointments can be confirmed.")
     return redirect('total_appointments')
 
 
+MAX_BULK_APPOINTMENTS = 500
+
 
 @login_required
-def total_appointments(request):
+@require_POST
+def bulk_appointment_status(request):
+    """Confirm or cancel a list of the doctor's appointments in one request.
+
+    Takes ``action`` (confirm or cancel) and repeated ``ids``; answers with
+    per-id outcomes as JSON, or with a message and a redirect when the form
+    supplies ``next``.
+    """
+    if not is_doctor(request.user):
+        return HttpResponseForbidden("Only doctors can update appointments in bulk.")
+    action = request.POST.get('action')
+    try:
+        ids = [int(pk) for value in request.POST.getlist('ids') for pk in value.split(',') if pk.strip()]
+    except ValueError:
+        return HttpResponseBadRequest("ids must be appointment numbers.")
+    if action not in booking.STATUS_ACTIONS or not 0 < len(ids) <= MAX_BULK_APPOINTMENTS:
+        return HttpResponseBadRequest(
+            f"Give an action of confirm or cancel and 1 to {MAX_BULK_APPOINTMENTS} ids."
+        )
+
+    outcomes = booking.change_status(request.user, ids, action)
+    updated = sum(outcome == 'updated' for outcome in outcomes.values())
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        verb = 'confirmed' if action == 'confirm' else 'cancelled'
+        if updated:
+            messages.success(request, f"{updated} appointment(s) {verb}.")
+        if updated < len(outcomes):
+            messages.warning(request, f"{len(outcomes) - updated} appointment(s) could not be {verb}.")
+        return redirect(next_url)
+    return JsonResponse({
+        'action': action,
+        'updated': updated,
+        'results': {str(pk): outcome for pk, outcome in sorted(outcomes.items())},
+    })
+
+
+@login_required
+async def total_appointments(request):
+    await _auser(request)
     date = request.GET.get('date')
+    appointments = Appointment.objects.select_related('user', 'doctor').with_expiry()
     if date:
-        appointments = Appointment.objects.filter(date=date)
-    else:
-        appointments = Appointment.objects.all()
+        appointments = appointments.filter(date=date)
 
-    # Add is_expired flag
-    now = timezone.now()
-    for appt in appointments:
-        appt_datetime = timezone.make_aware(datetime.datetime.combine(appt.date, appt.time_slot))
-        appt.is_expired = now >= appt_datetime
+    appointments, next_cursor = await akeyset_page(appointments, request.GET.get('cursor'))
 
-    return render(request, 'total_appointment.html', {
+    # rendering stays synchronous: context processors and templates may still touch the ORM
+    return await sync_to_async(render)(request, 'total_appointment.html', {
         'appointments': appointments,
-        'selected_date': date
+        'selected_date': date,
+        'next_cursor': next_cursor,
+        'is_paginated': bool(next_cursor or request.GET.get('cursor')),
     })
 
 
 
+APPOINTMENT_EXPORT_COLUMNS = {
+    'id': 'id',
+    'date': 'date',
+    'time_slot': 'time_slot',
+    'status': 'status',
+    'patient_username': 'user__username',
+    'patient_first_name': 'user__first_name',
+    'patient_last_name': 'user__last_name',
+    'patient_phone': 'user__phone',
+    'patient_email': 'user__email',
+    'doctor_username': 'doctor__username',
+    'reason': 'reason',
+    'created_at': 'created_at',
+}
+
+
+@login_required
+@require_GET
+def export_appointments(request):
+    if not is_doctor(request.user):
+        messages.error(request, "Access denied. Doctors only.")
+        return redirect("home")
+    appointments = Appointment.objects.order_by('date', 'time_slot', 'id')
+    try:
+        if request.GET.get('date'):
+            appointments = appointments.filter(date=datetime.date.fromisoformat(request.GET['date']))
+        if request.GET.get('doctor'):
+            appointments = appointments.filter(doctor_id=int(request.GET['doctor']))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid date or doctor filter.")
+    if request.GET.get('status'):
+        appointments = appointments.filter(status=request.GET['status'])
+    return streaming_export(appointments, APPOINTMENT_EXPORT_COLUMNS, request.GET.get('format'), 'appointments')
+
+
+
+@throttle('contact')
 def contact_page(request):
     if request.method == "POST":
         form = ContactForm(request.POST)
@@ -334,7 +459,8 @@ def contact_page(request):
             contact = form.save(commit=False)
             if request.user.is_authenticated:
                 contact.user = request.user
-            contact.save()
+            # a repeated message is acknowledged the same way, but not stored again
+            contacts.submit(contact)
             messages.success(request, "Your message has been sent successfully!")
             return redirect('contact_page')
     else:
@@ -350,17 +476,89 @@ def received_contacts(request):
         messages.error(request, "Access denied. Doctors only.")
         return redirect("home")
     date = request.GET.get('date')
-    contacts = ContactSubmission.objects.all().order_by('-submitted_at')
+    query = request.GET.get('q', '').strip()
+    include_archived = request.GET.get('include_archived') == '1'
+    day = None
     if date:
-        contacts = contacts.filter(submitted_at__date=date)
-    return render(request, "received_contacts.html", {"contacts": contacts, "selected_date": date})
+        try:
+            day = datetime.date.fromisoformat(date)
+        except ValueError:
+            messages.error(request, "Invalid date format.")
+
+    next_cursor = next_page = None
+    if query:
+        # ranked by relevance, so pages are numbered rather than keyed
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+        contacts, has_next = search.search_contacts(query, page, submitted_on=day)
+        if has_next:
+            next_page = page + 1
+    else:
+        contacts = ContactSubmission.objects.all()
+        if day:
+            contacts = contacts.submitted_on(day)
+        if include_archived:
+            archived = ArchivedContactSubmission.objects.annotate(is_archived=Value(True))
+            if day:
+                archived = archived.submitted_on(day)
+            contacts, next_cursor = merged_keyset_page(
+                [contacts, archived], request.GET.get('cursor'), keys=('submitted_at', 'id'), descending=True
+            )
+        else:
+            contacts, next_cursor = keyset_page(
+                contacts, request.GET.get('cursor'), keys=('submitted_at', 'id'), descending=True
+            )
+    return render(request, "received_contacts.html", {
+        "contacts": contacts,
+        "selected_date": date,
+        "query": query,
+        "include_archived": include_archived,
+        "next_cursor": next_cursor,
+        "next_page": next_page,
+    })
+
+
+CONTACT_EXPORT_COLUMNS = {
+    'id': 'id',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'mobile': 'mobile',
+    'email': 'email',
+    'message': 'message',
+    'submitted_at': 'submitted_at',
+    'username': 'user__username',
+}
+
+
+@login_required
+@require_GET
+def export_contacts(request):
+    if not is_doctor(request.user):
+        messages.error(request, "Access denied. Doctors only.")
+        return redirect("home")
+    contacts = [ContactSubmission.objects.order_by('-submitted_at')]
+    if request.GET.get('include_archived') == '1':
+        # everything archived is older than every live message, so the order holds across both
+        contacts.append(ArchivedContactSubmission.objects.order_by('-submitted_at'))
+    if request.GET.get('date'):
+        try:
+            day = datetime.date.fromisoformat(request.GET['date'])
+        except ValueError:
+            return HttpResponseBadRequest("Invalid date filter.")
+        contacts = [queryset.submitted_on(day) for queryset in contacts]
+    return streaming_export(contacts, CONTACT_EXPORT_COLUMNS, request.GET.get('format'), 'contacts')
 
 @login_required
 def view_contact(request, contact_id):
     if not hasattr(request.user, "role") or request.user.role != "doctor":
         messages.error(request, "Access denied. Doctors only.")
         return redirect("home")
-    contact = get_object_or_404(ContactSubmission, id=contact_id)
+    contact = ContactSubmission.objects.filter(id=contact_id).first()
+    if contact is None:
+        # archived rows keep their id, so old links still open
+        contact = get_object_or_404(ArchivedContactSubmission.objects.annotate(is_archived=Value(True)), id=contact_id)
     return render(request, "view_contact.html", {"contact": contact})
 
 @login_required
@@ -374,29 +572,163 @@ def delete_contact(request, contact_id):
     messages.success(request, "Contact deleted successfully.")
     return redirect("received_contacts")
 
+PATIENTS_PAGE_SIZE = 25
+
+
 @login_required
 def doctor_patients(request):
     if not hasattr(request.user, "role") or request.user.role != "doctor":
         messages.error(request, "Access denied. Doctors only.")
         return redirect("home")
-    # Get all appointments for this doctor
-    appointments = Appointment.objects.filter(doctor=request.user).select_related('user')
-    # Collect unique patients
-    patients = {}
-    for appt in appointments:
-        user = appt.user
-        if user and user.id not in patients:
-            patients[user.id] = user
-    return render(request, "doctor_patients.html", {"patients": patients.values()})
+    search = request.GET.get('q', '').strip()
+    # Distinct patients are grouped in the database, one page at a time
+    patients = CustomUser.objects.patients_of(request.user, search)
+    page = Paginator(patients, PATIENTS_PAGE_SIZE).get_page(request.GET.get('page'))
+    return render(request, "doctor_patients.html", {
+        "patients": page,
+        "page_obj": page,
+        "search": search,
+    })
 
 
+REPORT_DEFAULT_DAYS = 30
+MAX_REPORT_DAYS = 366
 
 
+@login_required
+@require_GET
+def utilization_report(request):
+    """Per-doctor booking counts and slot utilization, read from the daily summary."""
+    if not is_doctor(request.user):
+        messages.error(request, "Access denied. Doctors only.")
+        return redirect("home")
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    try:
+        if request.GET.get('start'):
+            start = datetime.date.fromisoformat(request.GET['start'])
+        if request.GET.get('end'):
+            end = datetime.date.fromisoformat(request.GET['end'])
+        doctor_id = int(request.GET['doctor']) if request.GET.get('doctor') else None
+    except ValueError:
+        messages.error(request, "Invalid date or doctor filter.")
+        return redirect('utilization_report')
+    if not 0 <= (end - start).days < MAX_REPORT_DAYS:
+        messages.error(request, f"Pick a range of 1 to {MAX_REPORT_DAYS} days.")
+        return redirect('utilization_report')
+
+    doctors = directory.doctors()
+    totals = summary.doctor_totals([doctor['id'] for doctor in doctors], start, end)
+    rows = [{'doctor': doctor, **totals[doctor['id']]} for doctor in doctors]
+    selected = next((doctor for doctor in doctors if doctor['id'] == doctor_id), None)
+    days = []
+    if selected:
+        days = DailyDoctorSummary.objects.filter(
+            doctor_id=doctor_id, date__range=(start, end)
+        ).order_by('date')
+    return render(request, "utilization_report.html", {
+        "rows": rows,
+        "start": start,
+        "end": end,
+        "selected_doctor": selected,
+        "days": days,
+    })
+
 
 @login_required
 def profile_view(request):
     user = request.user
     if user.role == "doctor":
-        return render(request, "doctor_profile.html", {"user": user})
+        calendar_url = request.build_absolute_uri(reverse('doctor_calendar', args=[ics.feed_token(user)]))
+        return render(request, "doctor_profile.html", {"user": user, "calendar_url": calendar_url})
     else:
-        return render(request, "patient_profile.html", {"user": user})
\ No newline at end of file
+        return render(request, "patient_profile.html", {"user": user})
+
+
+@login_required
+@require_POST
+def reset_calendar_feed(request):
+    """Issue a new calendar feed link; subscriptions to the old one stop working."""
+    if not is_doctor(request.user):
+        return HttpResponseForbidden()
+    ics.rotate_feed_token(request.user)
+    messages.success(request, "Your calendar feed has a new address. Update your calendar subscriptions.")
+    return redirect('profile')
+
+
+def _calendar_doctor_id(request, token):
+    if not hasattr(request, '_calendar_doctor_id'):
+        request._calendar_doctor_id = ics.doctor_from_token(token)
+    return request._calendar_doctor_id
+
+
+def _calendar_state(request, token):
+    # etag and last_modified come from the same aggregate query
+    if not hasattr(request, '_calendar_state'):
+        doctor_id = _calendar_doctor_id(request, token)
+        request._calendar_state = ics.feed_state(doctor_id) if doctor_id else (None, None)
+    return request._calendar_state
+
+
+@require_safe
+@condition(
+    etag_func=lambda request, token: _calendar_state(request, token)[0],
+    last_modified_func=lambda request, token: _calendar_state(request, token)[1],
+)
+def doctor_calendar(request, token):
+    """A doctor's appointments as an iCalendar feed, addressed by a signed token.
+
+    Calendar apps poll without a session; unchanged polls are answered with
+    a 304 after the token check and a single aggregate query.
+    """
+    doctor_id = _calendar_doctor_id(request, token)
+    if doctor_id is None:
+        raise Http404("Unknown calendar.")
+    doctor = get_object_or_404(CustomUser, pk=doctor_id, role='doctor')
+    return ics.feed_response(doctor)
+
+
+# comment lines keep proxies from closing idle streams
+SSE_KEEPALIVE_SECONDS = 15
+
+
+async def _appointment_stream(doctor_id):
+    subscription = events.broadcaster.subscribe(doctor_id)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        subscription.close()
+
+
+@require_GET
+async def appointment_events(request):
+    """Server-Sent Events stream of a doctor's appointment changes.
+
+    An idle stream is a suspended coroutine waiting on its queue, so open
+    dashboards hold no worker thread. Under WSGI a stream would pin a
+    thread for its whole life, so the client is told to stop instead.
+    """
+    user = await request.auser()
+    if not user.is_authenticated or user.role != 'doctor':
+        return HttpResponseForbidden()
+    if not isinstance(request, ASGIRequest):
+        # 204 makes EventSource give up rather than reconnect
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(_appointment_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; open to INTERNAL_IPS and staff users."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')